@@ -4,8 +4,12 @@ For usage instructions and additional information, visit
 https://github.com/leonhard-s/auraxium/.
 """
 
+from .batch import BatchLoader
 from .census import SearchModifier
+from .prepared import Parameter, PreparedQuery
 from .query import Query
+from .row import Row
+from .transport import Transport
 from . import ess, utils
 
 namespace = 'ps2:v2'
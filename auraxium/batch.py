@@ -0,0 +1,136 @@
+"""Batched lookups of collection entries by ID.
+
+The Census API accepts comma-separated values for a search term, which
+allows retrieving any number of entries by ID in a single request. The
+`BatchLoader` class defined here collects individual lookups made
+within a short time window and resolves them using one request.
+"""
+
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from .query import Query
+from .transport import Transport
+from .type import CensusValue
+
+
+class BatchLoader():
+    """Coalesce lookups by ID into as few requests as possible.
+
+    Each loader handles a single query shape, i.e. a collection, the
+    field to look entries up by and the fields to return. The lookup
+    field must be unique within the collection as only one entry is
+    returned per ID.
+
+    Asynchronous lookups made through `aload()` are collected for
+    `window` seconds, or until `max_batch` distinct IDs are pending,
+    before being sent as a single request. A loader must only be used
+    from a single event loop.
+    """
+
+    def __init__(self, collection: str, field: str = '',
+                 namespace: str = '', show_fields: List[str] = None,
+                 window: float = 0.01, max_batch: int = 100,
+                 convert: bool = True,
+                 transport: Optional[Transport] = None) -> None:
+        """Initializer.
+
+        If no field is specified, "<collection>_id" is used.
+        """
+        if max_batch < 1:
+            raise ValueError('the batch size must be at least 1')
+        self.collection = collection
+        self.field = field if field else f'{collection}_id'
+        self.namespace = namespace
+        self.show_fields = [] if show_fields is None else list(show_fields)
+        # The lookup field is required to match the results to their IDs
+        if self.show_fields and self.field not in self.show_fields:
+            self.show_fields.append(self.field)
+        self.window = window
+        self.max_batch = max_batch
+        self.convert = convert
+        self.transport = transport
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._handle: Optional[asyncio.TimerHandle] = None
+
+    async def aload(self, id_: CensusValue) -> Optional[Dict[str, Any]]:
+        """Return the entry for the given ID, or None if not found.
+
+        The lookup will be batched with any other lookups performed
+        through this loader within the batching window.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(str(id_), []).append(future)
+        if len(self._pending) >= self.max_batch:
+            self._dispatch(loop)
+        elif self._handle is None:
+            self._handle = loop.call_later(self.window, self._dispatch, loop)
+        return await future
+
+    async def aload_many(self, ids: Iterable[CensusValue]
+                         ) -> List[Optional[Dict[str, Any]]]:
+        """Return the entries for the given IDs, in order."""
+        return list(await asyncio.gather(*(self.aload(i) for i in ids)))
+
+    def load_many(self, ids: Iterable[CensusValue]
+                  ) -> List[Optional[Dict[str, Any]]]:
+        """Return the entries for the given IDs, in order.
+
+        This performs one blocking request per `max_batch` distinct
+        IDs. Missing entries are returned as None.
+        """
+        keys = [str(i) for i in ids]
+        # Remove duplicates while preserving order
+        unique = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, Any]] = {}
+        for offset in range(0, len(unique), self.max_batch):
+            chunk = unique[offset:offset + self.max_batch]
+            found.update(self._map_rows(self._query(chunk).get(self.convert)))
+        return [found.get(k) for k in keys]
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Send off the currently pending lookups."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            loop.create_task(self._fetch(batch))
+
+    async def _fetch(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        """Perform a batched lookup and resolve the waiting futures."""
+        try:
+            rows = await self._query(list(batch)).aget(self.convert)
+        except Exception as err:  # pylint: disable=broad-except
+            # Forward the error to every caller of this batch
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(err)
+            return
+        found = self._map_rows(rows)
+        for key, futures in batch.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(found.get(key))
+
+    def _map_rows(self, rows: List[Dict[str, Any]]
+                  ) -> Dict[str, Dict[str, Any]]:
+        """Map the returned rows to their lookup key."""
+        found: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            value: Any = row
+            # Support dotted field names for sub-keys
+            for key in self.field.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            if value is not None:
+                found.setdefault(str(value), row)
+        return found
+
+    def _query(self, keys: Sequence[str]) -> Query:
+        """Create the query retrieving the given IDs."""
+        query = Query(self.collection, namespace=self.namespace,
+                      limit=len(keys), show_fields=list(self.show_fields),
+                      transport=self.transport)
+        query.add_term(self.field, ','.join(keys))
+        return query
@@ -0,0 +1,241 @@
+"""In-memory caching of REST API responses.
+
+Caching is opt-in; it is enabled for all queries by passing a cache to
+`set_default_cache()`, or for individual queries via their `cache`
+argument. Responses are keyed by their URL and expire after a time to
+live (TTL) that may be configured per collection.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+from .constants import STATIC_COLLECTIONS
+
+# The default TTL for collections only changing on game updates
+STATIC_TTL = 86400.0
+
+
+class _Entry(NamedTuple):
+    """A single cached response."""
+
+    data: Any
+    size: int
+    collection: str
+    expires: Optional[float]
+
+
+class BaseCache():
+    """Base class for response caches.
+
+    Caches store the decoded response data for a given URL. The data
+    stored and returned is shared and must not be modified.
+    """
+
+    def get(self, url: str) -> Optional[Any]:
+        """Return the cached data for a URL, or None if not found."""
+        entry = self.get_entry(url)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, url: str) -> Optional[Tuple[Any, int]]:
+        """Return the cached data for a URL and its size in bytes."""
+        raise NotImplementedError
+
+    def invalidate(self, url: Optional[str] = None,
+                   collection: Optional[str] = None) -> int:
+        """Remove entries by URL, by collection, or both.
+
+        Returns the number of entries removed. Calling this without any
+        arguments removes all entries.
+        """
+        raise NotImplementedError
+
+    def put(self, url: str, data: Any, size: int,
+            collection: str = '') -> None:
+        """Store the data for a URL.
+
+        `size` is the size of the response body in bytes.
+        """
+        raise NotImplementedError
+
+
+class ResponseCache(BaseCache):
+    """A thread-safe LRU cache for decoded responses.
+
+    The cache is bounded both by the number of entries and by the total
+    size of the original response bodies in bytes. Once either limit is
+    exceeded, the least recently used entries are evicted.
+
+    A TTL of None never expires, a TTL of zero disables caching for the
+    corresponding collection. The `ttls` mapping overrides the default
+    TTL for individual collections.
+
+    If a fallback cache is specified, misses are looked up in it before
+    being reported, and any new entries are also written to it. This
+    allows pairing the in-memory cache with a persistent one.
+    """
+
+    def __init__(self, max_entries: int = 1024,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: Optional[float] = 60.0,
+                 ttls: Optional[Dict[str, Optional[float]]] = None,
+                 fallback: Optional[BaseCache] = None) -> None:
+        """Initializer.
+
+        If no TTL mapping is specified, the collections listed in
+        `constants.STATIC_COLLECTIONS` are kept for `STATIC_TTL`.
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError('cache limits must be positive')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        if ttls is None:
+            ttls = {c: STATIC_TTL for c in STATIC_COLLECTIONS}
+        self.ttls = ttls
+        self.fallback = fallback
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'collections.OrderedDict[str, _Entry]' = (
+            collections.OrderedDict())
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(url)
+            return entry is not None and not _is_expired(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """The total size of the cached responses in bytes."""
+        return self._size
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_entry(self, url: str) -> Optional[Tuple[Any, int]]:
+        """Return the cached data for a URL and its size in bytes."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and _is_expired(entry):
+                self._remove(url)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(url)
+                self.hits += 1
+                return entry.data, entry.size
+        # Consult the fallback cache outside the lock as it may be slow
+        if self.fallback is not None:
+            found = self.fallback.get_entry(url)
+            if found is not None:
+                with self._lock:
+                    self.hits += 1
+                self._store(url, found[0], found[1], _collection_of(url))
+                return found
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def invalidate(self, url: Optional[str] = None,
+                   collection: Optional[str] = None) -> int:
+        """Remove entries by URL, by collection, or both.
+
+        Returns the number of entries removed from this cache. Calling
+        this without any arguments is equivalent to calling `clear()`.
+        Entries are also removed from the fallback cache, if any.
+        """
+        if self.fallback is not None:
+            self.fallback.invalidate(url, collection)
+        with self._lock:
+            if url is None and collection is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._size = 0
+                return count
+            urls: Iterable[str]
+            if url is not None:
+                urls = [url] if url in self._entries else []
+            else:
+                urls = list(self._entries)
+            if collection is not None:
+                urls = [u for u in urls
+                        if self._entries[u].collection == collection]
+            for key in urls:
+                self._remove(key)
+            return len(urls)
+
+    def put(self, url: str, data: Any, size: int,
+            collection: str = '') -> None:
+        """Store the data for a URL.
+
+        `size` is the size of the response body and is used to enforce
+        the byte limit. Callers must not modify the data afterwards.
+        """
+        if self.fallback is not None:
+            self.fallback.put(url, data, size, collection)
+        self._store(url, data, size, collection)
+
+    def stats(self) -> Dict[str, int]:
+        """Return the cache's counters and current size."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._entries),
+                'bytes': self._size}
+
+    def _remove(self, url: str) -> None:
+        """Remove an entry. The caller must hold the lock."""
+        entry = self._entries.pop(url)
+        self._size -= entry.size
+
+    def _store(self, url: str, data: Any, size: int, collection: str) -> None:
+        """Add an entry to the in-memory cache."""
+        ttl = self.ttls.get(collection, self.default_ttl)
+        if ttl is not None and ttl <= 0 or size > self.max_bytes:
+            return
+        expires = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+            self._entries[url] = _Entry(data, size, collection, expires)
+            self._size += size
+            # Evict the least recently used entries
+            while (len(self._entries) > self.max_entries
+                   or self._size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+
+def _collection_of(url: str) -> str:
+    """Return the collection name of a query URL."""
+    path = url.split('?', 1)[0].split('/')
+    # The path is "<endpoint>/s:<id>/<verb>/<namespace>/<collection>"
+    return path[6] if len(path) > 6 else ''
+
+
+def _is_expired(entry: _Entry) -> bool:
+    """Return whether the given cache entry has expired."""
+    return entry.expires is not None and entry.expires <= time.monotonic()
+
+
+_default_cache: Optional[BaseCache] = None
+
+
+def get_default_cache() -> Optional[BaseCache]:
+    """Return the process-wide default cache, if any."""
+    return _default_cache
+
+
+def set_default_cache(cache: Optional[BaseCache]) -> None:
+    """Set the cache used by queries that do not specify their own.
+
+    Passing None disables the default cache.
+    """
+    global _default_cache
+    _default_cache = cache
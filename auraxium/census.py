@@ -1,10 +1,17 @@
+import copy
 import datetime
 import enum
-from typing import Any, Dict, List
-import requests
-from .exceptions import (InvalidSearchTermError, RegExTooShortError,
-                         UnknownCollectionError)
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from . import decode, metrics
+from .cache import BaseCache, get_default_cache
+from .exceptions import (InvalidSearchTermError, MaintenanceError,
+                         RegExTooShortError, ServerError,
+                         ServiceIDMissingError, ServiceIDUnknownError,
+                         ServiceUnavailableError, UnknownCollectionError)
 from .log import logger
+from .scheduler import get_default_scheduler
+from .singleflight import SingleFlight
+from .transport import Transport, get_default_transport
 from .type import CensusValue
 
 
@@ -48,6 +55,10 @@ class Term():
         return self.field == other.field and self.modifier == other.modifier and self.value == other.value
 
 
+# Identical requests in progress are only performed once
+_flights = SingleFlight()
+
+
 def generate_term(field: str, value: str):
     """Generate a term from field and value, parsing search modifier"""
     MODIFIER_LIST: List[str] = ['=', '!', '<', '[', '>', ']', '^', '*']
@@ -63,14 +74,234 @@ def generate_term(field: str, value: str):
 
     return Term(field, value, modifier)
 
-def retrieve(url: str, convert: bool) -> Dict[str, Any]:
-    """Retrieve the server's response for a given URL."""
+def retrieve(url: str, convert: bool,
+             transport: Optional[Transport] = None,
+             cache: Optional[BaseCache] = None,
+             collection: str = '', retry: bool = True) -> Dict[str, Any]:
+    """Retrieve the server's response for a given URL.
+
+    If no transport is specified, the default transport is used. If no
+    cache is specified, the default cache is used, if one has been set.
+    The collection is used to look up the TTL of the cache entry.
+
+    The request is subject to the default scheduler's rate limit. If
+    `retry` is set, transient errors are retried. If an identical
+    request is already in progress, its response is used instead of
+    performing another request.
+    """
+    if cache is None:
+        cache = get_default_cache()
+    data = _lookup(url, convert, cache, collection)
+    if data is not None:
+        return data
+    return _fetch(url, convert, transport, cache, collection, retry)
+
+
+async def retrieve_async(url: str, convert: bool,
+                         transport: Optional[Transport] = None,
+                         cache: Optional[BaseCache] = None,
+                         collection: str = '',
+                         retry: bool = True) -> Dict[str, Any]:
+    """Asynchronous version of `retrieve()`.
+
+    The request, as well as the decoding and conversion of its
+    response, run on the transport's thread pool. Cache hits are
+    served without leaving the event loop. Identical requests made
+    concurrently by other tasks or threads are only performed once.
+    """
+    if cache is None:
+        cache = get_default_cache()
+    data = _lookup(url, convert, cache, collection)
+    if data is not None:
+        return data
+    if transport is None:
+        transport = get_default_transport()
+    recorders: List[metrics._Recorder] = []
+
+    async def request() -> Tuple[Dict[str, Any], bool]:
+        data, recorder, shared = await transport.submit(  # type: ignore
+            _download, url, transport, cache, collection, retry)
+        recorders.append(recorder)
+        return data, shared
+
+    (data, shared), coalesced = await _flights.ado(
+        (url, transport, cache), request)
+    recorder = recorders[0] if recorders else None
+    return await transport.submit(_complete, data, recorder, convert,
+                                  shared or coalesced or cache is not None)
+
+
+def retrieve_iter(url: str, convert: bool,
+                  transport: Optional[Transport] = None,
+                  chunk_size: int = 65536, collection: str = '',
+                  retry: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yield the entries of the server's response as they are received.
+
+    Unlike `retrieve()`, this does not load the entire response into
+    memory and yields the first entries before the response is
+    complete. Responses retrieved this way are not cached.
+
+    Errors reported by the server are raised once the (empty) results
+    list has been consumed. Only errors occurring before the response
+    is received are retried.
+    """
+    if transport is None:
+        transport = get_default_transport()
+    logger.debug('Performing streamed request: %s', url)
+    recorder = metrics.start_request(url, collection)
+    try:
+        response = get_default_scheduler().execute(
+            url, lambda: _open_stream(url, transport), retry)  # type: ignore
+        recorder.received(response)
+        try:
+            chunks = response.iter_content(chunk_size)
+            stream = decode.ListStream(recorder.count(c) for c in chunks)
+            for entry in stream:
+                if convert:
+                    entry = convert_entry(stream.key, entry)  # type: ignore
+                yield entry
+            recorder.mark('download')
+            _, recorder.server_timing = _process_data(stream.remainder)
+        finally:
+            response.close()
+    except BaseException as err:
+        recorder.error = err
+        raise
+    finally:
+        recorder.finish()
+
+
+def _fetch(url: str, convert: bool, transport: Optional[Transport],
+           cache: Optional[BaseCache], collection: str,
+           retry: bool = True) -> Dict[str, Any]:
+    """Perform the request for a URL and convert its response."""
+    data, recorder, shared = _download(url, transport, cache, collection,
+                                       retry)
+    return _complete(data, recorder, convert, shared or cache is not None)
+
+
+def _download(url: str, transport: Optional[Transport],
+              cache: Optional[BaseCache], collection: str, retry: bool
+              ) -> Tuple[Dict[str, Any], Optional[metrics._Recorder], bool]:
+    """Perform the request for a URL through the default scheduler.
+
+    Concurrent calls for the same URL, transport and cache share a
+    single request. Returns the processed, unconverted response data,
+    the request's metrics recorder if this call performed the request,
+    and whether the data is shared with other callers.
+    """
+    if transport is None:
+        transport = get_default_transport()
+    recorders: List[metrics._Recorder] = []
+
+    def request() -> Dict[str, Any]:
+        data, recorder = get_default_scheduler().execute(
+            url, lambda: _fetch_once(url, transport,  # type: ignore
+                                     cache, collection), retry)
+        recorders.append(recorder)
+        return data
+
+    data, shared = _flights.do((url, transport, cache), request)
+    return data, (recorders[0] if recorders else None), shared
+
+
+def _fetch_once(url: str, transport: Transport, cache: Optional[BaseCache],
+                collection: str
+                ) -> Tuple[Dict[str, Any], metrics._Recorder]:
+    """Perform the request for a URL and process its response.
+
+    The returned recorder is finished by `_complete()` once the data
+    has been converted.
+    """
     logger.debug('Performing request: %s', url)
-    # Get response
-    response = requests.get(url)
-    # Raise HTTP-related errors
+    recorder = metrics.start_request(url, collection)
+    try:
+        # Get response
+        response = transport.get(url)
+        recorder.received(response)
+        # Raise HTTP-related errors
+        _raise_for_status(response)
+        recorder.size = len(response.content)
+        data = decode.loads(response.content)
+        recorder.mark('decode')
+        data, recorder.server_timing = _process_data(data)
+        if cache is not None:
+            cache.put(url, data, len(response.content), collection)
+        return data, recorder
+    except BaseException as err:
+        recorder.error = err
+        recorder.finish()
+        raise
+
+
+def _complete(data: Dict[str, Any], recorder: Optional[metrics._Recorder],
+              convert: bool, shared: bool) -> Dict[str, Any]:
+    """Return the response data for a single caller.
+
+    Shared data, i.e. cached or coalesced responses, must not be
+    returned as-is.
+    """
+    try:
+        if shared:
+            return _finalize(data, convert)
+        # If data type conversion is enabled, process it
+        if convert:
+            return convert_response(data)
+        return data
+    finally:
+        if recorder is not None:
+            recorder.mark('convert')
+            recorder.finish()
+
+
+def _finalize(data: Dict[str, Any], convert: bool) -> Dict[str, Any]:
+    """Return a private copy of shared response data."""
+    if convert:
+        return convert_response(data)
+    return copy.deepcopy(data)
+
+
+def _open_stream(url: str, transport: Transport) -> Any:
+    """Open a streamed response, raising for HTTP errors."""
+    response = transport.get(url, stream=True)
+    try:
+        _raise_for_status(response)
+    except BaseException:
+        response.close()
+        raise
+    return response
+
+
+def _raise_for_status(response: Any) -> None:
+    """Raise HTTP-related errors for a response."""
+    if response.status_code == 503:
+        raise MaintenanceError('The API is temporarily unavailable.')
     response.raise_for_status()
-    data = response.json()
+
+
+def _lookup(url: str, convert: bool, cache: Optional[BaseCache],
+            collection: str) -> Optional[Dict[str, Any]]:
+    """Return the response for a URL from the cache, if possible."""
+    if cache is None:
+        return None
+    cached = cache.get(url)
+    if cached is None:
+        return None
+    logger.debug('Cache hit: %s', url)
+    recorder = metrics.start_request(url, collection)
+    recorder.cache_hit = True
+    data = _finalize(cached, convert)
+    recorder.mark('convert')
+    recorder.finish()
+    return data
+
+
+def _process_data(data: Dict[str, Any]
+                  ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Check and log the decoded response.
+
+    Returns the response data and the server-side timing information.
+    """
     # Object-oriented error handling
     _raise_for_data(data)
     # Return count info
@@ -84,70 +315,258 @@ def retrieve(url: str, convert: bool) -> Dict[str, Any]:
     # If there are any addional keys, log a warning
     if len(data) > 1:
         logger.warning('Unexpected number of keys: %s', data)
-    # If data type conversion is enabled, process it
-    if convert:
-        data = _convert_dict(data)
     # Return the remaining response
-    return data
+    return data, timing
 
 
 def _convert_dict(data: Dict[str, Any], human_date: bool = False) -> Dict[str, Any]:
-    """Process a dictionary to be closer to a standard Python one."""
+    """Process a dictionary to be closer to a standard Python one.
+
+    This is the reference implementation of the conversion rules, see
+    `convert_response()` for the optimised version used for responses.
+    """
     new_dict: Dict[str, Any] = {}
-    value: CensusValue
     for k, v in data.items():
-        v: Any
         # Skip the human-readable "*_date" key if the normal timecode exists
-        if k[-5:] == '_date' and k[:-5] in data.keys() and not human_date:
-            logger.debug('Skipped key "%s" while processing', k)
-            continue
-        elif k == 'date' and 'time' in data.keys() and not human_date:
-            logger.debug('Skipped key "%s" while processing', k)
+        if _is_skipped(k, data, human_date):
             continue
-        # Check if the value is a number
-        try:
-            value = float(v)
-            # Check if the value is an integer
-            if value.is_integer():
-                value = int(v)
-                # If the "*_date" key exists, it must be a timestamp
-                if f'{k}_date' in data.keys():
-                    value = datetime.datetime.utcfromtimestamp(value)
-                elif k == 'time' and 'date' in data.keys():
-                    value = datetime.datetime.utcfromtimestamp(value)
-            new_dict[k] = value
-        except ValueError:
-            # Raised for strings
-            if v == 'NULL':
-                new_dict[k] = None
-            # NOTE: The value is already a string, no conversion needed
-            new_dict[k] = v
-        except TypeError:
-            # Raised for lists and sub-dictionaries
-            if isinstance(v, list):
-                new_dict[k] = [_convert_dict(x, human_date) for x in v]
-                continue
-            new_dict[k] = _convert_dict(v, human_date)
+        new_dict[k] = _convert_value(k, v, data, human_date)
     return new_dict
 
 
+def _convert_value(key: str, value: Any, data: Dict[str, Any],
+                   human_date: bool) -> Any:
+    """Convert a single value of a dictionary."""
+    # Check if the value is a number
+    try:
+        number: CensusValue = float(value)
+        # Check if the value is an integer
+        if number.is_integer():
+            number = int(value)
+            # If the "*_date" key exists, it must be a timestamp
+            if _is_timestamp(key, data):
+                number = datetime.datetime.utcfromtimestamp(number)
+        return number
+    except ValueError:
+        # Raised for strings
+        if value == 'NULL':
+            return None
+        # NOTE: The value is already a string, no conversion needed
+        return value
+    except TypeError:
+        # Raised for lists, sub-dictionaries and JSON null
+        if isinstance(value, list):
+            return [_convert_dict(x, human_date) if isinstance(x, dict) else x
+                    for x in value]
+        if isinstance(value, dict):
+            return _convert_dict(value, human_date)
+        return value
+
+
+def _is_skipped(key: str, data: Dict[str, Any], human_date: bool) -> bool:
+    """Return whether a key is a redundant human-readable date."""
+    if human_date:
+        return False
+    if key[-5:] == '_date' and key[:-5] in data:
+        return True
+    return key == 'date' and 'time' in data
+
+
+def _is_timestamp(key: str, data: Dict[str, Any]) -> bool:
+    """Return whether an integer key holds a POSIX timestamp."""
+    return f'{key}_date' in data or key == 'time' and 'date' in data
+
+
+# Value kinds used by the compiled conversion plans
+_STRING = 0
+_INTEGER = 1
+_FLOAT = 2
+_TIMESTAMP = 3
+_DICT = 4
+_LIST = 5
+_OTHER = 6
+
+# The first characters of strings that might be parsed as numbers
+_NUMERIC_PREFIXES = frozenset('+-.iInN')
+
+# The maximum number of key layouts to remember per schema
+_MAX_PLANS = 64
+
+
+class _Schema():
+    """Conversion rules for dictionaries found at one place in a response.
+
+    The first time a given layout of keys is encountered, a plan is
+    compiled that lists the keys to keep, whether they hold timestamps,
+    and the kind of value expected, as learned from that first
+    dictionary. Later dictionaries with the same keys are converted
+    using cheap type checks rather than exceptions; any value not
+    matching the expected kind is converted using `_convert_value()`.
+    """
+
+    __slots__ = ('human_date', '_children', '_plans')
+
+    def __init__(self, human_date: bool) -> None:
+        self.human_date = human_date
+        # Schemas of nested dictionaries (or lists thereof) by key
+        self._children: Dict[str, '_Schema'] = {}
+        self._plans: Dict[Tuple[str, ...],
+                          List[Tuple[str, int, Optional['_Schema']]]] = {}
+
+    def convert(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a dictionary using the compiled plan for its keys."""
+        keys = tuple(data)
+        plan = self._plans.get(keys)
+        if plan is None:
+            plan = self._compile(data)
+            if len(self._plans) < _MAX_PLANS:
+                self._plans[keys] = plan
+        new_dict: Dict[str, Any] = {}
+        for key, kind, child in plan:
+            value = data[key]
+            if isinstance(value, str):
+                if value.isdecimal():
+                    if kind == _INTEGER:
+                        new_dict[key] = int(value)
+                        continue
+                    if kind == _TIMESTAMP:
+                        try:
+                            new_dict[key] = (
+                                datetime.datetime.utcfromtimestamp(int(value)))
+                            continue
+                        except ValueError:
+                            # Out of range, handled by the slow path
+                            pass
+                elif value == 'NULL':
+                    new_dict[key] = None
+                    continue
+                elif kind == _FLOAT:
+                    if value.replace('.', '', 1).isdecimal():
+                        number = float(value)
+                        if not number.is_integer():
+                            new_dict[key] = number
+                            continue
+                elif kind == _STRING:
+                    first = value[:1]
+                    if not (first in _NUMERIC_PREFIXES or first.isdecimal()
+                            or first.isspace()):
+                        new_dict[key] = value
+                        continue
+            elif child is not None:
+                if kind == _DICT and isinstance(value, dict):
+                    new_dict[key] = child.convert(value)
+                    continue
+                if kind == _LIST and isinstance(value, list):
+                    new_dict[key] = [child.convert(x) if isinstance(x, dict)
+                                     else x for x in value]
+                    continue
+            # Slow path for values not matching the plan
+            new_dict[key] = _convert_value(key, value, data, self.human_date)
+        return new_dict
+
+    def _child(self, key: str) -> '_Schema':
+        """Return the schema for a nested dictionary."""
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _Schema(self.human_date)
+        return child
+
+    def _compile(self, data: Dict[str, Any]
+                 ) -> List[Tuple[str, int, Optional['_Schema']]]:
+        """Create the conversion plan for the keys of a dictionary."""
+        plan: List[Tuple[str, int, Optional[_Schema]]] = []
+        for key, value in data.items():
+            if _is_skipped(key, data, self.human_date):
+                continue
+            child: Optional[_Schema] = None
+            converted = _convert_value(key, value, data, self.human_date)
+            if isinstance(value, dict):
+                kind = _DICT
+                child = self._child(key)
+            elif isinstance(value, list):
+                kind = _LIST
+                child = self._child(key)
+            elif isinstance(converted, datetime.datetime):
+                kind = _TIMESTAMP
+            elif isinstance(converted, int):
+                kind = _INTEGER
+            elif isinstance(converted, float):
+                kind = _FLOAT
+            elif isinstance(value, str):
+                kind = _STRING
+            else:
+                kind = _OTHER
+            plan.append((key, kind, child))
+        return plan
+
+
+_SCHEMAS = {False: _Schema(False), True: _Schema(True)}
+
+
+def convert_entry(list_key: str, entry: Dict[str, Any],
+                  human_date: bool = False) -> Dict[str, Any]:
+    """Convert a single entry of a response's results list.
+
+    This is equivalent to converting the entire response using
+    `convert_response()`, see its docstring for details.
+    """
+    # pylint: disable=protected-access
+    return _SCHEMAS[human_date]._child(list_key).convert(entry)
+
+
+def convert_response(data: Dict[str, Any],
+                     human_date: bool = False) -> Dict[str, Any]:
+    """Convert a response to be closer to a standard Python dictionary.
+
+    Strings holding numbers are converted to int or float, timestamps
+    to datetime objects and "NULL" to None. Unless `human_date` is set,
+    the human-readable duplicates of timestamps are dropped.
+
+    The result is identical to `_convert_dict()`, but the schemas of
+    the collections encountered are cached, which makes converting
+    large responses considerably faster.
+    """
+    return _SCHEMAS[human_date].convert(data)
+
+
 def _raise_for_data(data: Dict[str, Any]) -> None:
     """Raise errors according to the keys found in the data."""
+    error = data.get('error', '')
+    if not isinstance(error, str):
+        error = str(error)
     # No data found error
-    if data.get('error', '') == 'No data found.':
+    if error == 'No data found.':
         msg = 'Attempted to access a collection that does not exist.'
         raise UnknownCollectionError(msg)
+    # Throttling of requests without a valid service ID
+    if error.startswith('Missing Service ID'):
+        raise ServiceIDMissingError(error)
+    if error.startswith('Provided Service ID is not registered'):
+        raise ServiceIDUnknownError(error)
+    # Disabled collections
+    if error == 'service_unavailable':
+        msg = 'The requested collection is currently unavailable.'
+        raise ServiceUnavailableError(msg)
+    # Maintenance
+    if 'maintenance' in error.lower():
+        raise MaintenanceError(error)
+    if data.get('errorCode', '') == 'SERVICE_UNAVAILABLE':
+        raise MaintenanceError(data.get('errorMessage', ''))
     # Server-side errors
     if data.get('errorCode', '') == 'SERVER_ERROR':
-        message_words: List[str] = data['errorMessage'].split(': ', 2)
+        message: str = data.get('errorMessage', '')
+        message_words: List[str] = message.split(': ', 2)
+        detail = message_words[1][1:] if len(message_words) > 1 else ''
         # Invalid search term
-        if message_words[1][1:].startswith('Invalid search term.'):
+        if detail.startswith('Invalid search term.'):
             msg = 'Attempted to query a collection by an invalid field.'
             raise InvalidSearchTermError(msg)
         # Invalid search value
-        elif message_words[1][1:].startswith('Invalid search value'):
+        elif detail.startswith('Invalid search value'):
             msg = 'RegEx queries must have at least 3 characters.'
             raise RegExTooShortError(msg)
+        # Other errors, such as timeouts, are considered transient
+        raise ServerError(message)
 
 
 def _value_to_str(value: CensusValue) -> str:
@@ -0,0 +1,217 @@
+"""Column-oriented results for analytics queries.
+
+Rather than a list of dictionaries, `to_columns()` turns the entries of
+a response into one array per field. Values are converted using the
+same rules as `Query.get()`, but numbers and timestamps are stored in
+typed arrays instead of individual Python objects. NumPy arrays are
+used if NumPy is installed, `array.array` objects otherwise.
+
+Nested fields are flattened into dotted column names, i.e. "name.en".
+Missing and "NULL" values are recorded in each column's mask.
+"""
+
+import array
+import datetime
+import itertools
+import re
+from typing import (Any, Dict, Iterable, List, NamedTuple, Optional, Set,
+                    Tuple)
+from .census import _convert_value, _is_skipped, _is_timestamp
+
+# Column kinds
+INTEGER = 'int'
+FLOAT = 'float'
+TIMESTAMP = 'timestamp'
+STRING = 'str'
+OBJECT = 'object'
+
+# The range of integers that fit into a 64-bit column
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Numbers as accepted by `float()`, the "integer" group only matches if
+# the number is also accepted by `int()`
+_NUMBER = re.compile(r'\s*(?:(?P<integer>[+-]?\d+)|[+-]?(?:\d+\.?\d*|\.\d+)'
+                     r'(?:[eE][+-]?\d+)?)\s*')
+
+
+class Column(NamedTuple):
+    """The values of a single field across all entries.
+
+    `values` is a NumPy array, an `array.array` or a list, depending
+    on the column's kind and whether NumPy is used. Timestamps are
+    stored as POSIX seconds, or as "datetime64[s]" with NumPy. `mask`
+    is true for entries where the field is missing or NULL, the value
+    stored for these entries is undefined.
+    """
+
+    kind: str
+    values: Any
+    mask: Any
+
+    def to_list(self) -> List[Any]:
+        """Return the converted values, with None for masked entries."""
+        values: List[Any] = []
+        for value, masked in zip(self.values, self.mask):
+            if masked:
+                values.append(None)
+            elif self.kind == TIMESTAMP:
+                if not isinstance(value, int):
+                    # NumPy datetime64 scalars
+                    value = value.astype('int64')
+                values.append(_EPOCH + datetime.timedelta(seconds=int(value)))
+            elif self.kind in (INTEGER, FLOAT) and not isinstance(
+                    value, (int, float)):
+                # NumPy scalars
+                values.append(value.item())
+            else:
+                values.append(value)
+        return values
+
+
+def numpy_available() -> bool:
+    """Return whether NumPy is installed."""
+    return _import_numpy() is not None
+
+
+def to_columns(entries: Iterable[Dict[str, Any]], human_date: bool = False,
+               use_numpy: Optional[bool] = None) -> Dict[str, Column]:
+    """Convert unconverted response entries into columns.
+
+    Columns are returned in the order their fields are first found. By
+    default, NumPy is used if it is installed.
+
+    Raises:
+      * ImportError -- Raised if `use_numpy` is set but NumPy is not
+        installed
+
+    """
+    # NumPy is only imported here, as importing it is slow
+    numpy = None if use_numpy is False else _import_numpy()
+    if use_numpy and numpy is None:
+        raise ImportError('NumPy is not installed')
+    raw: Dict[str, List[Any]] = {}
+    timestamps: Set[str] = set()
+    count = 0
+    for entry in entries:
+        for name, value, is_timestamp in _flatten(entry, '', human_date):
+            column = raw.get(name)
+            if column is None:
+                column = raw[name] = [None] * count
+            column.append(value)
+            if is_timestamp:
+                timestamps.add(name)
+        count += 1
+        for column in raw.values():
+            if len(column) < count:
+                column.append(None)
+    return {n: _build(v, n in timestamps, human_date, numpy)
+            for n, v in raw.items()}
+
+
+def _build(raw: List[Any], is_timestamp: bool, human_date: bool,
+           numpy: Any) -> Column:
+    """Build a column from the raw values of a field.
+
+    `numpy` is the NumPy module, or None to use `array.array` objects.
+    Numeric values are converted straight into the typed array, no
+    intermediate list of Python numbers is created.
+    """
+    kind = _infer(raw)
+    if kind == INTEGER and is_timestamp:
+        kind = TIMESTAMP
+    count = len(raw)
+    data: Any
+    if kind in (INTEGER, TIMESTAMP, FLOAT):
+        convert = float if kind == FLOAT else int
+        values = (0 if _is_null(v) else convert(v) for v in raw)
+        if numpy is not None:
+            data = numpy.fromiter(values, count=count, dtype=(
+                'float64' if kind == FLOAT else 'int64'))
+            if kind == TIMESTAMP:
+                data = data.view('datetime64[s]')
+        else:
+            data = array.array('d' if kind == FLOAT else 'q', values)
+    elif kind == OBJECT:
+        data = [_convert_value('', v, {}, human_date) for v in raw]
+    else:
+        data = raw
+    nulls = (_is_null(v) for v in raw)
+    if numpy is not None:
+        if kind in (STRING, OBJECT):
+            data = numpy.array(data, dtype=object)
+        return Column(kind, data, numpy.fromiter(nulls, dtype=bool,
+                                                 count=count))
+    return Column(kind, data, bytearray(nulls))
+
+
+def _flatten(entry: Dict[str, Any], prefix: str,
+             human_date: bool) -> Iterable[Tuple[str, Any, bool]]:
+    """Yield the column name, raw value and timestamp flag of fields."""
+    for key, value in entry.items():
+        if _is_skipped(key, entry, human_date):
+            continue
+        if isinstance(value, dict):
+            yield from _flatten(value, f'{prefix}{key}.', human_date)
+        else:
+            yield f'{prefix}{key}', value, _is_timestamp(key, entry)
+
+
+def _infer(raw: List[Any]) -> str:
+    """Return the kind of a column from its raw values.
+
+    Columns mixing numbers and strings, holding lists or integers not
+    fitting into 64 bits are of the OBJECT kind. Columns of only NULL
+    values are treated as strings.
+    """
+    kind = None
+    for index, value in enumerate(raw):
+        if _is_null(value):
+            continue
+        value_kind = _kind(value)
+        if value_kind == STRING:
+            # Only the absence of other kinds remains to be checked
+            if kind is None and all(
+                    _is_null(v) or _kind(v) == STRING
+                    for v in itertools.islice(raw, index + 1, None)):
+                return STRING
+            return OBJECT
+        if value_kind == OBJECT:
+            return OBJECT
+        # Columns mixing integers and floats are floats
+        kind = value_kind if kind in (None, value_kind) else FLOAT
+    return STRING if kind is None else kind
+
+
+def _import_numpy() -> Any:
+    """Return the NumPy module, or None if it is not installed."""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        return None
+    return numpy
+
+
+def _is_null(value: Any) -> bool:
+    """Return whether a raw value is missing or NULL."""
+    return value is None or isinstance(value, str) and value == 'NULL'
+
+
+def _kind(value: Any) -> str:
+    """Return the kind of a raw value, following `_convert_value()`.
+
+    Only the decimal notations used by the API are recognised as
+    numbers, i.e. not "inf", "nan" or digits separated by underscores.
+    """
+    if not isinstance(value, str):
+        # Lists
+        return OBJECT
+    match = _NUMBER.fullmatch(value)
+    if match is None:
+        return STRING
+    if match.group('integer') is None:
+        # Integral values such as "1.0" are not converted
+        return STRING if float(value).is_integer() else FLOAT
+    return INTEGER if _INT64_MIN <= int(value) <= _INT64_MAX else OBJECT
@@ -9,3 +9,15 @@ DEFAULT_SERVICE_ID = 's:example'
 # A list of all known namespace
 KNOWN_NAMESPACES = ['eq2', 'ps2', 'ps2:v2', 'ps2ps4us', 'ps2ps4us:v2',
                     'ps2ps4eu', 'ps2ps4eu:v2', 'dcuo', 'dcuo:v1']
+
+# Collections whose contents only change with game updates
+STATIC_COLLECTIONS = ['ability', 'ability_type', 'achievement', 'currency',
+                      'experience', 'facility_type', 'faction', 'fire_group',
+                      'fire_mode', 'fire_mode_2', 'item', 'item_attachment',
+                      'item_category', 'item_to_weapon', 'item_type',
+                      'loadout', 'map_hex', 'map_region', 'metagame_event',
+                      'objective', 'profile', 'projectile', 'region',
+                      'resist_info', 'reward', 'skill', 'skill_category',
+                      'skill_line', 'skill_set', 'title', 'vehicle',
+                      'vehicle_attachment', 'vehicle_faction', 'weapon',
+                      'weapon_ammo_slot', 'world', 'zone']
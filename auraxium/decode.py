@@ -0,0 +1,164 @@
+"""JSON decoding of response bodies.
+
+Responses are decoded using the fastest JSON library available, orjson
+and ujson are preferred over the standard library's json module if
+they are installed. The backend may also be selected manually using
+`set_backend()`.
+
+The `ListStream` class allows decoding the "<collection>_list" array of
+a response one entry at a time as the body is being received, which
+keeps memory use bounded for very large responses.
+"""
+
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+_BACKENDS: Dict[str, Callable[[Any], Any]] = {'json': json.loads}
+try:
+    import ujson
+    _BACKENDS['ujson'] = ujson.loads
+except ImportError:  # pragma: no cover
+    pass
+try:
+    import orjson
+    _BACKENDS['orjson'] = orjson.loads
+except ImportError:  # pragma: no cover
+    pass
+
+# The backends in order of preference
+_PREFERENCE = ['orjson', 'ujson', 'json']
+
+_backend = next(b for b in _PREFERENCE if b in _BACKENDS)
+_loads = _BACKENDS[_backend]
+
+# Matches the opening of a response whose first key is the results list
+_LIST_START = re.compile(r'\s*{\s*"(\w+_list)"\s*:\s*\[')
+
+# Characters that may precede the next entry of the results list
+_WHITESPACE = ' \t\r\n'
+_SEPARATORS = _WHITESPACE + ','
+
+
+def available_backends() -> List[str]:
+    """Return the names of the installed JSON backends."""
+    return [b for b in _PREFERENCE if b in _BACKENDS]
+
+
+def get_backend() -> str:
+    """Return the name of the JSON backend in use."""
+    return _backend
+
+
+def loads(data: Any) -> Any:
+    """Decode a JSON document from bytes or str."""
+    return _loads(data)
+
+
+def set_backend(name: str) -> None:
+    """Select the JSON backend to use.
+
+    Raises:
+      * ValueError -- Raised if the given backend is not installed
+
+    """
+    global _backend, _loads
+    if name not in _BACKENDS:
+        raise ValueError(f'JSON backend "{name}" is not available')
+    _backend = name
+    _loads = _BACKENDS[name]
+
+
+class ListStream():
+    """Incrementally decode the results list of a response.
+
+    Iterating over this object yields the entries of the response's
+    "<collection>_list" array as they are received. Once exhausted,
+    `key` holds the name of the list and `remainder` any other
+    top-level keys of the response, such as "returned" or errors.
+
+    This relies on the results list being the first key of the
+    response, as is the case for the Census API. Any other responses
+    are decoded as a whole before their entries are yielded. Entries
+    are always decoded using the standard library's json module.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        """Initializer."""
+        self.key: Optional[str] = None
+        self.remainder: Dict[str, Any] = {}
+        self._chunks = chunks
+
+    def __iter__(self) -> Iterator[Any]:
+        decoder = json.JSONDecoder()
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        chunks = iter(self._chunks)
+        buffer = ''
+        # Find the start of the results list
+        for chunk in chunks:
+            buffer += text_decoder.decode(chunk)
+            match = _LIST_START.match(buffer)
+            if match is not None:
+                self.key = match.group(1)
+                buffer = buffer[match.end():]
+                break
+            # The list is not the first key if an array has been opened
+            if '[' in buffer:
+                break
+        else:
+            buffer += text_decoder.decode(b'', final=True)
+        if self.key is None:
+            yield from self._decode_whole(buffer, chunks, text_decoder)
+            return
+        # Decode the entries of the list as they become available
+        done = False
+        while not done:
+            pos = 0
+            while True:
+                # Skip to the start of the next entry
+                while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                    pos += 1
+                if pos < len(buffer) and buffer[pos] == ']':
+                    done = True
+                    pos += 1
+                    break
+                try:
+                    entry, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # The entry is incomplete
+                    break
+                # Wait for the delimiter to not truncate trailing numbers
+                if not buffer[end:].lstrip(_WHITESPACE):
+                    break
+                yield entry
+                pos = end
+            buffer = buffer[pos:]
+            if done:
+                break
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError('response ended inside the results list')
+            buffer += text_decoder.decode(chunk)
+        # Decode any keys following the list
+        for chunk in chunks:
+            buffer += text_decoder.decode(chunk)
+        buffer = (buffer + text_decoder.decode(b'', final=True)).strip()
+        if buffer.startswith(','):
+            self.remainder = json.loads('{' + buffer[1:])
+
+    def _decode_whole(self, buffer: str, chunks: Iterator[bytes],
+                      text_decoder: codecs.IncrementalDecoder
+                      ) -> Iterator[Any]:
+        """Decode the entire response and yield its list entries."""
+        for chunk in chunks:
+            buffer += text_decoder.decode(chunk)
+        buffer += text_decoder.decode(b'', final=True)
+        data: Dict[str, Any] = loads(buffer)
+        for key in data:
+            if key.endswith('_list'):
+                self.key = key
+                break
+        entries = data.pop(self.key, []) if self.key is not None else []
+        self.remainder = data
+        yield from entries
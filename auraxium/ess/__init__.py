@@ -9,3 +9,4 @@ https://github.com/leonhard-s/auraxium/wiki
 """
 
 from .client import Client
+from .supervisor import Supervisor
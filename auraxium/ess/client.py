@@ -1,12 +1,24 @@
 import asyncio
 import json
-from typing import Iterable, List, Optional
+import random
+from typing import Any, Dict, Iterable, List, Optional, Set
 import websockets
-from .constants import ESS_ENDPOINT
+from ..log import logger
+from .constants import BLOCK, ESS_ENDPOINT, HEARTBEAT_TIMEOUT
+from .dispatch import TriggerIndex
 from .event import Event
+from .pipeline import Dispatcher
 from .trigger import Trigger
 
 
+# The lists of a subscription message that can be cleared individually
+_SUBSCRIPTION_LISTS = ('eventNames', 'characters', 'worlds')
+
+
+class _StaleConnection(Exception):
+    """Raised when no messages were received for too long."""
+
+
 class Client():
     """The main client used for interacting with the ESS API.
 
@@ -15,53 +27,123 @@ class Client():
     corresponding events as they are encountered.
     """
 
-    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None,
+                 workers: int = 4, queue_size: int = 1000,
+                 overflow: str = BLOCK,
+                 heartbeat_timeout: Optional[float] = HEARTBEAT_TIMEOUT,
+                 backoff: float = 1.0, max_backoff: float = 60.0) -> None:
         self.loop = loop if loop is not None else asyncio.get_event_loop()
+        # Delivers events to the trigger callbacks, see its `stats()`
+        self.dispatcher = Dispatcher(self.loop, workers, queue_size, overflow)
+        # Reconnect if no message was received for this long
+        self.heartbeat_timeout = heartbeat_timeout
+        # Reconnection delays, doubling up to `max_backoff` per attempt
+        self.backoff = backoff
+        self.max_backoff = max_backoff
         self._is_connected = False
-        self._send_queue: List[str] = []
-        self._triggers: List[Trigger] = []
-        self._websocket: Optional[websockets.WebSocketClientProtocol] = None
+        # Set by `close()` to interrupt the reconnection delay
+        self._closed: Optional[asyncio.Event] = None
+        self._last_received = 0.0
+        self._processing = False
+        self._send_queue: Optional['asyncio.Queue[str]'] = None
+        self._triggers = TriggerIndex()
+        self._websocket: Optional[Any] = None
 
-    async def connect(self, service_id='s:example', namespace='ps2') -> None:
+    async def connect(self, service_id='s:example', namespace='ps2',
+                      endpoint: str = ESS_ENDPOINT) -> None:
         """Start the event streaming client.
 
         Opens the underlying websocket connection to the ESS. This
         method will not return until the `close` method is called.
+        Lost or stale connections are re-established after a backoff
+        delay, after which all triggers are subscribed again.
         """
         # If the client is already running, close it before restarting it
         if self._is_connected:
             await self.close()
         # Generate the URL required for connection
-        url = f'{ESS_ENDPOINT}?environment={namespace}&service-id={service_id}'
-        # Open the websocket connection
+        url = f'{endpoint}?environment={namespace}&service-id={service_id}'
         self._is_connected = True
-        async with websockets.connect(url) as websocket:
-            self._websocket = websocket
-            # This loop repeats until the "close" method is called
-            while self._is_connected:
-                # The outer try block gives some redundancy against connection
-                # drop-outs by automatically reconnecting.
-                try:
-                    # The inner try block employs a timeout to prevent the
-                    # global asyncio event loop from being blocked by a stale
-                    # or low-activity ESS connection.
-                    try:
-                        response: str = await asyncio.wait_for(
-                            self._websocket.recv(), timeout=0.5)
-                        self._process_response(response)
-                    except asyncio.TimeoutError:
-                        # If there are any items in the send queue, pick one
-                        try:
-                            await self._websocket.send(self._send_queue.pop(0))
-                        except IndexError:
-                            pass
-                except websockets.exceptions.ConnectionClosed as err:
-                    # Print the error and attempt to reconnect
-                    print(err)
-                    await self.close()
-                    await self.connect(service_id=service_id, namespace=namespace)
-
-    def _process_response(self, response: str) -> None:
+        self.dispatcher.closed = False
+        closed = self._closed = asyncio.Event()
+        attempt = 0
+        # This loop repeats until the "close" method is called
+        while self._is_connected:
+            try:
+                async with websockets.connect(url) as websocket:
+                    self._websocket = websocket
+                    attempt = 0
+                    await self._run(websocket)
+            except (OSError, asyncio.TimeoutError, _StaleConnection,
+                    websockets.exceptions.WebSocketException) as err:
+                if self._is_connected:
+                    logger.warning('ESS connection lost: %s', err)
+            finally:
+                self._websocket = None
+            if not self._is_connected:
+                break
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            attempt += 1
+            try:
+                # Wait for the delay, or until the client is closed
+                await asyncio.wait_for(
+                    closed.wait(), delay / 2 + random.uniform(0, delay / 2))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, websocket: Any) -> None:
+        """Serve a connection until its reader or writer fails."""
+        # Subscribe all triggers again, discarding any unsent messages
+        self._send_queue = asyncio.Queue()
+        for message in self._subscriptions():
+            self._send_queue.put_nowait(message)
+        self._last_received = self.loop.time()
+        tasks = [self.loop.create_task(self._read(websocket)),
+                 self.loop.create_task(self._write(websocket,
+                                                   self._send_queue))]
+        if self.heartbeat_timeout is not None:
+            tasks.append(self.loop.create_task(
+                self._watch(self.heartbeat_timeout)))
+        try:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in done:
+            # Re-raise the error that ended the connection
+            task.result()
+
+    async def _read(self, websocket: Any) -> None:
+        """Reader task processing incoming messages."""
+        while True:
+            self._last_received = self.loop.time()
+            response = await websocket.recv()
+            # Time spent waiting for room in the event queues does not
+            # count towards the heartbeat timeout
+            self._processing = True
+            try:
+                await self._process_response(response)
+            finally:
+                self._processing = False
+
+    async def _write(self, websocket: Any,
+                     queue: 'asyncio.Queue[str]') -> None:
+        """Writer task sending queued messages as soon as possible."""
+        while True:
+            await websocket.send(await queue.get())
+
+    async def _watch(self, timeout: float) -> None:
+        """Watchdog task raising once the connection has gone stale."""
+        while True:
+            remaining = self._last_received + timeout - self.loop.time()
+            if remaining <= 0.0 and not self._processing:
+                raise _StaleConnection(
+                    f'no messages received for {timeout} seconds')
+            await asyncio.sleep(max(remaining, timeout / 10))
+
+    async def _process_response(self, response: str) -> None:
         """Process a response received through the ESS."""
         data = json.loads(response)
         # Ignored messages
@@ -84,29 +166,67 @@ class Client():
             return
         # Event messages
         if data['service'] == 'event' and data['type'] == 'serviceMessage':
-            event = Event(data['payload'])
-            # Run the appropriate callbacks
-            for t in self._triggers:
-                # Only proceed if the trigger matches
-                if not t.evaluate(data['payload']):
-                    continue
-                self.loop.create_task(t.run(event))
-                if t.single_shot:
-                    self._remove_trigger(t)
+            await self._process_event(data['payload'])
 
-    async def close(self) -> None:
-        """Closes the client's underlying websocket connection."""
-        # Only proceed if the connection is open
-        if not self._is_connected:
+    async def _process_event(self, payload: Dict[str, str]) -> None:
+        """Queue an event payload for the matching triggers."""
+        triggers = self._triggers.match(payload)
+        if not triggers:
             return
-        self._is_connected = False
-        if self._websocket is not None and self._websocket.open:
-            await self._websocket.close()
+        event = Event(payload)
+        # Single-shot triggers are removed before the first await, so
+        # that events processed concurrently cannot fire them again
+        for t in triggers:
+            if t.single_shot:
+                self._remove_trigger(t)
+        # Run the appropriate callbacks
+        for t in triggers:
+            if t.single_shot:
+                await self.dispatcher.put(t, event)
+                # Its queue was released before the event was queued
+                self.dispatcher.release(t)
+            elif t in self._triggers:
+                # Triggers may be removed while waiting for room in the
+                # queue of another trigger
+                await self.dispatcher.put(t, event)
+
+    async def close(self) -> None:
+        """Closes the client's underlying websocket connection.
+
+        This also stops the delivery of events, any events still queued
+        for the trigger callbacks are discarded.
+        """
+        if self._is_connected:
+            self._is_connected = False
+            if self._closed is not None:
+                self._closed.set()
+            if self._websocket is not None:
+                await self._websocket.close()
+        await self.dispatcher.close()
 
     def _add_trigger(self, trigger: Trigger) -> None:
         """Add a new trigger to a the client."""
-        self._triggers.append(trigger)
-        self._send_queue.append(trigger.generate_subscription())
+        self._triggers.add(trigger)
+        self._send(trigger.generate_subscription())
+
+    def _send(self, message: str) -> None:
+        """Send a message if connected."""
+        # Subscriptions added while disconnected are sent on connection
+        if self._websocket is not None and self._send_queue is not None:
+            self._send_queue.put_nowait(message)
+
+    def _subscriptions(self) -> List[str]:
+        """Return the subscription messages to send on connection."""
+        return [t.generate_subscription() for t in self._triggers]
+
+    def _unsubscribe(self, message: str) -> None:
+        """Clear the parts of a removed subscription no longer needed."""
+        # Subscriptions are only cleared on the open connection, the
+        # next one only subscribes the remaining ones anyway
+        if self._websocket is None:
+            return
+        for clear in _clear_messages(message, self._subscriptions()):
+            self._send(clear)
 
     def _remove_trigger(self, trigger: Trigger) -> None:
         """Removes a trigger from the client.
@@ -115,12 +235,9 @@ class Client():
           * ValueError -- Raised if the given trigger has not been
             added yet
         """
-        try:
-            self._triggers.remove(trigger)
-        except ValueError as err:
-            msg = 'The given trigger could not be found'
-            raise ValueError(msg) from err
-        # TODO: Clean-up code for tidying up orphan subscriptions
+        self._triggers.remove(trigger)
+        self.dispatcher.release(trigger)
+        self._unsubscribe(trigger.generate_subscription())
 
     async def wait_for_event(self, event_name: str, *args: str,
                              character_ids: Iterable[int] = [],
@@ -153,3 +270,31 @@ class Client():
         except TimeoutError as err:
             raise TimeoutError from err
         return _received_event
+
+
+def _clear_messages(removed: str, remaining: List[str]) -> List[str]:
+    """Return the messages undoing a subscription.
+
+    Event names, characters and worlds only subscribed to by the
+    removed message are cleared. If this includes "all" characters or
+    worlds, every subscription is cleared and the remaining ones are
+    sent again, as these cannot be cleared on their own.
+    """
+    kept: Dict[str, Set[str]] = {k: set() for k in _SUBSCRIPTION_LISTS}
+    for message in remaining:
+        data = json.loads(message)
+        for key in _SUBSCRIPTION_LISTS:
+            kept[key].update(data.get(key, ()))
+    data = json.loads(removed)
+    cleared: Dict[str, Any] = {}
+    for key in _SUBSCRIPTION_LISTS:
+        values = sorted(set(data.get(key, ())) - kept[key])
+        if values:
+            cleared[key] = values
+    if not cleared:
+        return []
+    if any('all' in v for v in cleared.values()):
+        return [json.dumps({'action': 'clearSubscribe', 'all': 'true',
+                            'service': 'event'}), *remaining]
+    return [json.dumps({'action': 'clearSubscribe', **cleared,
+                        'service': 'event'})]
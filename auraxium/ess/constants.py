@@ -2,3 +2,21 @@
 
 # The endpoint URL used to connect to the ESS.
 ESS_ENDPOINT = 'wss://push.planetside2.com/streaming'
+
+# Overflow policies of the per-trigger event queues
+BLOCK = 'block'  # Pause the websocket reader until there is room
+DROP_OLDEST = 'drop_oldest'  # Discard the oldest queued event
+COALESCE = 'coalesce'  # Replace a queued event with the same key
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, COALESCE)
+
+# Connections receiving no messages, not even heartbeats, for this many
+# seconds are considered stale and re-established.
+HEARTBEAT_TIMEOUT = 75.0
+
+# Ways of distributing subscriptions across the connections of a
+# `Supervisor`
+SHARD_BY_EVENT = 'event'
+SHARD_BY_WORLD = 'world'
+
+# The IDs of the PlanetSide 2 worlds, used when sharding by world
+WORLD_IDS = (1, 10, 13, 17, 19, 40)
@@ -0,0 +1,191 @@
+"""Indexed lookup of the triggers matching an ESS event.
+
+Rather than evaluating every trigger for every event, the triggers are
+indexed by event name, then by character ID or world ID. An event only
+visits the triggers that may match it, which keeps dispatch cheap even
+with thousands of per-character triggers.
+"""
+
+import itertools
+from typing import Dict, Iterator, List, Optional, Set
+from .trigger import Trigger
+
+
+class _WorldIndex():
+    """A group of triggers, indexed by the world IDs they filter by."""
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self.members: Set[Trigger] = set()
+        # Triggers not filtering by world
+        self.any_world: Set[Trigger] = set()
+        self.worlds: Dict[int, Set[Trigger]] = {}
+
+    def add(self, trigger: Trigger, worlds: Optional[Set[int]]) -> None:
+        """Add a trigger filtering by the given world IDs."""
+        self.members.add(trigger)
+        if worlds is None:
+            self.any_world.add(trigger)
+        for id_ in worlds or ():
+            self.worlds.setdefault(id_, set()).add(trigger)
+
+    def remove(self, trigger: Trigger, worlds: Optional[Set[int]]) -> None:
+        """Remove a trigger filtering by the given world IDs."""
+        self.members.discard(trigger)
+        self.any_world.discard(trigger)
+        _discard(self.worlds, worlds, trigger)
+
+    def match(self, payload: Dict[str, str]) -> Set[Trigger]:
+        """Return the triggers whose world filter matches a payload.
+
+        The returned set must not be modified.
+        """
+        # Events without a world are not filtered by world
+        if 'world_id' not in payload:
+            return self.members
+        world_id = _to_int(payload['world_id'])
+        if world_id is None or world_id not in self.worlds:
+            return self.any_world
+        return self.any_world | self.worlds[world_id]
+
+
+class _EventIndex():
+    """The triggers for a single event name."""
+
+    def __init__(self) -> None:
+        """Initializer."""
+        # Triggers filtering by character, by each of their character IDs
+        self.characters: Dict[int, Set[Trigger]] = {}
+        self.character_filtered = _WorldIndex()
+        # Triggers not filtering by character
+        self.unfiltered = _WorldIndex()
+        # The world IDs filtered by for each trigger
+        self.world_ids: Dict[Trigger, Optional[Set[int]]] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.world_ids)
+
+    def add(self, trigger: Trigger) -> None:
+        """Add a trigger to the index."""
+        characters = _filter_ids(trigger.character_ids)
+        worlds = _filter_ids(trigger.world_ids)
+        self.world_ids[trigger] = worlds
+        if characters is None:
+            self.unfiltered.add(trigger, worlds)
+            return
+        self.character_filtered.add(trigger, worlds)
+        for id_ in characters:
+            self.characters.setdefault(id_, set()).add(trigger)
+
+    def remove(self, trigger: Trigger) -> None:
+        """Remove a trigger from the index."""
+        worlds = self.world_ids.pop(trigger)
+        if trigger in self.unfiltered.members:
+            self.unfiltered.remove(trigger, worlds)
+            return
+        self.character_filtered.remove(trigger, worlds)
+        _discard(self.characters, _filter_ids(trigger.character_ids), trigger)
+
+    def match(self, payload: Dict[str, str]) -> Set[Trigger]:
+        """Return the triggers matching an event payload."""
+        matches = set(self.unfiltered.match(payload))
+        # Events without a character are not filtered by character
+        if 'character_id' not in payload:
+            return matches | self.character_filtered.match(payload)
+        world_id = _to_int(payload.get('world_id'))
+        for key in ('character_id', 'attacker_character_id'):
+            id_ = _to_int(payload.get(key))
+            if id_ is None or id_ not in self.characters:
+                continue
+            for trigger in self.characters[id_]:
+                worlds = self.world_ids[trigger]
+                if ('world_id' not in payload or worlds is None
+                        or world_id in worlds):
+                    matches.add(trigger)
+        return matches
+
+
+class TriggerIndex():
+    """A collection of triggers indexed for event dispatch.
+
+    Triggers must not be modified while they are part of the index;
+    remove and re-add them instead.
+    """
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self._counter = itertools.count()
+        self._events: Dict[str, _EventIndex] = {}
+        self._order: Dict[Trigger, int] = {}
+
+    def __contains__(self, trigger: object) -> bool:
+        return trigger in self._order
+
+    def __iter__(self) -> Iterator[Trigger]:
+        return iter(list(self._order))
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, trigger: Trigger) -> None:
+        """Add a trigger to the index.
+
+        Adding a trigger that is already part of the index has no
+        effect.
+        """
+        if trigger in self._order:
+            return
+        self._order[trigger] = next(self._counter)
+        for name in trigger.events:
+            self._events.setdefault(name, _EventIndex()).add(trigger)
+
+    def remove(self, trigger: Trigger) -> None:
+        """Remove a trigger from the index.
+
+        Raises:
+          * ValueError -- Raised if the given trigger has not been
+            added yet
+        """
+        if trigger not in self._order:
+            raise ValueError('The given trigger could not be found')
+        del self._order[trigger]
+        for name in trigger.events:
+            index = self._events[name]
+            index.remove(trigger)
+            if not index:
+                del self._events[name]
+
+    def match(self, payload: Dict[str, str]) -> List[Trigger]:
+        """Return the triggers matching an event payload.
+
+        The triggers are returned in the order they were added in.
+        """
+        index = self._events.get(payload.get('event_name', ''))
+        if index is None:
+            return []
+        return sorted(index.match(payload), key=self._order.__getitem__)
+
+
+def _discard(buckets: Dict[int, Set[Trigger]], ids: Optional[Set[int]],
+             trigger: Trigger) -> None:
+    """Remove a trigger from the buckets of the given IDs."""
+    for id_ in ids or ():
+        bucket = buckets[id_]
+        bucket.discard(trigger)
+        if not bucket:
+            del buckets[id_]
+
+
+def _filter_ids(ids: Set[int]) -> Optional[Set[int]]:
+    """Return the IDs filtered by, or None if not filtering."""
+    if not ids or 'all' in ids:
+        return None
+    return {int(i) for i in ids}
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    """Convert a payload ID, returning None if it is not an integer."""
+    try:
+        return int(value)  # type: ignore
+    except (TypeError, ValueError):
+        return None
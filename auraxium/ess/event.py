@@ -1,23 +1,244 @@
+"""Event objects created from ESS event payloads.
+
+Events keep the raw payload received and only convert fields when they
+are accessed, so an event that is never inspected costs little more
+than the payload itself. Common event names have typed layouts, i.e.
+`Death` or `GainExperience`, whose fields convert to their declared
+type. Any other payload field is available as an attribute as well,
+converted to an integer or float where possible:
+
+    event = Event(payload)  # Returns a `Death` for deaths
+    if event.is_headshot:
+        print(event.attacker_character_id, event.timestamp)
+"""
+
 from datetime import datetime
-from typing import Dict
+from typing import Any, Callable, Dict, Generic, Optional, Type, TypeVar
+
+_T = TypeVar('_T')
+
+# The event classes by event name
+_EVENT_TYPES: Dict[str, Type['Event']] = {}
+
+
+class _Field(Generic[_T]):
+    """A payload field converted on access.
+
+    Fields missing from the payload are returned as None, as are values
+    that cannot be converted, such as the "" or "NULL" sent for unset
+    IDs.
+    """
+
+    __slots__ = ('convert', 'name')
+
+    def __init__(self, convert: Callable[[str], _T]) -> None:
+        """Initializer."""
+        self.convert = convert
+        self.name = ''
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Optional['Event'],
+                owner: type) -> Optional[_T]:
+        if instance is None:
+            return self  # type: ignore
+        try:
+            value = instance.raw[self.name]
+        except KeyError:
+            return None
+        try:
+            return self.convert(value)
+        except ValueError:
+            return None
+
+
+def _bool(value: str) -> bool:
+    """Convert a payload flag."""
+    return value not in ('0', '')
+
+
+def _timestamp(value: str) -> datetime:
+    """Convert a payload timestamp."""
+    try:
+        return datetime.utcfromtimestamp(int(value))
+    except (TypeError, ValueError) as err:
+        raise ValueError(f'invalid timestamp: {value}') from err
+
+
+def _value(value: str) -> Any:
+    """Convert a payload value of unknown type."""
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
 
 
 class Event():
+    """An event received through the ESS.
+
+    Instantiating `Event` returns an instance of the typed subclass for
+    the payload's event name, if there is one.
+    """
+
+    __slots__ = ('raw',)
+
+    event_name = _Field(str)
+    timestamp = _Field(_timestamp)
+    world_id = _Field(int)
+
+    def __new__(cls, payload: Dict[str, str]) -> 'Event':
+        if cls is Event:
+            cls = _EVENT_TYPES.get(payload.get('event_name', ''), cls)
+        return super().__new__(cls)
+
     def __init__(self, payload: Dict[str, str]) -> None:
+        """Initializer."""
+        self.raw = payload
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)  # type: ignore
+        _EVENT_TYPES[cls.__name__] = cls
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not declared as typed fields
+        if name == 'raw':
+            raise AttributeError(name)
         try:
-            timestamp = int(payload['timestamp'])
-        except TypeError:
-            raise ValueError(f'invalid timestamp: {payload["timestamp"]}')
-        self.timestamp = datetime.utcfromtimestamp(timestamp)
-        self.payload = {}
-        # Convert datatypes
-        for key, value in payload.items():
-            if key == 'timestamp':
-                self.payload[key] = datetime.utcfromtimestamp(int(value))
-            try:
-                self.payload[key] = int(value)
-            except ValueError:
-                try:
-                    self.payload[key] = float(value)
-                except ValueError:
-                    self.payload[key] = value
+            return _value(self.raw[name])
+        except KeyError:
+            raise AttributeError(
+                f'{type(self).__name__!r} event has no field {name!r}'
+            ) from None
+
+    def __reduce__(self) -> Any:
+        return type(self), (self.raw,)
+
+    def __repr__(self) -> str:
+        return f'<{type(self).__name__}: {self.raw}>'
+
+    @property
+    def payload(self) -> Dict[str, Any]:
+        """A new dictionary of all converted payload fields."""
+        return {k: getattr(self, k) for k in self.raw}
+
+
+class AchievementEarned(Event):
+    """A character earned an achievement."""
+
+    __slots__ = ()
+
+    achievement_id = _Field(int)
+    character_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class BattleRankUp(Event):
+    """A character reached a new battle rank."""
+
+    __slots__ = ()
+
+    battle_rank = _Field(int)
+    character_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class Death(Event):
+    """A character was killed."""
+
+    __slots__ = ()
+
+    attacker_character_id = _Field(int)
+    attacker_fire_mode_id = _Field(int)
+    attacker_loadout_id = _Field(int)
+    attacker_vehicle_id = _Field(int)
+    attacker_weapon_id = _Field(int)
+    character_id = _Field(int)
+    character_loadout_id = _Field(int)
+    is_critical = _Field(_bool)
+    is_headshot = _Field(_bool)
+    vehicle_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class FacilityControl(Event):
+    """A facility was captured or defended by a faction."""
+
+    __slots__ = ()
+
+    duration_held = _Field(int)
+    facility_id = _Field(int)
+    new_faction_id = _Field(int)
+    old_faction_id = _Field(int)
+    outfit_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class GainExperience(Event):
+    """A character gained experience."""
+
+    __slots__ = ()
+
+    amount = _Field(int)
+    character_id = _Field(int)
+    experience_id = _Field(int)
+    loadout_id = _Field(int)
+    other_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class PlayerFacilityCapture(Event):
+    """A character took part in capturing a facility."""
+
+    __slots__ = ()
+
+    character_id = _Field(int)
+    facility_id = _Field(int)
+    outfit_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class PlayerFacilityDefend(Event):
+    """A character took part in defending a facility."""
+
+    __slots__ = ()
+
+    character_id = _Field(int)
+    facility_id = _Field(int)
+    outfit_id = _Field(int)
+    zone_id = _Field(int)
+
+
+class PlayerLogin(Event):
+    """A character logged in."""
+
+    __slots__ = ()
+
+    character_id = _Field(int)
+
+
+class PlayerLogout(Event):
+    """A character logged out."""
+
+    __slots__ = ()
+
+    character_id = _Field(int)
+
+
+class VehicleDestroy(Event):
+    """A vehicle was destroyed."""
+
+    __slots__ = ()
+
+    attacker_character_id = _Field(int)
+    attacker_loadout_id = _Field(int)
+    attacker_vehicle_id = _Field(int)
+    attacker_weapon_id = _Field(int)
+    character_id = _Field(int)
+    facility_id = _Field(int)
+    faction_id = _Field(int)
+    vehicle_id = _Field(int)
+    zone_id = _Field(int)
@@ -0,0 +1,302 @@
+"""Bounded delivery of ESS events to trigger callbacks.
+
+Every trigger has its own queue of pending events, which a pool of
+worker tasks drains by running the trigger's callback. Callbacks of a
+trigger run one at a time and in the order the events were received,
+while different triggers are served concurrently.
+
+Queues are bounded. Once a queue is full, its overflow policy decides
+what happens to new events:
+
+* `BLOCK` pauses the websocket reader until the callback catches up
+* `DROP_OLDEST` discards the oldest queued event
+* `COALESCE` replaces the queued event with the same key as the new
+  one, i.e. the same event name, character and world, and otherwise
+  discards the oldest queued event
+
+Queue depths and drop counts are available through `stats()` and
+`export_prometheus()`.
+"""
+
+import asyncio
+import collections
+from typing import (Any, Callable, Deque, Dict, Hashable, List, NamedTuple,
+                    Optional)
+from ..log import logger
+from .constants import BLOCK, COALESCE, OVERFLOW_POLICIES
+from .event import Event
+from .trigger import Trigger
+
+CoalesceKey = Callable[[Event], Hashable]
+
+
+class DispatchStats(NamedTuple):
+    """Counters of an event queue, or the totals of all queues."""
+
+    depth: int
+    delivered: int
+    failed: int
+    dropped: int
+    coalesced: int
+
+
+def default_key(event: Event) -> Hashable:
+    """Return the key under which events are coalesced."""
+    raw = event.raw
+    return (raw.get('event_name'), raw.get('character_id'),
+            raw.get('world_id'))
+
+
+class _TriggerQueue():
+    """The pending events of a single trigger."""
+
+    __slots__ = ('trigger', 'overflow', 'maxsize', 'events', 'keys',
+                 'scheduled', 'released', 'not_full', 'delivered', 'failed',
+                 'dropped', 'coalesced')
+
+    def __init__(self, trigger: Trigger, overflow: str, maxsize: int) -> None:
+        """Initializer."""
+        self.trigger = trigger
+        self.overflow = overflow
+        self.maxsize = maxsize
+        # In coalescing queues, events are wrapped in mutable cells and
+        # the most recent cell for each key is tracked
+        self.events: Deque[Any] = collections.deque()
+        self.keys: Dict[Hashable, List[Any]] = {}
+        self.scheduled = False
+        self.released = False
+        self.not_full: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def pop(self) -> Event:
+        """Remove and return the oldest event."""
+        item = self.events.popleft()
+        if self.overflow != COALESCE:
+            return item
+        key, event = item
+        if self.keys.get(key) is item:
+            del self.keys[key]
+        return event
+
+    def push(self, event: Event, key: Hashable) -> bool:
+        """Append an event, applying the overflow policy if full.
+
+        Return whether the queue grew; it does not if an event was
+        dropped or replaced instead.
+        """
+        if self.overflow != COALESCE:
+            if len(self.events) < self.maxsize or self.overflow == BLOCK:
+                self.events.append(event)
+                return True
+            self.events.popleft()
+            self.events.append(event)
+            self.dropped += 1
+            return False
+        cell = self.keys.get(key)
+        if cell is not None and len(self.events) >= self.maxsize:
+            cell[1] = event
+            self.coalesced += 1
+            return False
+        cell = [key, event]
+        self.keys[key] = cell
+        if len(self.events) < self.maxsize:
+            self.events.append(cell)
+            return True
+        self.pop()
+        self.events.append(cell)
+        self.dropped += 1
+        return False
+
+    def stats(self) -> DispatchStats:
+        """Return the counters of the queue."""
+        return DispatchStats(len(self.events), self.delivered, self.failed,
+                             self.dropped, self.coalesced)
+
+
+class Dispatcher():
+    """Delivers events to trigger callbacks using a pool of workers.
+
+    The workers are started on the given event loop when the first
+    event is queued. `queue_size` and `overflow` are the defaults for
+    triggers not specifying their own. Once closed, any events put are
+    discarded until `closed` is reset.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, workers: int = 4,
+                 queue_size: int = 1000, overflow: str = BLOCK,
+                 coalesce_key: CoalesceKey = default_key) -> None:
+        """Initializer."""
+        if workers < 1 or queue_size < 1:
+            raise ValueError('the worker count and queue size must be '
+                             'positive')
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy "{overflow}"')
+        self.loop = loop
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.coalesce_key = coalesce_key
+        self.closed = False
+        self._queues: Dict[Trigger, _TriggerQueue] = {}
+        # Totals of queues that were removed
+        self._retired = DispatchStats(0, 0, 0, 0, 0)
+        self._ready: Optional['asyncio.Queue[_TriggerQueue]'] = None
+        self._tasks: List['asyncio.Task[None]'] = []
+        self._unfinished = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    async def put(self, trigger: Trigger, event: Event) -> None:
+        """Queue an event for a trigger.
+
+        If the trigger's queue is full and its overflow policy is
+        `BLOCK`, this waits until the queue has room, or until the
+        dispatcher is closed.
+        """
+        if self.closed:
+            return
+        queue = self._queues.get(trigger)
+        if queue is None:
+            queue = self._queues[trigger] = _TriggerQueue(
+                trigger, trigger.overflow or self.overflow,
+                trigger.queue_size or self.queue_size)
+        elif queue.released:
+            # The trigger was added again before its queue was drained
+            queue.released = False
+        while queue.overflow == BLOCK and len(queue) >= queue.maxsize:
+            if queue.not_full is None:
+                queue.not_full = asyncio.Event()
+            queue.not_full.clear()
+            await queue.not_full.wait()
+            if self.closed:
+                return
+        key = self.coalesce_key(event) if queue.overflow == COALESCE else None
+        if queue.push(event, key):
+            self._unfinished += 1
+        if not queue.scheduled:
+            queue.scheduled = True
+            self._start()
+            self._ready.put_nowait(queue)  # type: ignore
+
+    def release(self, trigger: Trigger) -> None:
+        """Remove a trigger's queue once its events have been delivered."""
+        queue = self._queues.get(trigger)
+        if queue is None:
+            return
+        queue.released = True
+        if not queue.scheduled:
+            self._retire(queue)
+
+    async def join(self) -> None:
+        """Wait until all queued events have been delivered."""
+        while self._unfinished:
+            if self._idle is None:
+                self._idle = asyncio.Event()
+            self._idle.clear()
+            await self._idle.wait()
+
+    async def close(self) -> None:
+        """Stop the workers, discarding any queued events.
+
+        This may be called from a callback, whose worker is cancelled
+        once the callback returns control to the event loop.
+        """
+        self.closed = True
+        current = asyncio.current_task()
+        tasks = [t for t in self._tasks if t is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if current is not None and current in self._tasks:
+            current.cancel()
+        self._tasks = []
+        self._ready = None
+        for queue in list(self._queues.values()):
+            queue.events.clear()
+            queue.keys.clear()
+            queue.scheduled = False
+            if queue.not_full is not None:
+                queue.not_full.set()
+            if queue.released:
+                self._retire(queue)
+        # This includes the events whose callbacks were cancelled
+        self._finish(self._unfinished)
+
+    def stats(self, trigger: Optional[Trigger] = None) -> DispatchStats:
+        """Return the counters of a trigger's queue, or the totals.
+
+        The totals include triggers that have since been removed.
+        """
+        if trigger is not None:
+            queue = self._queues.get(trigger)
+            if queue is None:
+                return DispatchStats(0, 0, 0, 0, 0)
+            return queue.stats()
+        totals = list(self._retired)
+        for queue in self._queues.values():
+            totals = [a + b for a, b in zip(totals, queue.stats())]
+        return DispatchStats(*totals)
+
+    def export_prometheus(self, prefix: str = 'auraxium') -> str:
+        """Return the total counters in Prometheus text format."""
+        stats = self.stats()
+        lines = [f'# TYPE {prefix}_ess_queue_depth gauge',
+                 f'{prefix}_ess_queue_depth {stats.depth}']
+        for name in ('delivered', 'failed', 'dropped', 'coalesced'):
+            lines.append(f'# TYPE {prefix}_ess_events_{name}_total counter')
+            lines.append(f'{prefix}_ess_events_{name}_total '
+                         f'{getattr(stats, name)}')
+        return '\n'.join(lines) + '\n'
+
+    def _finish(self, count: int) -> None:
+        """Mark a number of queued events as finished."""
+        self._unfinished -= count
+        if not self._unfinished and self._idle is not None:
+            self._idle.set()
+
+    def _retire(self, queue: _TriggerQueue) -> None:
+        """Remove a queue, keeping its counters in the totals."""
+        if self._queues.get(queue.trigger) is queue:
+            del self._queues[queue.trigger]
+            self._retired = DispatchStats(*[
+                a + b for a, b in zip(self._retired, queue.stats())])
+
+    def _start(self) -> None:
+        """Start the worker tasks, if not running yet."""
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._tasks = [self.loop.create_task(self._work())
+                       for _ in range(self.workers)]
+
+    async def _work(self) -> None:
+        """Worker task running the callbacks of queued events."""
+        ready = self._ready
+        assert ready is not None
+        while True:
+            queue = await ready.get()
+            event = queue.pop()
+            if queue.not_full is not None:
+                queue.not_full.set()
+            try:
+                await queue.trigger.run(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # pylint: disable=broad-except
+                queue.failed += 1
+                logger.exception('Callback of trigger %r failed',
+                                 queue.trigger)
+            else:
+                queue.delivered += 1
+            self._finish(1)
+            if queue.events:
+                ready.put_nowait(queue)
+            else:
+                queue.scheduled = False
+                if queue.released:
+                    self._retire(queue)
@@ -0,0 +1,427 @@
+"""Sharded ingestion of ESS events across multiple connections.
+
+A single websocket cannot keep up with all events of all worlds at
+peak times. The `Supervisor` is a `Client` that distributes the
+subscriptions of its triggers across several connections ("shards"),
+either by event name or by world ID, so that every event is received
+by exactly one shard.
+
+Shards only receive and decode events. Matching events to triggers and
+running callbacks still happens in the supervisor, so callbacks need
+not be picklable. With `processes=True` every shard runs in a worker
+process of its own and forwards decoded event payloads in batches over
+a pipe, which spreads the cost of decoding across cores:
+
+    supervisor = Supervisor(shards=4, processes=True)
+    supervisor._add_trigger(trigger)
+    await supervisor.connect(service_id='s:example')
+
+Each shard reconnects and resubscribes on its own.
+"""
+
+import asyncio
+import itertools
+import json
+import multiprocessing
+import threading
+from typing import (Any, Awaitable, Callable, Dict, Iterable, List, Optional,
+                    Tuple)
+from ..log import logger
+from .client import Client
+from .constants import (ESS_ENDPOINT, HEARTBEAT_TIMEOUT, SHARD_BY_EVENT,
+                        SHARD_BY_WORLD, WORLD_IDS)
+from .trigger import Trigger
+
+Payload = Dict[str, str]
+
+# The maximum number of payloads forwarded per batch, and the delay
+# after which incomplete batches are forwarded anyway
+_BATCH_SIZE = 256
+_BATCH_DELAY = 0.005
+# The maximum number of batches buffered per worker process
+_MAX_BATCHES = 16
+
+
+class _Shard(Client):
+    """A connection forwarding event payloads rather than dispatching them."""
+
+    def __init__(self, sink: Callable[[Payload], Awaitable[None]],
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 **kwargs: Any) -> None:
+        """Initializer."""
+        super().__init__(loop, **kwargs)
+        self._sink = sink
+        self._messages: List[str] = []
+
+    def subscribe(self, message: str) -> None:
+        """Add a subscription message, sending it if connected."""
+        self._messages.append(message)
+        self._send(message)
+
+    def discard(self, message: str) -> None:
+        """Remove a subscription message, clearing it if connected."""
+        if message in self._messages:
+            self._messages.remove(message)
+            self._unsubscribe(message)
+
+    async def _process_event(self, payload: Payload) -> None:
+        await self._sink(payload)
+
+    def _subscriptions(self) -> List[str]:
+        return list(self._messages)
+
+
+class _LocalLink():
+    """A shard running on the supervisor's event loop."""
+
+    def __init__(self, supervisor: 'Supervisor', index: int) -> None:
+        """Initializer."""
+        self.closed = False
+        # pylint: disable=protected-access
+        self.shard = _Shard(supervisor._process_event, supervisor.loop,
+                            **supervisor.shard_options)
+        for message in supervisor._shard_messages(index):
+            self.shard.subscribe(message)
+
+    def subscribe(self, message: str) -> None:
+        """Add a subscription to the shard."""
+        self.shard.subscribe(message)
+
+    def discard(self, message: str) -> None:
+        """Remove a subscription from the shard."""
+        self.shard.discard(message)
+
+    async def run(self, connect: Tuple[str, str, str]) -> None:
+        """Serve the shard until it is closed."""
+        if not self.closed:
+            await self.shard.connect(*connect)
+
+    async def close(self) -> None:
+        """Close the shard's connection."""
+        self.closed = True
+        await self.shard.close()
+
+
+class _ProcessLink():
+    """A shard running in a worker process.
+
+    Batches of payloads are received on a background thread and handed
+    to the event loop through a bounded queue. While the supervisor
+    falls behind, the thread, the pipe and eventually the worker's
+    websocket reader are blocked in turn. Worker processes exiting
+    unexpectedly are restarted with the shard's current subscriptions.
+    """
+
+    def __init__(self, supervisor: 'Supervisor', index: int) -> None:
+        """Initializer."""
+        self.closed = False
+        self.supervisor = supervisor
+        self.index = index
+        self._control: Any = None
+        # Set by `close()` to interrupt the restart delay
+        self._stopped = asyncio.Event()
+
+    def subscribe(self, message: str) -> None:
+        """Add a subscription to the shard."""
+        self._notify(('subscribe', message))
+
+    def discard(self, message: str) -> None:
+        """Remove a subscription from the shard."""
+        self._notify(('discard', message))
+
+    async def run(self, connect: Tuple[str, str, str]) -> None:
+        """Run worker processes and process their events until closed."""
+        options = self.supervisor.shard_options
+        attempt = 0
+        while not self.closed:
+            if await self._serve(connect):
+                # Only back off further while workers fail right away
+                attempt = 0
+            if self.closed:
+                break
+            logger.warning('ESS shard process exited, restarting')
+            delay = min(options['max_backoff'],
+                        options['backoff'] * 2 ** attempt)
+            attempt += 1
+            try:
+                await asyncio.wait_for(self._stopped.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        """Ask the worker process to close its connection and exit."""
+        self.closed = True
+        self._stopped.set()
+        if self._control is not None:
+            try:
+                self._control.send(None)
+            except OSError:
+                pass
+
+    def _notify(self, command: Tuple[str, str]) -> None:
+        """Forward a subscription change to the worker process."""
+        if self._control is not None:
+            try:
+                self._control.send(command)
+            except OSError:
+                # The worker is restarted with all subscriptions
+                pass
+
+    async def _serve(self, connect: Tuple[str, str, str]) -> bool:
+        """Start a worker process and process its events until it exits.
+
+        Returns whether any events were received from the worker.
+        """
+        # pylint: disable=protected-access
+        messages = self.supervisor._shard_messages(self.index)
+        loop = self.supervisor.loop
+        context = multiprocessing.get_context('spawn')
+        events_out, events_in = context.Pipe(duplex=False)
+        control_out, control_in = context.Pipe(duplex=False)
+        batches: 'asyncio.Queue[Optional[List[Payload]]]' = asyncio.Queue(
+            _MAX_BATCHES)
+        process = context.Process(
+            target=_worker, daemon=True, name='auraxium-ess-shard',
+            args=(connect, messages, self.supervisor.shard_options,
+                  events_in, control_out))
+        process.start()
+        # The parent's copies of the child's pipe ends must be closed to
+        # detect the child exiting
+        events_in.close()
+        control_out.close()
+        self._control = control_in
+        threading.Thread(target=_receive, args=(events_out, batches, loop),
+                         daemon=True).start()
+        handle = self.supervisor._process_event
+        received = False
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+                received = True
+                for payload in batch:
+                    await handle(payload)
+        finally:
+            self._control = None
+            control_in.close()
+            await loop.run_in_executor(None, process.join)
+        return received
+
+
+def _receive(events: Any, batches: 'asyncio.Queue[Optional[List[Payload]]]',
+             loop: asyncio.AbstractEventLoop) -> None:
+    """Forward batches from a worker process to the event loop."""
+    while True:
+        try:
+            batch = events.recv()
+        except (EOFError, OSError):
+            batch = None
+        try:
+            asyncio.run_coroutine_threadsafe(batches.put(batch), loop).result()
+        except RuntimeError:
+            # The event loop has been closed
+            return
+        if batch is None:
+            events.close()
+            return
+
+
+class Supervisor(Client):
+    """A client distributing its subscriptions across several connections.
+
+    Subscriptions are sharded by event name (`SHARD_BY_EVENT`) or by
+    world (`SHARD_BY_WORLD`). When sharding by world, triggers without
+    a world filter subscribe to the given `worlds` on every shard.
+    Event names and worlds are assigned to shards round-robin, in the
+    order they are first encountered.
+
+    All other keyword arguments are those of `Client`; the heartbeat
+    timeout and backoff apply to every shard.
+    """
+
+    def __init__(self, shards: int = 2, by: str = SHARD_BY_EVENT,
+                 processes: bool = False,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 worlds: Iterable[int] = WORLD_IDS,
+                 heartbeat_timeout: Optional[float] = HEARTBEAT_TIMEOUT,
+                 backoff: float = 1.0, max_backoff: float = 60.0,
+                 **kwargs: Any) -> None:
+        """Initializer."""
+        if shards < 1:
+            raise ValueError('the number of shards must be positive')
+        if by not in (SHARD_BY_EVENT, SHARD_BY_WORLD):
+            raise ValueError(f'unknown sharding "{by}"')
+        super().__init__(loop, heartbeat_timeout=heartbeat_timeout,
+                         backoff=backoff, max_backoff=max_backoff, **kwargs)
+        self.shards = shards
+        self.by = by
+        self.processes = processes
+        self.worlds = tuple(worlds)
+        # The options passed to the client of every shard
+        self.shard_options: Dict[str, Any] = {
+            'heartbeat_timeout': heartbeat_timeout, 'backoff': backoff,
+            'max_backoff': max_backoff}
+        self._assigned: Dict[Any, int] = {}
+        self._counter = itertools.count()
+        # The subscription message of each live trigger, for every shard
+        self._messages: List[Dict[Trigger, str]] = [
+            {} for _ in range(shards)]
+        self._links: List[Any] = []
+
+    async def connect(self, service_id='s:example', namespace='ps2',
+                      endpoint: str = ESS_ENDPOINT) -> None:
+        """Start all shards.
+
+        This method will not return until the `close` method is called.
+        """
+        if self._is_connected:
+            await self.close()
+        self._is_connected = True
+        self.dispatcher.closed = False
+        link_type = _ProcessLink if self.processes else _LocalLink
+        self._links = [link_type(self, i) for i in range(self.shards)]
+        try:
+            await asyncio.gather(*(link.run((service_id, namespace, endpoint))
+                                   for link in self._links))
+        finally:
+            self._links = []
+
+    async def close(self) -> None:
+        """Close the connections of all shards and stop event delivery."""
+        if self._is_connected:
+            self._is_connected = False
+            for link in self._links:
+                await link.close()
+        await self.dispatcher.close()
+
+    def split(self, trigger: Trigger) -> Dict[int, str]:
+        """Return the subscription message of a trigger for each shard."""
+        characters = sorted(str(c) for c in trigger.character_ids)
+        if 'all' in characters:
+            characters = ['all']
+        worlds = [w for w in trigger.world_ids if w != 'all']
+        if self.by == SHARD_BY_EVENT:
+            groups: Dict[int, Tuple[List[str], List[Any]]] = {}
+            for name in sorted(trigger.events):
+                groups.setdefault(self._shard(name), ([], worlds))[0].append(
+                    name)
+        else:
+            groups = {}
+            for world in sorted(worlds or self.worlds):
+                groups.setdefault(self._shard(world), (
+                    sorted(trigger.events), []))[1].append(world)
+        messages: Dict[int, str] = {}
+        for shard, (names, shard_worlds) in groups.items():
+            data: Dict[str, Any] = {'action': 'subscribe',
+                                    'eventNames': names, 'service': 'event'}
+            if characters:
+                data['characters'] = characters
+            if shard_worlds:
+                data['worlds'] = [str(w) for w in shard_worlds]
+                # Keeps shards from receiving their characters' events on
+                # other shards' worlds. The flag applies to the entire
+                # connection, so it would also restrict the characters of
+                # triggers without a world filter on the same shard.
+                if characters and self.by == SHARD_BY_WORLD:
+                    data['logicalAndCharactersWithWorlds'] = True
+            messages[shard] = json.dumps(data)
+        return messages
+
+    def _add_trigger(self, trigger: Trigger) -> None:
+        self._triggers.add(trigger)
+        for shard, message in self.split(trigger).items():
+            self._messages[shard][trigger] = message
+            if self._links:
+                self._links[shard].subscribe(message)
+
+    def _remove_trigger(self, trigger: Trigger) -> None:
+        super()._remove_trigger(trigger)
+        for shard, messages in enumerate(self._messages):
+            message = messages.pop(trigger, None)
+            if message is not None and self._links:
+                self._links[shard].discard(message)
+
+    def _shard_messages(self, shard: int) -> List[str]:
+        """Return the subscription messages of a shard's triggers."""
+        return list(self._messages[shard].values())
+
+    def _shard(self, key: Any) -> int:
+        """Return the shard of an event name or world ID."""
+        shard = self._assigned.get(key)
+        if shard is None:
+            shard = self._assigned[key] = next(self._counter) % self.shards
+        return shard
+
+
+class _Batcher():
+    """Collects the payloads of a worker process into batches."""
+
+    def __init__(self, events: Any, loop: asyncio.AbstractEventLoop) -> None:
+        """Initializer."""
+        self.events = events
+        self.loop = loop
+        self.batch: List[Payload] = []
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+    async def add(self, payload: Payload) -> None:
+        """Add a payload, forwarding the batch if it is full."""
+        self.batch.append(payload)
+        if len(self.batch) >= _BATCH_SIZE:
+            self.flush()
+        elif self.handle is None:
+            self.handle = self.loop.call_later(_BATCH_DELAY, self.flush)
+
+    def flush(self) -> None:
+        """Forward the current batch to the supervisor."""
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+        if self.batch:
+            # This blocks while the supervisor's pipe is full
+            self.events.send(self.batch)
+            self.batch = []
+
+
+def _worker(connect: Tuple[str, str, str], messages: List[str],
+            options: Dict[str, Any], events: Any, control: Any) -> None:
+    """Main function of a shard's worker process."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    batcher = _Batcher(events, loop)
+    shard = _Shard(batcher.add, loop, **options)
+    for message in messages:
+        shard.subscribe(message)
+
+    stop = threading.Event()
+
+    def receive() -> None:
+        # Forward control messages from the supervisor to the loop
+        while True:
+            try:
+                message = control.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is None:
+                stop.set()
+                asyncio.run_coroutine_threadsafe(shard.close(), loop)
+                return
+            action, text = message
+            loop.call_soon_threadsafe(
+                shard.subscribe if action == 'subscribe' else shard.discard,
+                text)
+
+    async def run() -> None:
+        # The supervisor may have closed the shard before it connected
+        if not stop.is_set():
+            await shard.connect(*connect)
+
+    threading.Thread(target=receive, daemon=True).start()
+    try:
+        loop.run_until_complete(run())
+        batcher.flush()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('ESS shard failed')
+    finally:
+        events.close()
+        loop.close()
@@ -1,6 +1,7 @@
-import asyncio
+import inspect
 import json
 from typing import Any, Callable, Dict, Iterable, Optional, Set
+from .constants import OVERFLOW_POLICIES
 from .event import Event
 
 
@@ -8,7 +9,15 @@ class Trigger():
     def __init__(self, event_name: str, *args: str,
                  character_ids: Iterable[int] = [],
                  world_ids: Iterable[int] = [],
-                 single_shot=False) -> None:
+                 single_shot=False, overflow: Optional[str] = None,
+                 queue_size: Optional[int] = None) -> None:
+        # The overflow policy and queue size default to those of the client
+        if overflow is not None and overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'unknown overflow policy "{overflow}"')
+        if queue_size is not None and queue_size < 1:
+            raise ValueError('the queue size must be positive')
+        self.overflow = overflow
+        self.queue_size = queue_size
         self.events: Set[str] = set((event_name, *args))
         self._callback: Optional[Callable[[Event], None]] = None
         self.character_ids: Set[int] = set(character_ids)
@@ -16,31 +25,26 @@ class Trigger():
         self.single_shot = single_shot
 
     def evaluate(self, payload: Dict[str, str]) -> bool:
-        """Return whether this trigger should fire or not."""
+        """Return whether this trigger should fire or not.
+
+        The client does not call this for every trigger, but looks up
+        matching triggers using a `TriggerIndex`. Both must agree.
+        """
         # Check the event name
         if payload['event_name'] not in self.events:
-            print('Trigger eval failed: non-matching event_name '
-                  f'{payload["event_name"]}')
             return False
         # Check the character_id, if applicable
-        if 'character_id' in payload.keys():
-            if (self.character_ids
-                    and int(payload['character_id']) not in self.character_ids
-                    and int(payload.get('attacker_character_id', 0)) not
-                    in self.character_ids):
-                if 'all' in self.character_ids:
-                    return True
-                print('Trigger eval failed: non-maching character_id '
-                      f'{payload["character_id"]}')
+        if ('character_id' in payload and self.character_ids
+                and 'all' not in self.character_ids):
+            ids = {int(payload[k]) for k in ('character_id',
+                                             'attacker_character_id')
+                   if k in payload}
+            if self.character_ids.isdisjoint(ids):
                 return False
         # Check the world_id, if applicable
-        if 'world_id' in payload.keys():
-            if (self.world_ids
-                    and int(payload['world_id']) not in self.world_ids):
-                if 'all' in self.world_ids:
-                    return True
-                print('Trigger eval failed: non-maching world_id '
-                      f'{payload["world_id"]}')
+        if ('world_id' in payload and self.world_ids
+                and 'all' not in self.world_ids):
+            if int(payload['world_id']) not in self.world_ids:
                 return False
         # Success
         return True
@@ -60,11 +64,10 @@ class Trigger():
         """Runs the callback, if specified."""
         if self._callback is None:
             raise RuntimeError('No callback specified')
-        # The callback must only be awaited if it is a coroutine
-        if asyncio.iscoroutine(self._callback):
-            await self._callback(event)
-        else:
-            self._callback(event)
+        # The result must only be awaited if the callback is a coroutine
+        result = self._callback(event)
+        if inspect.isawaitable(result):
+            await result
 
     def set_callback(self, func: Callable[[Event], None]) -> None:
         """Decorator for defining a trigger's coroutine."""
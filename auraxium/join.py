@@ -1,4 +1,4 @@
-from typing import Tuple, Union
+from typing import Any, Optional, Tuple, Union
 
 from .census import List, Term, SearchModifier, generate_term
 from .log import logger
@@ -10,6 +10,10 @@ class Join():
 
     Created by the `Query.join()` and `Join.join()` methods.
     Do not instantiate manually.
+
+    The string representation of a join is cached until the join or
+    any of its inner joins are modified. Lists modified in place are
+    detected by comparing a snapshot of their contents.
     """
 
     def __init__(self, collection: str, inject_at: str = '',
@@ -17,7 +21,8 @@ class Join():
                  to: str = '', show: List[str] = None, hide: List[str] = None,
                  **kwargs: CensusValue) -> None:
         """Initializer."""
-
+        self._compiled: Optional[Tuple[Tuple[Any, ...], str]] = None
+        self._parent: Any = None
         self.collection = collection
         self._inner_joins: List['Join'] = []
         self.is_list = is_list
@@ -43,6 +48,7 @@ class Join():
 
         new_term = Term(field, value, modifier)
         self.terms.append(new_term)
+        self._invalidate()
         return self
 
     def set_hide(self, *args: Union[str, List[str]]) -> 'Join':
@@ -62,7 +68,9 @@ class Join():
         """
         inner_join = Join(collection, inject_at, is_list,
                           on, is_outer, to, **kwargs)
+        inner_join._parent = self
         self._inner_joins.append(inner_join)
+        self._invalidate()
         return inner_join
 
     def set_show(self, *args: Union[str, List[str]]) -> 'Join':
@@ -80,8 +88,17 @@ class Join():
     def process_join(self) -> str:
         """Process the join and return its string representation.
 
-        This also recursively processes any inner joins.
+        This also recursively processes any inner joins. Terms and
+        field lists are sorted to give equivalent joins the same
+        representation.
         """
+        contents = self._contents()
+        if self._compiled is None or self._compiled[0] != contents:
+            self._compiled = contents, self._compile()
+        return self._compiled[1]
+
+    def _compile(self) -> str:
+        """Generate the string representation of the join."""
         # The collection (sometimes referred to a "type" in the docs) of the join
         string = self.collection
         # Keys
@@ -97,17 +114,35 @@ class Join():
             string += '^to:' + self.child_field
         # Show & hide
         if self.show:
-            string += '^show:' + "'".join(self.show)
+            string += '^show:' + "'".join(sorted(self.show))
             if self.hide:
                 logger.warning('"c:show" overwrites "c:hide"')
         elif self.hide:
-            string += '^hide:' + "'".join(self.hide)
+            string += '^hide:' + "'".join(sorted(self.hide))
         # Terms
         if self.terms:
-            string += '^terms:' + '\''.join([t.to_url() for t in self.terms])
+            string += '^terms:' + '\''.join(
+                sorted(t.to_url() for t in self.terms))
         # Process inner joins
         if self._inner_joins:
             string += '('
             string += ','.join(j.process_join() for j in self._inner_joins)
             string += ')'
         return string
+
+    def _contents(self) -> Tuple[Any, ...]:
+        """Return a snapshot of the lists that are part of the join."""
+        return (tuple(self.terms), tuple(self.show), tuple(self.hide),
+                tuple([j.process_join() for j in self._inner_joins]))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name not in ('_compiled', '_parent'):
+            self._invalidate()
+
+    def _invalidate(self) -> None:
+        """Discard the cached representation of this join and its parents."""
+        object.__setattr__(self, '_compiled', None)
+        parent = self.__dict__.get('_parent')
+        if parent is not None:
+            parent._invalidate()  # pylint: disable=protected-access
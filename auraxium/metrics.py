@@ -0,0 +1,280 @@
+"""Client-side instrumentation of REST API requests.
+
+Listeners registered using `add_listener()` are called with a
+`RequestMetrics` object for every request performed, including those
+served from a cache. No metrics are gathered while no listeners are
+registered.
+
+The `MetricsCollector` listener aggregates these metrics into
+histograms per collection, which can be exported in the Prometheus
+text exposition format:
+
+    collector = MetricsCollector()
+    add_listener(collector)
+    ...
+    print(collector.export_prometheus())
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from .log import logger
+
+# Default histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# The request phases timed individually
+PHASES = ('ttfb', 'download', 'decode', 'convert')
+
+
+class RequestMetrics(NamedTuple):
+    """Client-side measurements for a single request.
+
+    All durations are in seconds and None if the phase did not occur.
+    `ttfb` is the time until the response headers were received and
+    includes connecting to the server; `requests` does not expose the
+    DNS and connection times separately.
+    """
+
+    url: str
+    collection: str
+    status: Optional[int]
+    size: int
+    cache_hit: bool
+    ttfb: Optional[float]
+    download: Optional[float]
+    decode: Optional[float]
+    convert: Optional[float]
+    total: float
+    server_timing: Dict[str, Any]
+    error: Optional[BaseException]
+
+
+Listener = Callable[[RequestMetrics], None]
+
+_listeners: List[Listener] = []
+
+
+def add_listener(listener: Listener) -> None:
+    """Register a callable to receive the metrics of every request."""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: Listener) -> None:
+    """Unregister a previously added listener.
+
+    Raises:
+      * ValueError -- Raised if the listener has not been added
+
+    """
+    _listeners.remove(listener)
+
+
+class _Recorder():
+    """Collects the measurements of a request while it is performed."""
+
+    __slots__ = ('url', 'collection', 'status', 'size', 'cache_hit',
+                 'server_timing', 'error', '_start', '_last', '_phases')
+
+    def __init__(self, url: str, collection: str) -> None:
+        self.url = url
+        self.collection = collection
+        self.status: Optional[int] = None
+        self.size = 0
+        self.cache_hit = False
+        self.server_timing: Dict[str, Any] = {}
+        self.error: Optional[BaseException] = None
+        self._start = self._last = time.perf_counter()
+        self._phases: Dict[str, float] = {}
+
+    def count(self, chunk: bytes) -> bytes:
+        """Add the size of a received chunk, then return it."""
+        self.size += len(chunk)
+        return chunk
+
+    def finish(self) -> None:
+        """Send the collected metrics to all listeners."""
+        phases = self._phases
+        metrics = RequestMetrics(
+            self.url, self.collection, self.status, self.size,
+            self.cache_hit, phases.get('ttfb'), phases.get('download'),
+            phases.get('decode'), phases.get('convert'),
+            time.perf_counter() - self._start, self.server_timing,
+            self.error)
+        for listener in list(_listeners):
+            try:
+                listener(metrics)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Metrics listener %r failed', listener)
+
+    def mark(self, phase: str) -> None:
+        """Record the time elapsed since the previous mark."""
+        now = time.perf_counter()
+        self._phases[phase] = now - self._last
+        self._last = now
+
+    def received(self, response: Any) -> None:
+        """Record the status and timing of a response."""
+        now = time.perf_counter()
+        ttfb = response.elapsed.total_seconds()
+        self._phases['ttfb'] = ttfb
+        self._phases['download'] = max(0.0, now - self._last - ttfb)
+        self._last = now
+        self.status = response.status_code
+
+
+class _NullRecorder(_Recorder):
+    """Recorder used while no listeners are registered."""
+
+    __slots__ = ()
+
+    def __init__(self) -> None:  # pylint: disable=super-init-not-called
+        pass
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        pass
+
+    def count(self, chunk: bytes) -> bytes:
+        return chunk
+
+    def finish(self) -> None:
+        pass
+
+    def mark(self, phase: str) -> None:
+        pass
+
+    def received(self, response: Any) -> None:
+        pass
+
+
+_NULL_RECORDER = _NullRecorder()
+
+
+def start_request(url: str, collection: str) -> _Recorder:
+    """Start recording the metrics of a request."""
+    if not _listeners:
+        return _NULL_RECORDER
+    return _Recorder(url, collection)
+
+
+class Histogram():
+    """A cumulative histogram with fixed bucket bounds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Initializer."""
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a value to the histogram."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """Return the (upper bound, cumulative count) pairs."""
+        pairs: List[Tuple[float, int]] = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class MetricsCollector():
+    """A listener aggregating request metrics per collection.
+
+    Add an instance using `add_listener()` to start collecting.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Initializer."""
+        self.buckets = buckets
+        self.durations: Dict[str, Histogram] = {}
+        self.phases: Dict[Tuple[str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str], int] = {}
+        self.cache_hits: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: RequestMetrics) -> None:
+        collection = metrics.collection
+        if metrics.error is not None and metrics.status is None:
+            status = 'error'
+        else:
+            status = 'cache' if metrics.cache_hit else str(metrics.status)
+        with self._lock:
+            self._histogram(self.durations, collection).observe(metrics.total)
+            for phase in PHASES:
+                value = getattr(metrics, phase)
+                if value is not None:
+                    self._histogram(self.phases,
+                                    (collection, phase)).observe(value)
+            key = (collection, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if metrics.cache_hit:
+                self.cache_hits[collection] = (
+                    self.cache_hits.get(collection, 0) + 1)
+            self.bytes[collection] = self.bytes.get(collection, 0) + metrics.size
+
+    def export_prometheus(self, prefix: str = 'auraxium') -> str:
+        """Return the collected metrics in Prometheus text format."""
+        lines: List[str] = []
+        with self._lock:
+            lines.append(f'# TYPE {prefix}_requests_total counter')
+            for (collection, status), count in sorted(self.requests.items()):
+                labels = _labels(collection=collection, status=status)
+                lines.append(f'{prefix}_requests_total{labels} {count}')
+            lines.append(f'# TYPE {prefix}_cache_hits_total counter')
+            for collection, count in sorted(self.cache_hits.items()):
+                labels = _labels(collection=collection)
+                lines.append(f'{prefix}_cache_hits_total{labels} {count}')
+            lines.append(f'# TYPE {prefix}_response_bytes_total counter')
+            for collection, size in sorted(self.bytes.items()):
+                labels = _labels(collection=collection)
+                lines.append(f'{prefix}_response_bytes_total{labels} {size}')
+            name = f'{prefix}_request_duration_seconds'
+            lines.append(f'# TYPE {name} histogram')
+            for collection, hist in sorted(self.durations.items()):
+                lines.extend(_histogram_lines(name, hist,
+                                              collection=collection))
+            name = f'{prefix}_request_phase_seconds'
+            lines.append(f'# TYPE {name} histogram')
+            for (collection, phase), hist in sorted(self.phases.items()):
+                lines.extend(_histogram_lines(name, hist,
+                                              collection=collection,
+                                              phase=phase))
+        return '\n'.join(lines) + '\n'
+
+    def _histogram(self, histograms: Dict[Any, Histogram],
+                   key: Any) -> Histogram:
+        """Return the histogram for a key, creating it if required."""
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = Histogram(self.buckets)
+        return hist
+
+
+def _histogram_lines(name: str, hist: Histogram, **labels: str) -> List[str]:
+    """Return the Prometheus sample lines for a histogram."""
+    lines: List[str] = []
+    for bound, count in hist.cumulative():
+        bucket = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{_labels(**labels, le=bucket)} {count}')
+    lines.append(f'{name}_sum{_labels(**labels)} {hist.sum}')
+    lines.append(f'{name}_count{_labels(**labels)} {hist.count}')
+    return lines
+
+
+def _labels(**labels: str) -> str:
+    """Format a set of Prometheus labels."""
+    items = []
+    for key, value in labels.items():
+        value = (value.replace('\\', '\\\\').replace('"', '\\"')
+                 .replace('\n', '\\n'))
+        items.append(f'{key}="{value}"')
+    return '{' + ','.join(items) + '}'
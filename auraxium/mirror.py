@@ -0,0 +1,508 @@
+"""Client-side joins against local copies of collections.
+
+Joins of static collections, such as "item" to "item_to_weapon" to
+"weapon", return the same data for every request, yet are often the
+slowest part of a query. A `Mirror` holds local copies of such
+collections, loaded from a `SnapshotStore` or added manually, and
+resolves joins against them using hash indexes:
+
+    mirror = Mirror(SnapshotStore('snapshot.db'))
+    query = auraxium.Query('item', name__en='^Orion')
+    query.join('item_to_weapon', on='item_id').join('weapon')
+    mirror.get(query)
+
+The query itself, as well as any joins of collections not present in
+the mirror, are still performed by the server.
+
+Queries of mirrored collections can also be evaluated entirely offline
+using `Mirror.execute()`. Terms are looked up using hash, sorted and
+prefix indexes, which are built on first use.
+"""
+
+import bisect
+import copy
+import threading
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple,
+                    Optional, Tuple)
+from .census import SearchModifier, Term, _value_to_str, convert_response
+from .join import Join
+from .query import Query
+from .snapshot import SnapshotStore
+
+# Index mapping field values to the rows containing them
+_Index = Dict[str, List[Dict[str, Any]]]
+
+# Upper bound for any string starting with a given prefix
+_MAX_CHAR = '\U0010ffff'
+
+
+class _SortedIndex(NamedTuple):
+    """Rows sorted by the value of a field."""
+
+    keys: List[Any]
+    rows: List[Dict[str, Any]]
+
+
+class Mirror():
+    """Local, indexed copies of collections used to resolve joins.
+
+    Collections not added manually are loaded from the snapshot store
+    on first use, if it contains a snapshot of them. Hash indexes are
+    built for each field joined on and kept for the mirror's lifetime.
+    """
+
+    def __init__(self, store: Optional[SnapshotStore] = None,
+                 namespace: str = '') -> None:
+        """Initializer."""
+        self.store = store
+        self.namespace = namespace
+        self._collections: Dict[str, List[Dict[str, Any]]] = {}
+        self._indexes: Dict[Tuple[str, str], _Index] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, collection: object) -> bool:
+        if not isinstance(collection, str):
+            return False
+        return self.rows(collection) is not None
+
+    def add(self, collection: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Add or replace the unconverted entries of a collection."""
+        with self._lock:
+            self._collections[collection] = list(rows)
+            for key in [k for k in self._indexes if k[0] == collection]:
+                del self._indexes[key]
+
+    def index(self, collection: str, field: str) -> _Index:
+        """Return the hash index of a collection's field.
+
+        Raises:
+          * KeyError -- Raised if the collection is not mirrored
+
+        """
+        return self._index(collection, field, 'hash')
+
+    def rows(self, collection: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the entries of a mirrored collection, if available."""
+        rows = self._collections.get(collection)
+        if rows is not None or self.store is None:
+            return rows
+        if self.store.info(collection, self.namespace) is None:
+            return None
+        rows = list(self.store.rows(collection, self.namespace))
+        with self._lock:
+            return self._collections.setdefault(collection, rows)
+
+    def count(self, query: Query) -> int:
+        """Return the number of local matches for a query.
+
+        Like the server, this ignores the query's `start` and `limit`.
+
+        Raises:
+          * KeyError -- Raised if the collection is not mirrored
+
+        """
+        return len(self._select(query))
+
+    def execute(self, query: Query,
+                convert: bool = True) -> List[Dict[str, Any]]:
+        """Evaluate a query against the mirror, without any requests.
+
+        Terms, joins and the "c:sort", "c:start", "c:limit", "c:has",
+        "c:show", "c:hide" and "c:case" query commands are supported.
+        The results are equivalent to those of `Query.get()`.
+
+        Raises:
+          * KeyError -- Raised if the collection is not mirrored
+          * ValueError -- Raised if the query cannot be evaluated
+            locally
+
+        """
+        _, remote = self._split(query)
+        if remote:
+            names = ', '.join(j.collection for j in remote)
+            raise ValueError(f'joins cannot be resolved locally: {names}')
+        # pylint: disable=protected-access
+        if query.resolves or query._distinct:
+            raise ValueError('"c:resolve" and "c:distinct" are not '
+                             'supported locally')
+        rows = self._select(query)
+        # c:sort
+        for item in reversed(query.sort_by):
+            field, _, order = item.partition(':')
+            rows.sort(key=_sort_key(field), reverse=order == '-1')
+        # c:start & c:limit
+        rows = rows[query.start:query.start + query.limit]
+        # c:show & c:hide
+        if query.show_fields or query.hide_fields:
+            rows = [_filter_fields(r, query.show_fields, query.hide_fields)
+                    for r in rows]
+        else:
+            rows = [dict(r) for r in rows]
+        return self._resolve(query.collection, rows, query.joins, convert)
+
+    def get(self, query: Query,
+            convert: bool = True) -> List[Dict[str, Any]]:
+        """Perform a query, resolving joins locally where possible.
+
+        Joins whose collection and inner joins are all mirrored are
+        resolved locally, any others are sent to the server as part of
+        the query.
+        """
+        local, remote = self._split(query)
+        query, added = self._remote(query, local, remote)
+        results = query.get(convert=False)
+        return self._resolve(query.collection, results, local, convert,
+                             added)
+
+    async def aget(self, query: Query,
+                   convert: bool = True) -> List[Dict[str, Any]]:
+        """Asynchronous version of `get()`."""
+        local, remote = self._split(query)
+        query, added = self._remote(query, local, remote)
+        results = await query.aget(convert=False)
+        return self._resolve(query.collection, results, local, convert,
+                             added)
+
+    def is_local(self, join: Join) -> bool:
+        """Return whether a join and its inner joins can be resolved."""
+        # pylint: disable=protected-access
+        return join.collection in self and all(
+            self.is_local(j) for j in join._inner_joins)
+
+    def join(self, rows: List[Dict[str, Any]], joins: Iterable[Join],
+             collection: str = '') -> List[Dict[str, Any]]:
+        """Resolve joins for the given unconverted entries.
+
+        Entries are modified in place. Entries without a match for an
+        inner join (i.e. `is_outer=False`) are removed. `collection`
+        is used to determine the default join field.
+        """
+        for join in joins:
+            rows = [r for r in rows if self._inject(r, join, collection)]
+        return rows
+
+    def _candidates(self, collection: str, term: Term,
+                    case: bool) -> Optional[List[Dict[str, Any]]]:
+        """Return the rows that may match a term, using an index.
+
+        Returns None if no index is applicable for the term.
+        """
+        wanted = _value_to_str(term.value)
+        if not case:
+            wanted = wanted.lower()
+        modifier = term.modifier
+        if modifier == SearchModifier.EQUAL_TO:
+            index = self._index(collection, term.field,
+                                'hash' if case else 'hash_lower')
+            if ',' not in wanted:
+                return index.get(wanted, [])
+            return [r for v in dict.fromkeys(wanted.split(','))
+                    for r in index.get(v, [])]
+        if modifier == SearchModifier.STARTS_WITH:
+            sorted_index = self._index(collection, term.field,
+                                       'prefix' if case else 'prefix_lower')
+            return _range(sorted_index, wanted, wanted + _MAX_CHAR)
+        if modifier in (SearchModifier.NOT_EQUAL_TO, SearchModifier.CONTAINS):
+            return None
+        # Ordered comparisons, only supported for numeric fields
+        sorted_index = self._index(collection, term.field, 'sorted')
+        if sorted_index is None:
+            return None
+        try:
+            key = float(wanted)
+        except ValueError:
+            return None
+        if modifier == SearchModifier.LESS_THAN:
+            return _range(sorted_index, None, key, right_closed=False)
+        if modifier == SearchModifier.LESS_THAN_OR_EQUAL:
+            return _range(sorted_index, None, key)
+        if modifier == SearchModifier.GREATER_THAN:
+            return _range(sorted_index, key, None, left_closed=False)
+        return _range(sorted_index, key, None)
+
+    def _index(self, collection: str, field: str, kind: str) -> Any:
+        """Return an index of a collection's field, building it if needed.
+
+        Hash indexes map values to rows, sorted indexes sort rows by
+        their numeric value and prefix indexes by their string value.
+        Sorted indexes are None if any value of the field is not
+        numeric.
+        """
+        key = (collection, field, kind)
+        try:
+            return self._indexes[key]
+        except KeyError:
+            pass
+        rows = self.rows(collection)
+        if rows is None:
+            raise KeyError(collection)
+        index = _build_index(rows, field, kind)
+        with self._lock:
+            return self._indexes.setdefault(key, index)
+
+    def _inject(self, row: Dict[str, Any], join: Join,
+                collection: str) -> bool:
+        """Inject the matches of a join into an entry.
+
+        Returns False if the entry must be dropped.
+        """
+        # pylint: disable=protected-access
+        # Like the server, default to the joined collection's ID field,
+        # then to that of the parent collection
+        on = join.parent_field
+        if not on:
+            on = f'{join.collection}_id'
+            if _field_value(row, on) is None and collection:
+                on = f'{collection}_id'
+        to = join.child_field or on
+        value = _field_value(row, on)
+        matches: List[Dict[str, Any]] = []
+        if value is not None:
+            for match in self.index(join.collection, to).get(str(value), []):
+                if not all(_matches(t, match) for t in join.terms):
+                    continue
+                # Inner joins are resolved before the show and hide lists
+                # are applied, as their fields may not be shown
+                resolved = dict(match)
+                if not self.join([resolved], join._inner_joins,
+                                 join.collection):
+                    continue
+                shown = _filter_fields(match, join.show, join.hide)
+                shown.update((k, v) for k, v in resolved.items()
+                             if k not in match)
+                matches.append(shown)
+                if not join.is_list:
+                    break
+        if not matches:
+            return join.is_outer
+        inject_at = join.inject_at or f'{on}_join_{join.collection}'
+        row[inject_at] = matches if join.is_list else matches[0]
+        return True
+
+    def _remote(self, query: Query, local: List[Join],
+                remote: List[Join]) -> Tuple[Query, List[str]]:
+        """Return the query to send to the server and the fields added.
+
+        The fields joined on are needed to resolve the local joins, so
+        they are retrieved even if the query's show or hide lists omit
+        them. `_resolve()` removes them again.
+        """
+        if not local:
+            return query, []
+        query = copy.copy(query)
+        query.joins = remote
+        keys: List[str] = []
+        for join in local:
+            if join.parent_field:
+                keys.append(join.parent_field)
+            else:
+                keys.extend((f'{join.collection}_id',
+                             f'{query.collection}_id'))
+        added: List[str] = []
+        if query.show_fields:
+            added = [k for k in dict.fromkeys(keys)
+                     if k not in query.show_fields]
+            query.show_fields = query.show_fields + added
+        elif query.hide_fields:
+            added = [k for k in dict.fromkeys(keys)
+                     if k in query.hide_fields]
+            query.hide_fields = [f for f in query.hide_fields
+                                 if f not in added]
+        return query, added
+
+    def _resolve(self, collection: str, results: List[Dict[str, Any]],
+                 joins: List[Join], convert: bool,
+                 added: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Resolve the local joins and convert the results.
+
+        `added` are the fields only retrieved for the joins, they are
+        removed from the results afterwards.
+        """
+        results = self.join(results, joins, collection)
+        for field in added:
+            for row in results:
+                _remove_field(row, field)
+        if convert:
+            key = f'{collection}_list'
+            return convert_response({key: results})[key]
+        # Joined entries share their nested values with the mirror
+        return copy.deepcopy(results)
+
+    def _select(self, query: Query) -> List[Dict[str, Any]]:
+        """Return the rows matching a query's terms, in collection order.
+
+        Raises:
+          * KeyError -- Raised if the collection is not mirrored
+
+        """
+        rows = self.rows(query.collection)
+        if rows is None:
+            raise KeyError(query.collection)
+        # Look up the most selective term using its index
+        candidates: Optional[List[Dict[str, Any]]] = None
+        for term in query.terms:
+            matches = self._candidates(query.collection, term, query.case)
+            if matches is not None and (candidates is None
+                                        or len(matches) < len(candidates)):
+                candidates = matches
+        if candidates is None:
+            candidates = rows
+        elif len(candidates) < len(rows):
+            # Restore the collection order
+            positions = self._index(query.collection, '', 'position')
+            candidates = sorted(candidates, key=lambda r: positions[id(r)])
+        return [r for r in candidates
+                if all(_matches(t, r, query.case) for t in query.terms)
+                and all(_field_value(r, f) is not None
+                        for f in query.has_field)]
+
+    def _split(self, query: Query) -> Tuple[List[Join], List[Join]]:
+        """Split a query's joins into local and remote joins."""
+        local: List[Join] = []
+        remote: List[Join] = []
+        for join in query.joins:
+            (local if self.is_local(join) else remote).append(join)
+        return local, remote
+
+
+def _field_value(row: Dict[str, Any], field: str) -> Any:
+    """Return the value of a (dotted) field, or None if missing."""
+    value: Any = row
+    for key in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _remove_field(row: Dict[str, Any], field: str) -> None:
+    """Remove a (dotted) field from an entry, if present."""
+    *parents, name = field.split('.')
+    target: Any = row
+    for parent in parents:
+        target = target.get(parent)
+        if not isinstance(target, dict):
+            return
+    target.pop(name, None)
+
+
+def _build_index(rows: List[Dict[str, Any]], field: str, kind: str) -> Any:
+    """Build an index of the given kind, see `Mirror._index()`."""
+    if kind == 'position':
+        return {id(r): i for i, r in enumerate(rows)}
+    pairs: List[Tuple[str, Dict[str, Any]]] = []
+    for row in rows:
+        value = _field_value(row, field)
+        if value is not None and not isinstance(value, (dict, list)):
+            value = str(value)
+            pairs.append((value.lower() if kind.endswith('_lower')
+                          else value, row))
+    if kind in ('hash', 'hash_lower'):
+        index: _Index = {}
+        for value, row in pairs:
+            index.setdefault(value, []).append(row)
+        return index
+    if kind == 'sorted':
+        try:
+            numeric = [(float(v), r) for v, r in pairs]
+        except ValueError:
+            return None
+        numeric.sort(key=lambda p: p[0])
+        return _SortedIndex([p[0] for p in numeric], [p[1] for p in numeric])
+    pairs.sort(key=lambda p: p[0])
+    return _SortedIndex([p[0] for p in pairs], [p[1] for p in pairs])
+
+
+def _range(index: _SortedIndex, low: Any, high: Any,
+           left_closed: bool = True,
+           right_closed: bool = True) -> List[Dict[str, Any]]:
+    """Return the rows of a sorted index within the given bounds."""
+    start = 0
+    if low is not None:
+        bound = bisect.bisect_left if left_closed else bisect.bisect_right
+        start = bound(index.keys, low)
+    end = len(index.keys)
+    if high is not None:
+        bound = bisect.bisect_right if right_closed else bisect.bisect_left
+        end = bound(index.keys, high)
+    return index.rows[start:end]
+
+
+def _filter_fields(row: Dict[str, Any], show: List[str],
+                   hide: List[str]) -> Dict[str, Any]:
+    """Return a copy of an entry with the show or hide lists applied.
+
+    Dotted field names refer to nested fields.
+    """
+    if show:
+        shown: Dict[str, Any] = {}
+        for field in show:
+            value = _field_value(row, field)
+            if value is None:
+                continue
+            *parents, name = field.split('.')
+            target = shown
+            for parent in parents:
+                target = target.setdefault(parent, {})
+            target[name] = value
+        return shown
+    shown = dict(row)
+    for field in hide:
+        *parents, name = field.split('.')
+        target = shown
+        for parent in parents:
+            if not isinstance(target.get(parent), dict):
+                break
+            # Copy nested dictionaries before removing their fields
+            target[parent] = dict(target[parent])
+            target = target[parent]
+        else:
+            target.pop(name, None)
+    return shown
+
+
+def _sort_key(field: str) -> Callable[[Dict[str, Any]], Tuple[int, Any]]:
+    """Return a sort key for a field, ordering numbers numerically."""
+    def key(row: Dict[str, Any]) -> Tuple[int, Any]:
+        value = _field_value(row, field)
+        if value is None:
+            return 2, ''
+        try:
+            return 0, float(value)
+        except (TypeError, ValueError):
+            return 1, str(value)
+    return key
+
+
+def _matches(term: Term, row: Dict[str, Any], case: bool = True) -> bool:
+    """Return whether an unconverted entry satisfies a term."""
+    value = _field_value(row, term.field)
+    if value is None or isinstance(value, (dict, list)):
+        return False
+    wanted = _value_to_str(term.value)
+    actual = str(value)
+    if not case:
+        wanted, actual = wanted.lower(), actual.lower()
+    modifier = term.modifier
+    if modifier == SearchModifier.EQUAL_TO:
+        # Multiple comma-separated values match any of them
+        return actual == wanted or (',' in wanted
+                                    and actual in wanted.split(','))
+    if modifier == SearchModifier.NOT_EQUAL_TO:
+        return actual != wanted
+    if modifier == SearchModifier.STARTS_WITH:
+        return actual.startswith(wanted)
+    if modifier == SearchModifier.CONTAINS:
+        return wanted in actual
+    # Ordered comparisons only match numeric values
+    try:
+        left, right = float(actual), float(wanted)
+    except ValueError:
+        return False
+    if modifier == SearchModifier.LESS_THAN:
+        return left < right
+    if modifier == SearchModifier.LESS_THAN_OR_EQUAL:
+        return left <= right
+    if modifier == SearchModifier.GREATER_THAN:
+        return left > right
+    return left >= right
@@ -0,0 +1,270 @@
+"""Page-by-page retrieval of large result sets.
+
+These functions walk the results of a query using the "c:start" and
+"c:limit" query commands. The next pages are requested while the
+current one is being processed, but no more than a fixed number of
+pages are requested at any time, which keeps memory use bounded.
+
+They are exposed through the `Query.iter_pages()`, `Query.stream()`,
+`Query.aiter_pages()` and `Query.astream()` methods.
+
+If the entire result set is needed at once, `get_all()` retrieves it
+in shards that are requested concurrently. It is exposed through the
+`Query.get_all()` and `Query.aget_all()` methods.
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import copy
+from typing import (Any, AsyncIterator, Deque, Dict, Iterator, List,
+                    Optional, Tuple)
+from .log import logger
+from .query import Query
+from .scheduler import is_transient
+
+
+def iter_pages(query: Query, page_size: int = 100, max_in_flight: int = 2,
+               use_count: bool = False, convert: bool = True
+               ) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the results of a query one page at a time.
+
+    Up to `max_in_flight` page requests are run on a thread pool while
+    the caller processes the current page. Unless `use_count` is set,
+    the last page is detected by it being shorter than `page_size`.
+    With `use_count`, the number of results is retrieved up front and
+    no requests are made past the end of the result set.
+    """
+    _check_arguments(page_size, max_in_flight)
+    total = query.count() if use_count else None
+    pending: Deque[concurrent.futures.Future] = collections.deque()
+    next_start = query.start
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_in_flight, thread_name_prefix='auraxium')
+    try:
+        while True:
+            # Keep the pipeline filled
+            while (len(pending) < max_in_flight
+                   and (total is None or next_start < total)):
+                pending.append(executor.submit(
+                    _page(query, next_start, page_size).get, convert))
+                next_start += page_size
+            if not pending:
+                return
+            page: List[Dict[str, Any]] = pending.popleft().result()
+            if page:
+                yield page
+            if total is None and len(page) < page_size:
+                return
+    finally:
+        # Abandon any speculative requests for pages past the end
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def aiter_pages(query: Query, page_size: int = 100,
+                      max_in_flight: int = 2, use_count: bool = False,
+                      convert: bool = True
+                      ) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Asynchronous version of `iter_pages()`.
+
+    The page requests are subject to the concurrency limit of the
+    query's transport.
+    """
+    _check_arguments(page_size, max_in_flight)
+    total = await query.acount() if use_count else None
+    loop = asyncio.get_running_loop()
+    pending: Deque[asyncio.Future] = collections.deque()
+    next_start = query.start
+    try:
+        while True:
+            # Keep the pipeline filled
+            while (len(pending) < max_in_flight
+                   and (total is None or next_start < total)):
+                pending.append(loop.create_task(
+                    _page(query, next_start, page_size).aget(convert)))
+                next_start += page_size
+            if not pending:
+                return
+            page: List[Dict[str, Any]] = await pending.popleft()
+            if page:
+                yield page
+            if total is None and len(page) < page_size:
+                return
+    finally:
+        # Abandon any speculative requests for pages past the end
+        for task in pending:
+            task.cancel()
+
+
+def stream(query: Query, page_size: int = 100, max_in_flight: int = 2,
+           use_count: bool = False, convert: bool = True
+           ) -> Iterator[Dict[str, Any]]:
+    """Yield the results of a query one entry at a time.
+
+    See `iter_pages()` for details.
+    """
+    for page in iter_pages(query, page_size, max_in_flight, use_count,
+                           convert):
+        yield from page
+
+
+async def astream(query: Query, page_size: int = 100,
+                  max_in_flight: int = 2, use_count: bool = False,
+                  convert: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """Asynchronous version of `stream()`."""
+    async for page in aiter_pages(query, page_size, max_in_flight,
+                                  use_count, convert):
+        for item in page:
+            yield item
+
+
+def get_all(query: Query, workers: int = 4, shard_size: int = 1000,
+            shard_retries: int = 2, convert: bool = True
+            ) -> List[Dict[str, Any]]:
+    """Return all results of a query, fetching shards concurrently.
+
+    The number of results is retrieved first and split into shards of
+    `shard_size` results, starting at the query's `start` value. Up to
+    `workers` shards are requested at a time, the results are returned
+    in order.
+
+    A shard failing with a transient error is retried on its own, up
+    to `shard_retries` times. These retries are in addition to those
+    performed by the scheduler for every request.
+
+    If the count turns out to be outdated, any results past it are
+    retrieved page by page.
+    """
+    _check_arguments(shard_size, workers)
+    _check_retries(shard_retries)
+    pages = _shards(query.start, query.count(), shard_size)
+    shards: List[List[Dict[str, Any]]] = [[] for _ in pages]
+    pending: Dict[concurrent.futures.Future, Tuple[int, int]] = {}
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix='auraxium')
+    try:
+        for index, page in enumerate(pages):
+            pending[executor.submit(_page(query, *page).get,
+                                    convert)] = index, 0
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index, attempt = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    shards[index] = future.result()
+                    continue
+                _check_shard(error, pages[index][0], attempt,
+                             shard_retries)
+                pending[executor.submit(
+                    _page(query, *pages[index]).get,
+                    convert)] = index, attempt + 1
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+    results = [item for shard in shards for item in shard]
+    tail = _tail(query, pages, shards, shard_size)
+    if tail is not None:
+        results.extend(stream(tail, shard_size, 1, convert=convert))
+    return results
+
+
+async def aget_all(query: Query, workers: int = 4, shard_size: int = 1000,
+                   shard_retries: int = 2, convert: bool = True
+                   ) -> List[Dict[str, Any]]:
+    """Asynchronous version of `get_all()`.
+
+    The shard requests are also subject to the concurrency limit of
+    the query's transport.
+    """
+    _check_arguments(shard_size, workers)
+    _check_retries(shard_retries)
+    pages = _shards(query.start, await query.acount(), shard_size)
+    shards: List[List[Dict[str, Any]]] = [[] for _ in pages]
+    semaphore = asyncio.Semaphore(workers)
+
+    async def fetch(index: int) -> None:
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    shards[index] = await _page(
+                        query, *pages[index]).aget(convert)
+                    return
+                except Exception as err:  # pylint: disable=broad-except
+                    _check_shard(err, pages[index][0], attempt,
+                                 shard_retries)
+            attempt += 1
+
+    tasks = [asyncio.ensure_future(fetch(i)) for i in range(len(pages))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    results = [item for shard in shards for item in shard]
+    tail = _tail(query, pages, shards, shard_size)
+    if tail is not None:
+        async for item in astream(tail, shard_size, 1, convert=convert):
+            results.append(item)
+    return results
+
+
+def _check_arguments(page_size: int, max_in_flight: int) -> None:
+    """Validate the pagination arguments."""
+    if page_size < 1:
+        raise ValueError('the page size must be at least 1')
+    if max_in_flight < 1:
+        raise ValueError('at least one page must be in flight')
+
+
+def _check_retries(shard_retries: int) -> None:
+    """Validate the number of shard retries."""
+    if shard_retries < 0:
+        raise ValueError('the number of retries cannot be negative')
+
+
+def _check_shard(error: BaseException, start: int, attempt: int,
+                 shard_retries: int) -> None:
+    """Re-raise a shard's error unless the shard should be retried."""
+    if attempt >= shard_retries or not is_transient(error):
+        raise error
+    logger.warning('Shard at %d failed (%s), retrying', start, error)
+
+
+def _shards(start: int, total: int, shard_size: int) -> List[Tuple[int, int]]:
+    """Return the start and limit of each shard up to a result count.
+
+    The last shard asks for one result past the count, so that an
+    outdated count is detected without an additional request.
+    """
+    pages = [(s, shard_size) for s in range(start, total, shard_size)]
+    if pages:
+        last = pages[-1][0]
+        pages[-1] = last, total - last + 1
+    return pages
+
+
+def _tail(query: Query, pages: List[Tuple[int, int]],
+          shards: List[List[Dict[str, Any]]],
+          shard_size: int) -> Optional[Query]:
+    """Return a query for any results past the last shard, if needed.
+
+    The last shard being full indicates that the count was outdated.
+    """
+    if not shards or len(shards[-1]) < pages[-1][1]:
+        return None
+    start, limit = pages[-1]
+    return _page(query, start + limit, shard_size)
+
+
+def _page(query: Query, start: int, limit: int) -> Query:
+    """Return a copy of the query retrieving a single page."""
+    page = copy.copy(query)
+    page.start = start
+    page.limit = limit
+    return page
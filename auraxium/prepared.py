@@ -0,0 +1,157 @@
+"""Prepared queries with placeholder terms.
+
+A query whose term values are `Parameter` objects can be compiled once
+into a URL template using `Query.prepare()`. The resulting
+`PreparedQuery` substitutes the parameter values into this template,
+without creating or serializing any query or join objects:
+
+    query = auraxium.Query('character', character_id=Parameter('id'))
+    query.join('characters_world')
+    prepared = query.prepare()
+    prepared.get(id=5428010618015189713)
+"""
+
+import asyncio
+import concurrent.futures
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from .cache import BaseCache
+from .census import _value_to_str, retrieve, retrieve_async
+from .row import Row
+from .transport import Transport
+from .type import CensusValue
+
+# Delimits the parameter names in the URL template
+_MARKER = '\x00'
+
+
+class Parameter():
+    """A placeholder for a term value of a prepared query.
+
+    Parameters may be used anywhere a term value is accepted, including
+    the terms of joins and search modifier prefixes, i.e.
+    `Query('character', battle_rank=f'>{Parameter("rank")}')`.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initializer."""
+        if not name.isidentifier():
+            raise ValueError(f'invalid parameter name "{name}"')
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f'Parameter({self.name!r})'
+
+    def __str__(self) -> str:
+        return f'{_MARKER}{self.name}{_MARKER}'
+
+
+class PreparedQuery():
+    """A query compiled into a URL template.
+
+    Created by the `Query.prepare()` method. The query's settings are
+    copied when it is prepared, later changes to the query or the
+    global namespace and service ID do not affect the prepared query.
+    """
+
+    def __init__(self, url: str, collection: str,
+                 transport: Optional[Transport] = None,
+                 cache: Optional[BaseCache] = None,
+                 retry: bool = True) -> None:
+        """Initializer."""
+        # Even items are literal URL segments, odd items parameter names
+        segments = url.split(_MARKER)
+        self.collection = collection
+        self.parameters = frozenset(segments[1::2])
+        self.transport = transport
+        self.cache = cache
+        self.retry = retry
+        self._segments = segments
+
+    def get(self, convert: bool = True,
+            **params: CensusValue) -> List[Dict[str, Any]]:
+        """Perform the query for the given parameter values.
+
+        See `Query.get()` for details.
+        """
+        data = retrieve(self.url(**params), convert, self.transport,
+                        self.cache, self.collection, self.retry)
+        return data[f'{self.collection}_list']
+
+    async def aget(self, convert: bool = True,
+                   **params: CensusValue) -> List[Dict[str, Any]]:
+        """Asynchronous version of `get()`."""
+        data = await retrieve_async(self.url(**params), convert,
+                                    self.transport, self.cache,
+                                    self.collection, self.retry)
+        return data[f'{self.collection}_list']
+
+    async def aget_rows(self, **params: CensusValue) -> List[Row]:
+        """Asynchronous version of `get_rows()`."""
+        return [Row(r) for r in await self.aget(False, **params)]
+
+    def get_rows(self, **params: CensusValue) -> List[Row]:
+        """Perform the query and return the results as `Row` objects.
+
+        See `Query.get_rows()` for details.
+        """
+        return [Row(r) for r in self.get(False, **params)]
+
+    def get_many(self, values: Iterable[Any], convert: bool = True,
+                 workers: int = 4) -> List[List[Dict[str, Any]]]:
+        """Perform the query for several sets of parameter values.
+
+        Each item of `values` is a mapping of parameter values, or the
+        bare value if the query has a single parameter. Up to `workers`
+        requests are performed concurrently. The results lists are
+        returned in the order of the values.
+        """
+        if workers < 1:
+            raise ValueError('at least one worker is required')
+        urls = [self._url_for(v) for v in values]
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='auraxium')
+        with executor:
+            responses = list(executor.map(
+                lambda u: retrieve(u, convert, self.transport, self.cache,
+                                   self.collection, self.retry),
+                urls))
+        return [d[f'{self.collection}_list'] for d in responses]
+
+    async def aget_many(self, values: Iterable[Any], convert: bool = True
+                        ) -> List[List[Dict[str, Any]]]:
+        """Asynchronous version of `get_many()`.
+
+        The requests are subject to the concurrency limit of the
+        transport.
+        """
+        responses = await asyncio.gather(*(
+            retrieve_async(self._url_for(v), convert, self.transport,
+                           self.cache, self.collection, self.retry)
+            for v in values))
+        return [d[f'{self.collection}_list'] for d in responses]
+
+    def url(self, **params: CensusValue) -> str:
+        """Return the URL of the query for the given parameter values.
+
+        Raises:
+          * ValueError -- Raised if a parameter is missing or unknown
+
+        """
+        if params.keys() != self.parameters:
+            missing = ', '.join(sorted(self.parameters - params.keys()))
+            unknown = ', '.join(sorted(params.keys() - self.parameters))
+            raise ValueError(f'invalid parameters (missing: {missing}; '
+                             f'unknown: {unknown})')
+        segments = self._segments[:]
+        for index in range(1, len(segments), 2):
+            segments[index] = _value_to_str(params[segments[index]])
+        return ''.join(segments)
+
+    def _url_for(self, value: Any) -> str:
+        """Return the URL for an item of `get_many()`."""
+        if isinstance(value, Mapping):
+            return self.url(**value)
+        if len(self.parameters) != 1:
+            raise ValueError('bare values require a single parameter')
+        name, = self.parameters
+        return self.url(**{name: value})
@@ -1,14 +1,44 @@
-from typing import Any, Dict, List, Optional, Tuple
-from .census import retrieve, SearchModifier, Term, generate_term
+import sys
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List,
+                    NamedTuple, Optional, Tuple)
+from .cache import BaseCache
+from .census import (retrieve, retrieve_async, retrieve_iter,
+                     SearchModifier, Term, generate_term)
 from .constants import CENSUS_ENDPOINT
 from .join import Join
+from .prepared import PreparedQuery
+from .row import Row
+from .transport import Transport
 from .type import CensusValue
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .columnar import Column
+
+# The package, which holds the global namespace and service ID
+_package = sys.modules[__package__]
+
+
+class CompiledQuery(NamedTuple):
+    """The immutable, canonical form of a query.
+
+    Queries differing only in the order of their terms or field lists
+    compile to equal objects, which makes them suitable as keys.
+    """
+
+    url: str
+    path: str
+    params: Tuple[str, ...]
+
 
 class Query():
     """A query to be made to the REST API.
 
     Once created, a query may be re-run any number of times.
+
+    The query's URL is compiled once and cached until the query or any
+    of its joins are modified. Lists modified in place, such as
+    `show_fields`, are detected by comparing a snapshot of their
+    contents.
     """
 
     def __init__(self, collection: str = '', namespace: str = '',
@@ -18,8 +48,17 @@ class Query():
                  show_fields: List[str] = None, hide_fields: List[str] = None,
                  limit_per_db: Optional[int] = None, retry: bool = True,
                  start: int = 0, timing: bool = False,
+                 transport: Optional[Transport] = None,
+                 cache: Optional[BaseCache] = None,
                  **kwargs: CensusValue) -> None:
-        """Initializer."""
+        """Initializer.
+
+        If no transport or cache is specified, the process-wide
+        defaults will be used to perform the query.
+        """
+        self._compiled: Optional[Dict[Tuple[bool, str, str],
+                                      Tuple[Tuple[Any, ...],
+                                            CompiledQuery]]] = None
         self.collection = collection
         self.namespace = namespace
         self.service_id = service_id
@@ -44,6 +83,8 @@ class Query():
         self.start = start
         self.sort_by: List[str] = []
         self.timing = timing
+        self.transport = transport
+        self.cache = cache
         # Additional kwargs are passed on to the `generate_term` method
         self.terms: List[Term] = []
         for field, value in kwargs.items():
@@ -58,14 +99,76 @@ class Query():
         """
         new_term = Term(field, value, modifier)
         self.terms.append(new_term)
+        self._invalidate()
         return self
 
+    def aiter_pages(self, page_size: int = 100, max_in_flight: int = 2,
+                    use_count: bool = False, convert: bool = True
+                    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Asynchronous version of `iter_pages()`."""
+        from .pagination import aiter_pages
+        return aiter_pages(self, page_size, max_in_flight, use_count, convert)
+
+    def astream(self, page_size: int = 100, max_in_flight: int = 2,
+                use_count: bool = False, convert: bool = True
+                ) -> AsyncIterator[Dict[str, Any]]:
+        """Asynchronous version of `stream()`."""
+        from .pagination import astream
+        return astream(self, page_size, max_in_flight, use_count, convert)
+
+    async def acount(self) -> int:
+        """Asynchronous version of `count()`."""
+        data = await retrieve_async(self.url(count=True), True,
+                                    self.transport, self.cache,
+                                    self.collection, self.retry)
+        return int(data['count'])
+
+    async def aget_all(self, workers: int = 4, shard_size: int = 1000,
+                       shard_retries: int = 2, convert: bool = True
+                       ) -> List[Dict[str, Any]]:
+        """Asynchronous version of `get_all()`."""
+        from .pagination import aget_all
+        return await aget_all(self, workers, shard_size, shard_retries,
+                              convert)
+
+    async def aget(self, convert: bool = True) -> List[Dict[str, Any]]:
+        """Asynchronous version of `get()`.
+
+        The request is performed on the transport's thread pool and
+        will not block the event loop.
+        """
+        data = await retrieve_async(self.url(), convert, self.transport,
+                                    self.cache, self.collection, self.retry)
+        return data[f'{self.collection}_list']
+
+    async def aget_rows(self) -> List[Row]:
+        """Asynchronous version of `get_rows()`."""
+        data = await retrieve_async(self.url(), False, self.transport,
+                                    self.cache, self.collection, self.retry)
+        return [Row(r) for r in data[f'{self.collection}_list']]
+
+    def compile(self, count: bool = False) -> CompiledQuery:
+        """Return the canonical form of this query.
+
+        The result is cached until the query is modified, or the global
+        namespace or service ID are changed.
+        """
+        key = (count, _package.namespace, _package.service_id)
+        if self._compiled is None:
+            self._compiled = {}
+        contents = self._contents()
+        entry = self._compiled.get(key)
+        if entry is None or entry[0] != contents:
+            entry = self._compiled[key] = contents, self._compile(*key)
+        return entry[1]
+
     def count(self) -> int:
         """Return the number of matching items for this query.
 
         Not all collections are countable.
         """
-        data = retrieve(self.url(count=True), True)
+        data = retrieve(self.url(count=True), True, self.transport,
+                        self.cache, self.collection, self.retry)
         return int(data['count'])
 
     def distinct(self, field_name: str) -> 'Query':
@@ -78,9 +181,52 @@ class Query():
 
     def get(self, convert: bool = True) -> List[Dict[str, Any]]:
         """Perform the query and return the results list."""
-        data = retrieve(self.url(), convert=convert)
+        data = retrieve(self.url(), convert, self.transport, self.cache,
+                        self.collection, self.retry)
         return data[f'{self.collection}_list']
 
+    def get_all(self, workers: int = 4, shard_size: int = 1000,
+                shard_retries: int = 2, convert: bool = True
+                ) -> List[Dict[str, Any]]:
+        """Return all results of this query.
+
+        The number of results is counted first, then the results are
+        retrieved in shards of `shard_size` results using the "c:start"
+        and "c:limit" query commands, with up to `workers` shards
+        requested concurrently. The query's `limit` is ignored.
+
+        A shard failing with a transient error is retried on its own,
+        up to `shard_retries` times. The collection must be countable.
+        """
+        from .pagination import get_all
+        return get_all(self, workers, shard_size, shard_retries, convert)
+
+    def get_columns(self, human_date: bool = False,
+                    use_numpy: Optional[bool] = None
+                    ) -> Dict[str, 'Column']:
+        """Perform the query and return the results as columns.
+
+        Each field of the results is returned as a typed array, which
+        avoids creating a Python object for every value. See the
+        `columnar` module for details.
+        """
+        from .columnar import to_columns
+        data = retrieve(self.url(), False, self.transport, self.cache,
+                        self.collection, self.retry)
+        return to_columns(data[f'{self.collection}_list'], human_date,
+                          use_numpy)
+
+    def get_rows(self) -> List[Row]:
+        """Perform the query and return the results as `Row` objects.
+
+        Unlike `get()`, the fields of the results are only converted
+        when they are accessed, which is faster for wide results of
+        which only a few fields are used. Rows are read-only.
+        """
+        data = retrieve(self.url(), False, self.transport, self.cache,
+                        self.collection, self.retry)
+        return [Row(r) for r in data[f'{self.collection}_list']]
+
     def has(self, field_name: str, *args: str) -> 'Query':
         """Only return results with non-NULL values for these fields.
 
@@ -101,6 +247,39 @@ class Query():
         self.hide_fields.extend(args)
         return self
 
+    def iter_results(self, convert: bool = True
+                     ) -> Iterator[Dict[str, Any]]:
+        """Perform the query and yield the results as they arrive.
+
+        The response is decoded incrementally, which keeps memory use
+        bounded for very large responses and allows processing the
+        first results before the response has been received in full.
+        Results retrieved this way bypass the response cache.
+        """
+        yield from retrieve_iter(self.url(), convert, self.transport,
+                                 collection=self.collection, retry=self.retry)
+
+    def iter_rows(self) -> Iterator[Row]:
+        """Lazily converted version of `iter_results()`."""
+        for result in self.iter_results(convert=False):
+            yield Row(result)
+
+    def iter_pages(self, page_size: int = 100, max_in_flight: int = 2,
+                   use_count: bool = False, convert: bool = True
+                   ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the results of this query one page at a time.
+
+        Pages are retrieved using the "c:start" and "c:limit" query
+        commands, starting at the query's `start` value; its `limit`
+        is ignored. Up to `max_in_flight` pages are requested while the
+        current page is being processed.
+
+        If `use_count` is set, the number of results is retrieved
+        first, which avoids requesting pages past the end.
+        """
+        from .pagination import iter_pages
+        return iter_pages(self, page_size, max_in_flight, use_count, convert)
+
     def join(self, collection: str, inject_at: str = '', is_list: bool = False,
              on: str = '', is_outer: bool = True, to: str = '',
              hide: List[str] = None, show: List[str] = None,
@@ -112,12 +291,22 @@ class Query():
         """
         join = Join(collection, inject_at, is_list,
                     on, is_outer, to, show, hide, **kwargs)
+        join._parent = self  # pylint: disable=protected-access
         self.joins.append(join)
+        self._invalidate()
         return join
 
     def url(self, count: bool = False) -> str:
-        """Generate the URL for this query."""
-        from . import namespace, service_id
+        """Generate the URL for this query.
+
+        Terms and field lists are sorted to give equivalent queries the
+        same URL.
+        """
+        return self.compile(count).url
+
+    def _compile(self, count: bool, namespace: str,
+                 service_id: str) -> CompiledQuery:
+        """Generate the canonical form of this query."""
         # This list holds the elements of the URL path
         path_items: List[str] = [CENSUS_ENDPOINT]
         # Use the query's service ID if it has been changed
@@ -136,15 +325,37 @@ class Query():
         if self.collection:
             path_items.append(self.collection)
         # Concatenate the URL path elements
-        url = '/'.join(path_items)
+        path = '/'.join(path_items)
         # Create a list of all query string items
-        query_string_items = [t.to_url() for t in self.terms]
+        query_string_items = sorted(t.to_url() for t in self.terms)
         # Process any query commands
         query_string_items.extend(_process_query_commands(self))
         # Append the query string to the URL
+        url = path
         if query_string_items:
             url += '?' + '&'.join(query_string_items)
-        return url
+        return CompiledQuery(url, path, tuple(query_string_items))
+
+    def _contents(self) -> Tuple[Any, ...]:
+        """Return a snapshot of the lists that are part of the URL."""
+        return (tuple(self.terms), tuple(self.show_fields),
+                tuple(self.hide_fields), tuple(self.sort_by),
+                tuple(self.has_field), tuple(self.resolves),
+                tuple([j.process_join() for j in self.joins]))
+
+    def _invalidate(self) -> None:
+        """Discard the compiled forms of this query."""
+        object.__setattr__(self, '_compiled', None)
+
+    def prepare(self) -> PreparedQuery:
+        """Compile this query into a reusable URL template.
+
+        Terms whose values are `Parameter` objects are substituted when
+        the prepared query is performed. See `PreparedQuery` for
+        details.
+        """
+        return PreparedQuery(self.url(), self.collection, self.transport,
+                             self.cache, self.retry)
 
     def resolve(self, field: str, *args: str) -> 'Query':
         """Resolve one or more resolvable fields.
@@ -174,8 +385,19 @@ class Query():
         if descending:
             string += ':-1'
         self.sort_by.append(string)
+        self._invalidate()
         return self
 
+    def stream(self, page_size: int = 100, max_in_flight: int = 2,
+               use_count: bool = False, convert: bool = True
+               ) -> Iterator[Dict[str, Any]]:
+        """Yield the results of this query one entry at a time.
+
+        See the `iter_pages()` method for details.
+        """
+        from .pagination import stream
+        return stream(self, page_size, max_in_flight, use_count, convert)
+
     def tree(self, field: str, is_list: bool = False, prefix: str = '',
              start: int = 0) -> 'Query':
         """Restructure the results returned into a tree view.
@@ -190,6 +412,11 @@ class Query():
         """
         raise NotImplementedError()
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name != '_compiled':
+            self._invalidate()
+
 
 def _process_query_commands(query: Query) -> List[str]:
     """Generate a list of query string items from query commands."""
@@ -198,21 +425,21 @@ def _process_query_commands(query: Query) -> List[str]:
     # the documentation, this is not random.
     # c:show
     if query.show_fields:
-        items.append('c:show=' + ','.join(query.show_fields))
+        items.append('c:show=' + ','.join(sorted(query.show_fields)))
         if query.hide_fields:
             raise Warning('show_fields overrides hide_fields')
     # c:hide
     elif query.hide_fields:
-        items.append('c:hide=' + ','.join(query.hide_fields))
+        items.append('c:hide=' + ','.join(sorted(query.hide_fields)))
     # c:sort
     if query.sort_by:
         items.append('c:sort=' + ','.join(query.sort_by))
     # c:has
     if query.has_field:
-        items.append('c:has=' + ','.join(query.has_field))
+        items.append('c:has=' + ','.join(sorted(query.has_field)))
     # c:resolve
     if query.resolves:
-        items.append('c:resolve=' + ','.join(query.resolves))
+        items.append('c:resolve=' + ','.join(sorted(query.resolves)))
     # c:case
     if not query.case:
         items.append('c:case=0')
@@ -0,0 +1,81 @@
+"""Lazily converted views of response entries.
+
+Converting an entire response up front is wasteful if only a few fields
+of each entry are used. The `Row` class wraps the unconverted data and
+only converts the fields that are actually accessed.
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+from .census import _convert_dict, _convert_value, _is_skipped
+
+
+class Row(Mapping):
+    """A read-only, lazily converted view of a response entry.
+
+    Fields are converted using the same rules as `Query.get()` the
+    first time they are accessed, after which the converted value is
+    memoized. Nested dictionaries are returned as `Row` objects too.
+
+    Fields are accessible both as items and as attributes, i.e.
+    `row['name']['first']` and `row.name.first` are equivalent.
+    """
+
+    __slots__ = ('_raw', '_human_date', '_values')
+
+    def __init__(self, raw: Dict[str, Any], human_date: bool = False) -> None:
+        """Initializer."""
+        self._raw = raw
+        self._human_date = human_date
+        self._values: Optional[Dict[str, Any]] = None
+
+    def __getattr__(self, name: str) -> Any:
+        # Private names are never fields, this also prevents recursion for
+        # uninitialised slots
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key: str) -> Any:
+        if self._values is not None and key in self._values:
+            return self._values[key]
+        raw = self._raw
+        if key not in raw or _is_skipped(key, raw, self._human_date):
+            raise KeyError(key)
+        value = raw[key]
+        if isinstance(value, dict):
+            value = Row(value, self._human_date)
+        elif isinstance(value, list):
+            value = [Row(v, self._human_date) if isinstance(v, dict) else v
+                     for v in value]
+        else:
+            value = _convert_value(key, value, raw, self._human_date)
+        if self._values is None:
+            self._values = {}
+        self._values[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        raw = self._raw
+        return (k for k in raw if not _is_skipped(k, raw, self._human_date))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'Row({self._raw!r})'
+
+    @property
+    def raw(self) -> Dict[str, Any]:
+        """The unconverted data of this entry.
+
+        This must not be modified.
+        """
+        return self._raw
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the fully converted entry as a dictionary."""
+        return _convert_dict(self._raw, self._human_date)
@@ -0,0 +1,183 @@
+"""Client-side rate limiting and retrying of REST API requests.
+
+All requests are performed through a `Scheduler`, which enforces a
+token bucket rate limit per service ID and retries transient errors
+using exponential backoff with jitter. Unless replaced using
+`set_default_scheduler()`, the default scheduler does not limit the
+request rate, but still retries transient errors.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+import requests
+from .exceptions import (MaintenanceError, ServerError,
+                         ServiceIDMissingError)
+from .log import logger
+
+_T = TypeVar('_T')
+
+# HTTP status codes worth retrying
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+
+class TokenBucket():
+    """A thread-safe token bucket.
+
+    Tokens are replenished at `rate` tokens per second, up to a maximum
+    of `burst` tokens.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """Initializer."""
+        if rate <= 0 or burst < 1:
+            raise ValueError('the rate and burst size must be positive')
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return the time to wait before using it.
+
+        Tokens may be reserved ahead of time, in which case the bucket
+        will go into debt and subsequent callers will wait longer.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst),
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            if self._tokens >= 0.0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class Scheduler():
+    """Rate limiter and retry policy shared by all queries.
+
+    `rate` and `burst` define the default token bucket used for every
+    service ID, `rates` may be used to override the rate for specific
+    service IDs (without the "s:" prefix). A rate of None disables rate
+    limiting.
+
+    Transient errors are retried up to `max_retries` times, waiting
+    between `backoff / 2` and `backoff` seconds before the first retry.
+    This delay doubles with every retry, up to `max_backoff`.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 10,
+                 rates: Optional[Dict[str, float]] = None,
+                 max_retries: int = 3, backoff: float = 0.5,
+                 max_backoff: float = 30.0) -> None:
+        """Initializer."""
+        if max_retries < 0:
+            raise ValueError('the number of retries cannot be negative')
+        self.rate = rate
+        self.burst = burst
+        self.rates = {} if rates is None else rates
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def delay(self, attempt: int) -> float:
+        """Return the jittered delay before the given retry attempt."""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def execute(self, url: str, func: Callable[[], _T],
+                retry: bool = True) -> _T:
+        """Perform a request for the given URL.
+
+        The caller is blocked until the service ID's rate limit allows
+        for the request to be made. If `retry` is set, transient errors
+        raised by the function are retried.
+        """
+        attempt = 0
+        while True:
+            self.wait(url)
+            try:
+                return func()
+            except Exception as err:  # pylint: disable=broad-except
+                if not retry or attempt >= self.max_retries:
+                    raise
+                if not is_transient(err):
+                    raise
+                delay = self.delay(attempt)
+                attempt += 1
+                logger.warning('Request failed (%s), retrying in %.2f s: %s',
+                               err, delay, url)
+                time.sleep(delay)
+
+    def wait(self, url: str) -> None:
+        """Block until the rate limit allows a request for the URL."""
+        bucket = self._bucket(_service_id(url))
+        if bucket is not None:
+            delay = bucket.reserve()
+            if delay > 0.0:
+                time.sleep(delay)
+
+    def _bucket(self, service_id: str) -> Optional[TokenBucket]:
+        """Return the token bucket for a service ID, if any."""
+        bucket = self._buckets.get(service_id)
+        if bucket is None:
+            rate = self.rates.get(service_id, self.rate)
+            if rate is None:
+                return None
+            with self._lock:
+                bucket = self._buckets.setdefault(
+                    service_id, TokenBucket(rate, self.burst))
+        return bucket
+
+
+def is_transient(error: BaseException) -> bool:
+    """Return whether an error is worth retrying."""
+    if isinstance(error, (MaintenanceError, ServiceIDMissingError,
+                          requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return response is not None and (
+            response.status_code in RETRY_STATUS_CODES)
+    # Generic server errors without a more specific subclass
+    return type(error) is ServerError  # pylint: disable=unidiomatic-typecheck
+
+
+def _service_id(url: str) -> str:
+    """Return the service ID of a query URL, without the "s:" prefix."""
+    # The path is "<endpoint>/s:<id>/<verb>/..."
+    parts = url.split('/', 4)
+    if len(parts) > 3 and parts[3].startswith('s:'):
+        return parts[3][2:]
+    return ''
+
+
+_default_scheduler: Optional[Scheduler] = None
+_default_lock = threading.Lock()
+
+
+def get_default_scheduler() -> Scheduler:
+    """Return the process-wide default scheduler.
+
+    The default scheduler is created on first use.
+    """
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = Scheduler()
+        return _default_scheduler
+
+
+def set_default_scheduler(scheduler: Optional[Scheduler]) -> None:
+    """Replace the scheduler used for all requests.
+
+    Passing None resets the default.
+    """
+    global _default_scheduler
+    with _default_lock:
+        _default_scheduler = scheduler
@@ -0,0 +1,95 @@
+"""Coalescing of identical concurrent calls.
+
+If a call is made while an identical call (as identified by its key) is
+still in progress, the new caller waits for the first call to complete
+and receives its result, rather than performing the call again.
+
+This is used to perform only one request for any number of identical
+queries made concurrently.
+"""
+
+import asyncio
+import threading
+from typing import (Any, Awaitable, Callable, Dict, Generic, Hashable, Tuple,
+                    TypeVar)
+
+_T = TypeVar('_T')
+
+
+class _Call(Generic[_T]):
+    """A call in progress."""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Any = None
+        self.waiters = 0
+
+
+class SingleFlight():
+    """Coalesce concurrent calls sharing the same key.
+
+    Both methods return a tuple of the result and whether the result
+    was shared with other callers. Shared results must not be modified.
+    Exceptions raised by the call are raised for every caller.
+    """
+
+    def __init__(self) -> None:
+        """Initializer."""
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Tuple[Any, Hashable], 'asyncio.Future[Any]'] = {}
+        self._waiters: Dict[Tuple[Any, Hashable], int] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], _T]) -> Tuple[_T, bool]:
+        """Call the function, unless a call for the key is in progress.
+
+        Safe to use from any number of threads.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                shared = call.waiters > 0
+            call.done.set()
+        return call.result, shared
+
+    async def ado(self, key: Hashable,
+                  func: Callable[[], Awaitable[_T]]) -> Tuple[_T, bool]:
+        """Asynchronous version of `do()`.
+
+        Calls are only coalesced within the same event loop. The call
+        is not cancelled if a waiting caller is cancelled.
+        """
+        loop_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(loop_key)
+        if task is not None:
+            self._waiters[loop_key] += 1
+            return await asyncio.shield(task), True
+        task = asyncio.ensure_future(func())
+        self._tasks[loop_key] = task
+        self._waiters[loop_key] = 0
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            shared = self._waiters.pop(loop_key) > 0
+            del self._tasks[loop_key]
+        return result, shared
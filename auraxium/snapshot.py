@@ -0,0 +1,260 @@
+"""Persistent storage of responses and collection snapshots.
+
+The `SnapshotStore` class keeps responses in an SQLite database, which
+allows them to survive restarts. It can be used as a cache on its own,
+or as the fallback of an in-memory `ResponseCache`.
+
+It can also store snapshots of entire collections, which are retrieved
+page by page. Snapshots can be created from the command line:
+
+    python -m auraxium.snapshot snapshot.db item weapon --max-age 86400
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from typing import (Any, Dict, Iterable, Iterator, List, NamedTuple,
+                    Optional, Tuple)
+from .cache import BaseCache
+from .constants import STATIC_COLLECTIONS
+from .query import Query
+from .transport import Transport
+
+# Increment this whenever the layout of the stored data changes
+SNAPSHOT_VERSION = 1
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    fetched REAL NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_collection ON responses (collection);
+CREATE TABLE IF NOT EXISTS snapshots (
+    collection TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    fetched REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    PRIMARY KEY (collection, namespace)
+);
+CREATE TABLE IF NOT EXISTS rows (
+    collection TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (collection, namespace, position)
+);
+'''
+
+
+class SnapshotInfo(NamedTuple):
+    """Metadata of a stored collection snapshot."""
+
+    version: int
+    fetched: float
+    row_count: int
+
+
+class SnapshotStore(BaseCache):
+    """An SQLite-backed store for responses and collection snapshots.
+
+    As a cache, only responses for the collections listed in
+    `collections` are persisted; pass None to persist all responses.
+    Stored responses older than `max_age` seconds are ignored, a
+    `max_age` of None keeps them indefinitely.
+    """
+
+    def __init__(self, path: str = ':memory:',
+                 max_age: Optional[float] = None,
+                 collections: Optional[Iterable[str]] = STATIC_COLLECTIONS
+                 ) -> None:
+        """Initializer."""
+        self.path = path
+        self.max_age = max_age
+        self.collections = None if collections is None else set(collections)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'SnapshotStore':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self._connection.close()
+
+    def get_entry(self, url: str) -> Optional[Tuple[Any, int]]:
+        """Return the stored data for a URL and its size in bytes."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT body, fetched FROM responses WHERE url = ?',
+                (url,)).fetchone()
+        if row is None or _is_expired(row[1], self.max_age):
+            return None
+        return json.loads(row[0]), len(row[0].encode())
+
+    def info(self, collection: str,
+             namespace: str = '') -> Optional[SnapshotInfo]:
+        """Return the metadata of a collection snapshot, if any."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT version, fetched, row_count FROM snapshots '
+                'WHERE collection = ? AND namespace = ?',
+                (collection, _namespace(namespace))).fetchone()
+        return None if row is None else SnapshotInfo(*row)
+
+    def invalidate(self, url: Optional[str] = None,
+                   collection: Optional[str] = None) -> int:
+        """Remove stored responses by URL, by collection, or both.
+
+        Returns the number of responses removed. Collection snapshots
+        are not affected.
+        """
+        conditions: List[str] = []
+        params: List[str] = []
+        if url is not None:
+            conditions.append('url = ?')
+            params.append(url)
+        if collection is not None:
+            conditions.append('collection = ?')
+            params.append(collection)
+        statement = 'DELETE FROM responses'
+        if conditions:
+            statement += ' WHERE ' + ' AND '.join(conditions)
+        with self._lock, self._connection:
+            return self._connection.execute(statement, params).rowcount
+
+    def is_stale(self, collection: str, namespace: str = '',
+                 max_age: Optional[float] = None) -> bool:
+        """Return whether a collection snapshot must be refreshed.
+
+        Missing snapshots and snapshots created by a different version
+        of this module are always stale. If specified, snapshots older
+        than `max_age` seconds are also considered stale.
+        """
+        info = self.info(collection, namespace)
+        if info is None or info.version != SNAPSHOT_VERSION:
+            return True
+        return _is_expired(info.fetched, max_age)
+
+    def put(self, url: str, data: Any, size: int,
+            collection: str = '') -> None:
+        """Persist the data for a URL."""
+        if self.collections is not None and collection not in self.collections:
+            return
+        body = json.dumps(data, separators=(',', ':'))
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (url, collection, time.time(), body))
+
+    def refresh(self, collections: Iterable[str], namespace: str = '',
+                max_age: Optional[float] = None, page_size: int = 1000,
+                transport: Optional[Transport] = None) -> List[str]:
+        """Snapshot any of the given collections that are stale.
+
+        Returns the list of collections that were refreshed.
+        """
+        refreshed: List[str] = []
+        for collection in collections:
+            if self.is_stale(collection, namespace, max_age):
+                self.snapshot(collection, namespace, page_size, transport)
+                refreshed.append(collection)
+        return refreshed
+
+    def rows(self, collection: str,
+             namespace: str = '') -> Iterator[Dict[str, Any]]:
+        """Yield the unconverted entries of a collection snapshot."""
+        with self._lock:
+            bodies = self._connection.execute(
+                'SELECT body FROM rows WHERE collection = ? AND namespace = ? '
+                'ORDER BY position',
+                (collection, _namespace(namespace))).fetchall()
+        for (body,) in bodies:
+            yield json.loads(body)
+
+    def snapshot(self, collection: str, namespace: str = '',
+                 page_size: int = 1000,
+                 transport: Optional[Transport] = None) -> int:
+        """Store the entire contents of a collection.
+
+        The collection is retrieved page by page, any existing snapshot
+        of it is only replaced once all pages have been retrieved.
+        Returns the number of entries stored.
+        """
+        namespace = _namespace(namespace)
+        query = Query(collection, namespace=namespace, transport=transport)
+        bodies: List[str] = []
+        for page in query.iter_pages(page_size, convert=False):
+            bodies.extend(json.dumps(r, separators=(',', ':')) for r in page)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM rows WHERE collection = ? AND namespace = ?',
+                (collection, namespace))
+            self._connection.executemany(
+                'INSERT INTO rows VALUES (?, ?, ?, ?)',
+                ((collection, namespace, i, b) for i, b in enumerate(bodies)))
+            self._connection.execute(
+                'INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)',
+                (collection, namespace, SNAPSHOT_VERSION, time.time(),
+                 len(bodies)))
+        return len(bodies)
+
+
+def _is_expired(fetched: float, max_age: Optional[float]) -> bool:
+    """Return whether a timestamp is older than the given age."""
+    return max_age is not None and time.time() - fetched > max_age
+
+
+def _namespace(namespace: str) -> str:
+    """Resolve the default namespace if none is given."""
+    if namespace:
+        return namespace
+    from . import namespace as default_namespace
+    return default_namespace
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line interface for creating collection snapshots."""
+    parser = argparse.ArgumentParser(
+        prog='python -m auraxium.snapshot',
+        description='Store snapshots of Census API collections.')
+    parser.add_argument('path', help='the SQLite database to write to')
+    parser.add_argument('collections', nargs='*',
+                        help='the collections to snapshot (default: all '
+                        'static collections)')
+    parser.add_argument('--namespace', default='',
+                        help='the namespace to use (default: ps2:v2)')
+    parser.add_argument('--service-id', default='',
+                        help='the service ID to use')
+    parser.add_argument('--max-age', type=float, default=None,
+                        help='only refresh snapshots older than this many '
+                        'seconds')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='the number of entries to request at a time')
+    args = parser.parse_args(argv)
+    if args.service_id:
+        import auraxium
+        auraxium.service_id = args.service_id
+    collections = args.collections or STATIC_COLLECTIONS
+    with SnapshotStore(args.path) as store:
+        refreshed = store.refresh(collections, args.namespace, args.max_age,
+                                  args.page_size)
+        for collection in collections:
+            info = store.info(collection, args.namespace)
+            if collection not in refreshed:
+                print(f'{collection}: up to date')
+            elif info is not None:
+                print(f'{collection}: {info.row_count} entries')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,412 @@
+"""Offline stand-ins for the Census API.
+
+The `FixtureTransport` serves recorded responses in-process, while the
+`CensusServer` serves them over HTTP for use with a regular `Transport`
+whose `base_url` points at it. Both can simulate latency, throttling,
+server errors and maintenance using a `Simulation`:
+
+    fixtures = Fixtures.load('fixtures.json')
+    with CensusServer(fixtures, Simulation(latency=0.05)) as server:
+        transport = auraxium.Transport(base_url=server.url)
+        auraxium.Query('world', transport=transport).get()
+
+Responses can be recorded from the live API using `RecordingTransport`.
+The server may also be run from the command line:
+
+    python -m auraxium.testing fixtures.json --port 8000 --latency 0.05
+"""
+
+import argparse
+import collections
+import datetime
+import http.server
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import requests
+from .constants import CENSUS_ENDPOINT
+from .transport import Transport
+
+# Kinds of simulated failures
+THROTTLE = 'throttle'
+SERVER_ERROR = 'server_error'
+MAINTENANCE = 'maintenance'
+
+_THROTTLE_BODY = {'error': 'Missing Service ID. A valid Service ID is '
+                           'required for continued api use. The Service ID '
+                           'is free, sign up now at '
+                           'https://census.daybreakgames.com/#devSignup'}
+_SERVER_ERROR_BODY = {'errorCode': 'SERVER_ERROR',
+                      'errorMessage': 'Simulated server error'}
+
+
+def fixture_key(url: str) -> str:
+    """Return the key under which the response for a URL is stored.
+
+    The key omits the endpoint and service ID, and the query string
+    items are sorted, i.e. "get/ps2:v2/world?c:limit=10".
+    """
+    parts = urllib.parse.urlsplit(urllib.parse.unquote(url))
+    path = [p for p in parts.path.split('/') if p]
+    if path and path[0].startswith('s:'):
+        path = path[1:]
+    key = '/'.join(path)
+    if parts.query:
+        key += '?' + '&'.join(sorted(parts.query.split('&')))
+    return key
+
+
+class Fixtures():
+    """Recorded responses, stored by their `fixture_key()`.
+
+    Requests without a recorded response may also be answered from the
+    entries of a collection, see `add_collection()`.
+    """
+
+    def __init__(self, responses: Optional[Dict[str, Any]] = None) -> None:
+        """Initializer."""
+        self.responses: Dict[str, Any] = {}
+        self.collections: Dict[str, List[Dict[str, Any]]] = {}
+        for url, data in (responses or {}).items():
+            self.add(url, data)
+
+    def __contains__(self, url: object) -> bool:
+        return isinstance(url, str) and self.get(url) is not None
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def add(self, url: str, data: Any) -> None:
+        """Add the response for a URL or fixture key."""
+        self.responses[fixture_key(url)] = data
+
+    def add_collection(self, collection: str,
+                       rows: Iterable[Dict[str, Any]]) -> None:
+        """Answer requests for a collection using its raw entries.
+
+        Only requests without a recorded response are answered this
+        way. Terms must match top-level fields exactly, comma-separated
+        values match any of them. Of the query commands, "c:start",
+        "c:limit" and "c:show" are supported, all others are ignored.
+        """
+        self.collections[collection] = list(rows)
+
+    def get(self, url: str) -> Optional[Any]:
+        """Return the response for a URL, if any."""
+        key = fixture_key(url)
+        data = self.responses.get(key)
+        if data is None:
+            data = self._evaluate(key)
+        return data
+
+    @classmethod
+    def load(cls, path: str) -> 'Fixtures':
+        """Load fixtures from a JSON file."""
+        with open(path, encoding='utf-8') as file_:
+            return cls(json.load(file_))
+
+    def save(self, path: str) -> None:
+        """Write the recorded responses to a JSON file."""
+        with open(path, 'w', encoding='utf-8') as file_:
+            json.dump(self.responses, file_, indent=1, sort_keys=True)
+
+    def _evaluate(self, key: str) -> Optional[Any]:
+        """Answer a request using the entries of its collection."""
+        path, _, query = key.partition('?')
+        parts = path.split('/')
+        rows = self.collections.get(parts[-1])
+        if rows is None or len(parts) != 3:
+            return None
+        params = dict(p.partition('=')[::2] for p in query.split('&') if p)
+        terms = {k: v.split(',') for k, v in params.items()
+                 if not k.startswith('c:')}
+        rows = [r for r in rows
+                if all(str(r.get(k)) in v for k, v in terms.items())]
+        if parts[0] == 'count':
+            return {'count': len(rows)}
+        start = int(params.get('c:start', 0))
+        rows = rows[start:start + int(params.get('c:limit', 1))]
+        if 'c:show' in params:
+            show = params['c:show'].split(',')
+            rows = [{k: v for k, v in r.items() if k in show} for r in rows]
+        return {f'{parts[-1]}_list': rows, 'returned': len(rows)}
+
+
+class Simulation():
+    """The latency and failures simulated by a stand-in.
+
+    Every response is delayed by `latency` plus up to `jitter` seconds.
+    Requests exceeding `rate_limit` requests per second for a service
+    ID are throttled, and a random `error_rate` fraction of requests
+    fails with a server error. While `maintenance` is set, all requests
+    fail with HTTP 503. Failures may also be queued using `fail_next()`.
+    Pass a `seed` to make the random choices reproducible.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: Optional[float] = None, error_rate: float = 0.0,
+                 maintenance: bool = False,
+                 seed: Optional[int] = None) -> None:
+        """Initializer."""
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.maintenance = maintenance
+        self._random = random.Random(seed)
+        self._failures: Deque[Tuple[str, str]] = collections.deque()
+        self._history: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Return the delay for a response."""
+        with self._lock:
+            return self.latency + self._random.uniform(0.0, self.jitter)
+
+    def fail_next(self, *kinds: str, match: str = '') -> None:
+        """Fail the next requests with the given kinds of failures.
+
+        If `match` is given, only requests whose fixture key contains
+        it are failed, i.e. "c:start=100".
+        """
+        for kind in kinds:
+            if kind not in (THROTTLE, SERVER_ERROR, MAINTENANCE):
+                raise ValueError(f'unknown failure "{kind}"')
+        with self._lock:
+            self._failures.extend((k, match) for k in kinds)
+
+    def failure(self, service_id: str, key: str = '') -> Optional[str]:
+        """Return the failure to simulate for a request, if any.
+
+        `key` is the request's fixture key, see `fail_next()`.
+        """
+        with self._lock:
+            for index, (kind, match) in enumerate(self._failures):
+                if match in key:
+                    del self._failures[index]
+                    return kind
+            if self.maintenance:
+                return MAINTENANCE
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                history = self._history.setdefault(service_id,
+                                                   collections.deque())
+                while history and now - history[0] >= 1.0:
+                    history.popleft()
+                if len(history) >= self.rate_limit:
+                    return THROTTLE
+                history.append(now)
+            if self._random.random() < self.error_rate:
+                return SERVER_ERROR
+        return None
+
+
+class Responder():
+    """Produces the responses of a stand-in for request URLs.
+
+    All requests are logged in `request_log` by their fixture key.
+    """
+
+    def __init__(self, fixtures: Fixtures,
+                 simulation: Optional[Simulation] = None) -> None:
+        """Initializer."""
+        self.fixtures = fixtures
+        self.simulation = Simulation() if simulation is None else simulation
+        self.request_log: List[str] = []
+        self._lock = threading.Lock()
+
+    def respond(self, url: str) -> Tuple[int, bytes, float]:
+        """Return the status code, body and delay for a URL."""
+        key = fixture_key(url)
+        with self._lock:
+            self.request_log.append(key)
+        delay = self.simulation.delay()
+        path = urllib.parse.urlsplit(url).path.split('/')
+        service_id = path[1] if len(path) > 1 else ''
+        failure = self.simulation.failure(service_id, key)
+        if failure == MAINTENANCE:
+            return 503, b'Service Unavailable', delay
+        if failure == THROTTLE:
+            return 200, _encode(_THROTTLE_BODY), delay
+        if failure == SERVER_ERROR:
+            return 200, _encode(_SERVER_ERROR_BODY), delay
+        data = self.fixtures.get(url)
+        if data is None:
+            return 404, _encode({'error': f'No fixture for {key}'}), delay
+        return 200, _encode(data), delay
+
+
+class FixtureTransport(Transport):
+    """An in-process transport serving recorded responses.
+
+    Responses are real `requests.Response` objects, including support
+    for streaming, but no connections are made.
+    """
+
+    def __init__(self, fixtures: Fixtures,
+                 simulation: Optional[Simulation] = None,
+                 **kwargs: Any) -> None:
+        """Initializer."""
+        super().__init__(**kwargs)
+        self.responder = Responder(fixtures, simulation)
+
+    @property
+    def request_log(self) -> List[str]:
+        """The fixture keys of all requests performed."""
+        return self.responder.request_log
+
+    def get(self, url: str, stream: bool = False) -> requests.Response:
+        status, body, delay = self.responder.respond(url)
+        if delay > 0.0:
+            time.sleep(delay)
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response.elapsed = datetime.timedelta(seconds=delay)
+        response.headers['Content-Type'] = 'application/json'
+        response.raw = io.BytesIO(body)
+        if not stream:
+            response._content = body  # pylint: disable=protected-access
+        return response
+
+
+class RecordingTransport(Transport):
+    """A transport recording successful responses as fixtures."""
+
+    def __init__(self, fixtures: Optional[Fixtures] = None,
+                 **kwargs: Any) -> None:
+        """Initializer."""
+        super().__init__(**kwargs)
+        self.fixtures = Fixtures() if fixtures is None else fixtures
+
+    def get(self, url: str, stream: bool = False) -> requests.Response:
+        response = super().get(url, stream)
+        # Streamed responses are not recorded as this would consume them
+        if not stream and response.status_code == 200:
+            self.fixtures.add(url, response.json())
+        return response
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Request handler of the stand-in server."""
+
+    protocol_version = 'HTTP/1.1'
+    responder: Responder
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Serve a GET request."""
+        status, body, delay = self.responder.respond(
+            CENSUS_ENDPOINT + self.path)
+        if delay > 0.0:
+            time.sleep(delay)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # pylint: disable=redefined-builtin
+        pass
+
+
+class CensusServer():
+    """A local HTTP server standing in for the Census API.
+
+    The server runs on a background thread between `start()` and
+    `stop()`, or while used as a context manager. Port 0 selects a free
+    port, see `url` for the address to pass as a transport's
+    `base_url`.
+    """
+
+    def __init__(self, fixtures: Fixtures,
+                 simulation: Optional[Simulation] = None,
+                 host: str = '127.0.0.1', port: int = 0) -> None:
+        """Initializer."""
+        self.responder = Responder(fixtures, simulation)
+        handler = type('_Handler', (_Handler,), {'responder': self.responder})
+        self._server = http.server.ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'CensusServer':
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.stop()
+
+    @property
+    def request_log(self) -> List[str]:
+        """The fixture keys of all requests served."""
+        return self.responder.request_log
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def serve_forever(self) -> None:
+        """Serve requests on the current thread until interrupted."""
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """Start serving requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='auraxium-server', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the server and close its socket."""
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+def _encode(data: Any) -> bytes:
+    """Encode a response body."""
+    return json.dumps(data).encode()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line interface for running the stand-in server."""
+    parser = argparse.ArgumentParser(
+        prog='python -m auraxium.testing',
+        description='Serve recorded Census API responses locally.')
+    parser.add_argument('fixtures', help='the JSON file of fixtures')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='the delay of every response in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='the maximum additional random delay')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='requests per second before throttling')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='the fraction of requests failing')
+    parser.add_argument('--maintenance', action='store_true',
+                        help='fail all requests with HTTP 503')
+    args = parser.parse_args(argv)
+    simulation = Simulation(args.latency, args.jitter, args.rate_limit,
+                            args.error_rate, args.maintenance)
+    server = CensusServer(Fixtures.load(args.fixtures), simulation,
+                          args.host, args.port)
+    print(f'Serving {args.fixtures} at {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    raise SystemExit(main())
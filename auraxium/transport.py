@@ -0,0 +1,156 @@
+"""HTTP transport used to access the REST API.
+
+A transport wraps a pooled `requests.Session`, allowing connections to
+the Census API to be kept alive between requests. This saves the TCP
+and TLS handshake for every request but the first.
+
+Asynchronous requests are run on a thread pool owned by the transport,
+which keeps the blocking HTTP calls out of the asyncio event loop.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import weakref
+from typing import Any, Callable, Optional, Tuple, TypeVar
+import requests
+from requests.adapters import HTTPAdapter
+from .constants import CENSUS_ENDPOINT
+
+_T = TypeVar('_T')
+
+
+class Transport():
+    """A pooled, keep-alive HTTP session for the REST API.
+
+    Transports may be shared between any number of queries and threads.
+    Unless a query is given its own transport, the process-wide default
+    returned by `get_default_transport()` is used.
+
+    `max_concurrency` caps the number of asynchronous requests in
+    flight at any time; it defaults to the pool size.
+
+    If `base_url` is set, requests for the Census API endpoint are sent
+    to this URL instead, i.e. a local stand-in server.
+    """
+
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 10.0,
+                 read_timeout: float = 30.0, gzip: bool = True,
+                 max_concurrency: Optional[int] = None,
+                 base_url: Optional[str] = None) -> None:
+        """Initializer."""
+        if pool_size < 1:
+            raise ValueError('the pool size must be at least 1')
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError('the concurrency limit must be at least 1')
+        self.pool_size = pool_size
+        self.max_concurrency = (
+            pool_size if max_concurrency is None else max_concurrency)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.base_url = None if base_url is None else base_url.rstrip('/')
+        self.session = requests.Session()
+        # Replace the default adapters to apply the pool size
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+        self.session.headers['Accept-Encoding'] = (
+            'gzip, deflate' if gzip else 'identity')
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Semaphores are bound to an event loop, one is created per loop
+        self._semaphores: weakref.WeakKeyDictionary = (
+            weakref.WeakKeyDictionary())
+
+    def __enter__(self) -> 'Transport':
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """The (connect, read) timeout tuple passed to requests."""
+        return self.connect_timeout, self.read_timeout
+
+    def close(self) -> None:
+        """Close any pooled connections held by this transport."""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.session.close()
+
+    def get(self, url: str, stream: bool = False) -> requests.Response:
+        """Perform a GET request for the given URL.
+
+        If `stream` is set, the response body is not downloaded until
+        it is accessed, and the response must be closed by the caller.
+        """
+        return self.session.get(self.rewrite(url), timeout=self.timeout,
+                                stream=stream)
+
+    async def aget(self, url: str) -> requests.Response:
+        """Perform a GET request without blocking the event loop."""
+        return await self.submit(self.get, url)
+
+    async def submit(self, func: Callable[..., _T], *args: Any) -> _T:
+        """Run a blocking call in this transport's thread pool.
+
+        No more than `max_concurrency` calls will run at the same time,
+        any additional calls wait for a free slot first.
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(
+                self.max_concurrency)
+        async with semaphore:
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    def rewrite(self, url: str) -> str:
+        """Return the URL to request for a query URL.
+
+        This applies the `base_url` override, if any.
+        """
+        if self.base_url is not None and url.startswith(CENSUS_ENDPOINT):
+            return self.base_url + url[len(CENSUS_ENDPOINT):]
+        return url
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Return the thread pool, creating it if required."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix='auraxium')
+            return self._executor
+
+
+_default_transport: Optional[Transport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> Transport:
+    """Return the process-wide default transport.
+
+    The default transport is created on first use.
+    """
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
+
+
+def set_default_transport(transport: Optional[Transport]) -> None:
+    """Replace the process-wide default transport.
+
+    Passing None resets the default, a new transport will be created
+    the next time it is required. The previous transport is not closed.
+    """
+    global _default_transport
+    with _default_lock:
+        _default_transport = transport
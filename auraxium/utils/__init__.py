@@ -1,26 +1,67 @@
 """Helper methods and shortcuts for common Auraxium."""
 
-from typing import Optional
+from typing import Any, Dict, Iterable, List, Optional
+from ..batch import BatchLoader
 from ..query import Query
+from ..transport import Transport
+
+
+async def aname_from_id(collection: str, id_: int,
+                        lang: Optional[str] = None, namespace: str = '',
+                        transport: Optional[Transport] = None) -> str:
+    """Asynchronous version of `name_from_id()`."""
+    query = _name_query(collection, id_, namespace, transport)
+    return _extract_name(await query.aget(), collection, lang)
 
 
 def name_from_id(collection: str, id_: int,
-                 lang: Optional[str] = None, namespace: str = '') -> str:
+                 lang: Optional[str] = None, namespace: str = '',
+                 transport: Optional[Transport] = None) -> str:
     """Shorthand for returning the name of an entry based on its ID.
 
     The collection must use the "<collection>_id" ID field naming
     system and must contain a "name" key. If `lang` is specified, the
     corresponding locale will be assumed to be located therein.
     """
+    query = _name_query(collection, id_, namespace, transport)
+    return _extract_name(query.get(), collection, lang)
+
+
+def names_from_ids(collection: str, ids: Iterable[int],
+                   lang: Optional[str] = None, namespace: str = '',
+                   transport: Optional[Transport] = None
+                   ) -> List[Optional[str]]:
+    """Return the names for multiple entries of the same collection.
+
+    This works like `name_from_id()`, but retrieves the entries in as
+    few requests as possible. Missing entries are returned as None.
+    """
+    ids = list(ids)
+    if any(i <= 0 for i in ids):
+        raise ValueError('An ID must be greater than zero')
+    loader = BatchLoader(collection, namespace=namespace, transport=transport)
+    return [None if r is None else _extract_name([r], collection, lang)
+            for r in loader.load_many(ids)]
+
+
+def _name_query(collection: str, id_: int, namespace: str,
+                transport: Optional[Transport]) -> Query:
+    """Create the query used to look up the name of an entry."""
     # Input validation
     if id_ <= 0:
         raise ValueError('An ID must be greater than zero')
     # Perform a query for the given collection, using "<collection>_id" as the
     # field name
-    query = Query(collection, namespace=namespace)
+    query = Query(collection, namespace=namespace, transport=transport)
     query.add_term(f'{collection}_id', id_)
-    # Perform the query and grab the "name" key.
-    data = query.get()[0]['name']
+    return query
+
+
+def _extract_name(results: List[Dict[str, Any]], collection: str,
+                  lang: Optional[str]) -> str:
+    """Return the name of the first result of a name query."""
+    # Grab the "name" key.
+    data = results[0]['name']
     # If a language subkey has been specified, return it instead
     if lang is not None:
         return str(data[lang])
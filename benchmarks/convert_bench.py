@@ -0,0 +1,59 @@
+"""Benchmark comparing the response conversion implementations.
+
+Requires auraxium to be importable, e.g. run from the repository root:
+
+    PYTHONPATH=. python benchmarks/convert_bench.py
+"""
+
+import random
+import timeit
+from auraxium.census import _convert_dict, convert_response
+
+
+def character_list(rows: int = 5000) -> dict:
+    """Return a synthetic "character_list" response of the given size."""
+    rng = random.Random(0)
+    entries = []
+    for index in range(rows):
+        created = 1350000000 + rng.randrange(200000000)
+        entries.append({
+            'character_id': str(5428010000000000000 + index),
+            'name': {'first': f'Player{index}',
+                     'first_lower': f'player{index}'},
+            'faction_id': str(rng.randint(1, 3)),
+            'head_id': str(rng.randint(1, 8)),
+            'title_id': rng.choice(['0', '12', 'NULL']),
+            'times': {'creation': str(created),
+                      'creation_date': '2013-01-01 00:00:00.0',
+                      'last_save': str(created + 1000),
+                      'last_save_date': '2020-01-01 00:00:00.0',
+                      'login_count': str(rng.randrange(5000)),
+                      'minutes_played': str(rng.randrange(500000))},
+            'certs': {'earned_points': str(rng.randrange(100000)),
+                      'gifted_points': str(rng.randrange(1000)),
+                      'available_points': str(rng.randrange(5000)),
+                      'percent_to_next': f'{rng.random():.6f}'},
+            'battle_rank': {'percent_to_next': str(rng.randrange(100)),
+                            'value': str(rng.randint(1, 120))},
+            'profile_id': str(rng.randint(1, 30)),
+            'daily_ribbon': {'count': '0', 'time': str(created),
+                             'date': '2013-01-01 00:00:00.0'},
+            'prestige_level': '0'})
+    return {'character_list': entries}
+
+
+def main() -> None:
+    data = character_list()
+    assert _convert_dict(data) == convert_response(data)
+    number = 5
+    reference = min(timeit.repeat(lambda: _convert_dict(data),
+                                  number=number, repeat=3)) / number
+    compiled = min(timeit.repeat(lambda: convert_response(data),
+                                 number=number, repeat=3)) / number
+    print(f'_convert_dict:    {reference * 1000:8.2f} ms')
+    print(f'convert_response: {compiled * 1000:8.2f} ms')
+    print(f'speedup:          {reference / compiled:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Regenerate the fixture payloads used by the benchmark suite.
+
+The payloads are deterministic, they only need to be regenerated if
+this script is changed:
+
+    PYTHONPATH=. python benchmarks/make_fixtures.py
+"""
+
+import json
+import os
+import random
+from typing import Any, Dict, List
+from convert_bench import character_list
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+
+# The most common ESS events and their payload fields
+_EVENT_FIELDS = {
+    'Death': ['attacker_character_id', 'attacker_fire_mode_id',
+              'attacker_loadout_id', 'attacker_vehicle_id',
+              'attacker_weapon_id', 'character_id', 'character_loadout_id',
+              'is_critical', 'is_headshot', 'vehicle_id', 'zone_id'],
+    'GainExperience': ['amount', 'character_id', 'experience_id',
+                       'loadout_id', 'other_id', 'zone_id'],
+    'PlayerLogin': ['character_id'],
+    'PlayerLogout': ['character_id'],
+    'FacilityControl': ['duration_held', 'facility_id', 'new_faction_id',
+                        'old_faction_id', 'outfit_id', 'zone_id'],
+    'VehicleDestroy': ['attacker_character_id', 'attacker_loadout_id',
+                       'attacker_vehicle_id', 'attacker_weapon_id',
+                       'character_id', 'facility_id', 'faction_id',
+                       'vehicle_id', 'zone_id'],
+}
+# Relative frequency of the events above
+_EVENT_WEIGHTS = [30, 60, 2, 2, 1, 5]
+
+
+def ess_messages(count: int = 1000) -> List[Dict[str, Any]]:
+    """Return a synthetic stream of ESS messages."""
+    rng = random.Random(0)
+    messages: List[Dict[str, Any]] = []
+    names = list(_EVENT_FIELDS)
+    for index in range(count):
+        if index % 50 == 0:
+            messages.append({'online': {'EventServerEndpoint_Connery_1':
+                                        'true'},
+                             'service': 'event', 'type': 'heartbeat'})
+            continue
+        name = rng.choices(names, _EVENT_WEIGHTS)[0]
+        payload = {'event_name': name,
+                   'timestamp': str(1600000000 + index),
+                   'world_id': str(rng.choice([1, 10, 13, 17, 40]))}
+        for field in _EVENT_FIELDS[name]:
+            if field.endswith('character_id'):
+                value = str(5428010000000000000 + rng.randrange(100000))
+            elif field.startswith('is_'):
+                value = str(rng.randint(0, 1))
+            else:
+                value = str(rng.randrange(1, 100000))
+            payload[field] = value
+        messages.append({'payload': payload, 'service': 'event',
+                         'type': 'serviceMessage'})
+    return messages
+
+
+def main() -> None:
+    os.makedirs(FIXTURES, exist_ok=True)
+    fixtures = {'character_list.json': character_list(500),
+                'ess_messages.json': ess_messages()}
+    for name, data in fixtures.items():
+        with open(os.path.join(FIXTURES, name), 'w') as file_:
+            json.dump(data, file_, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+"""Benchmark suite for the hot paths of auraxium.
+
+Each benchmark is timed using `timeit` over several interleaved
+rounds, the best round is reported as the time per call. Results can be
+saved as a baseline and later runs compared against it. Benchmarks
+slower than the baseline by more than the threshold factor are
+reported, but the run only fails for slowdowns beyond the (larger)
+failure threshold, as small differences are often just noise. Baseline
+timings are scaled by a calibration workload to account for the current
+load of the machine:
+
+    PYTHONPATH=. python benchmarks/suite.py --save benchmarks/baseline.json
+    PYTHONPATH=. python benchmarks/suite.py --compare benchmarks/baseline.json
+
+Timings depend on the machine, a baseline is only meaningful on the
+machine it was recorded on. Use `--filter` to run a subset.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Optional
+import auraxium
+from auraxium.census import _convert_dict, convert_response, generate_term
+from auraxium.ess import Client
+from auraxium.ess.dispatch import TriggerIndex
+from auraxium.ess.event import Event
+from auraxium.ess.trigger import Trigger
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'fixtures')
+
+# Benchmark setup functions by name, each returns the callable to time
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+# Functions releasing the resources of benchmarks after the run
+CLEANUPS: List[Callable[[], None]] = []
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Callable[[], Any]]],
+                                     Callable[[], Callable[[], Any]]]:
+    """Register a benchmark setup function."""
+    def decorator(func: Callable[[], Callable[[], Any]]
+                  ) -> Callable[[], Callable[[], Any]]:
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def load_fixture(name: str) -> Any:
+    """Load a checked-in fixture payload."""
+    with open(os.path.join(FIXTURES, name)) as file_:
+        return json.load(file_)
+
+
+def _deep_query() -> auraxium.Query:
+    """Return a query with a join tree three levels deep."""
+    query = auraxium.Query('character', name__first_lower='^aur', limit=50,
+                           show_fields=['name', 'character_id', 'faction_id'])
+    query.sort('battle_rank.value', descending=True)
+    for outer in ('outfit_member', 'characters_world', 'characters_stat'):
+        join = query.join(outer, on='character_id', is_list=True,
+                          inject_at=outer, show=['character_id', 'rank'])
+        join.add_term('rank_ordinal', 3, auraxium.SearchModifier.LESS_THAN)
+        for inner in ('outfit', 'world'):
+            inner_join = join.join(inner, on=f'{inner}_id',
+                                   inject_at=inner)
+            inner_join.join('faction', on='faction_id',
+                            inject_at='faction').set_show('name', 'code_tag')
+    return query
+
+
+@benchmark('query.url.cached')
+def bench_url_cached() -> Callable[[], Any]:
+    query = _deep_query()
+
+    def run() -> None:
+        for _ in range(1000):
+            query.url()
+    return run
+
+
+@benchmark('query.url.build')
+def bench_url_build() -> Callable[[], Any]:
+    return lambda: _deep_query().url()
+
+
+@benchmark('query.prepared.url')
+def bench_prepared_url() -> Callable[[], Any]:
+    query = auraxium.Query('character',
+                           character_id=auraxium.Parameter('id'))
+    query.join('characters_world').join('world')
+    prepared = query.prepare()
+
+    def run() -> None:
+        for character_id in range(1000):
+            prepared.url(id=character_id)
+    return run
+
+
+@benchmark('census.generate_term')
+def bench_generate_term() -> Callable[[], Any]:
+    rng = random.Random(0)
+    values = [rng.choice(['', '!', '<', '[', '>', ']', '^', '*'])
+              + str(rng.randrange(10 ** 6)) for _ in range(1000)]
+
+    def run() -> None:
+        for value in values:
+            generate_term('field.subfield', value)
+    return run
+
+
+@benchmark('census._convert_dict')
+def bench_convert_dict() -> Callable[[], Any]:
+    data = load_fixture('character_list.json')
+    return lambda: _convert_dict(data)
+
+
+@benchmark('census.convert_response')
+def bench_convert_response() -> Callable[[], Any]:
+    data = load_fixture('character_list.json')
+    return lambda: convert_response(data)
+
+
+@benchmark('ess.Event')
+def bench_event() -> Callable[[], Any]:
+    payloads = [m['payload'] for m in load_fixture('ess_messages.json')
+                if 'payload' in m]
+
+    def run() -> None:
+        for payload in payloads:
+            Event(payload)
+    return run
+
+
+@benchmark('ess.Event.fields')
+def bench_event_fields() -> Callable[[], Any]:
+    events = [Event(m['payload']) for m in load_fixture('ess_messages.json')
+              if 'payload' in m]
+
+    def run() -> None:
+        for event in events:
+            _ = event.event_name, event.world_id, event.timestamp
+    return run
+
+
+def _triggers(count: int) -> List[Trigger]:
+    """Return triggers for random events, characters and worlds.
+
+    Most triggers track a few characters, one percent of them track
+    entire worlds instead.
+    """
+    rng = random.Random(0)
+    events = ['Death', 'GainExperience', 'PlayerLogin', 'PlayerLogout',
+              'FacilityControl', 'VehicleDestroy']
+    triggers: List[Trigger] = []
+    for _ in range(count):
+        characters: List[int] = []
+        if rng.random() >= 0.01:
+            characters = [5428010000000000000 + rng.randrange(100000)
+                          for _ in range(rng.randint(1, 3))]
+        worlds = rng.choice([[], [1], [17], [10, 13]])
+        trigger = Trigger(rng.choice(events), character_ids=characters,
+                          world_ids=worlds)
+        trigger.set_callback(lambda event: None)
+        triggers.append(trigger)
+    return triggers
+
+
+@benchmark('ess.Trigger.evaluate')
+def bench_trigger_evaluate() -> Callable[[], Any]:
+    payloads = [m['payload'] for m in load_fixture('ess_messages.json')
+                if 'payload' in m][:100]
+    triggers = _triggers(1000)
+
+    def run() -> None:
+        for payload in payloads:
+            for trigger in triggers:
+                trigger.evaluate(payload)
+    return run
+
+
+@benchmark('ess.TriggerIndex.match')
+def bench_trigger_index() -> Callable[[], Any]:
+    payloads = [m['payload'] for m in load_fixture('ess_messages.json')
+                if 'payload' in m]
+    index = TriggerIndex()
+    for trigger in _triggers(10000):
+        index.add(trigger)
+
+    def run() -> None:
+        for payload in payloads:
+            index.match(payload)
+    return run
+
+
+def _client_bench(triggers: int) -> Callable[[], Any]:
+    """Return a benchmark processing messages with a number of triggers."""
+    messages = [json.dumps(m) for m in load_fixture('ess_messages.json')]
+    loop = asyncio.new_event_loop()
+    client = Client(loop=loop)
+    for trigger in _triggers(triggers):
+        client._add_trigger(trigger)  # pylint: disable=protected-access
+
+    async def process() -> None:
+        for message in messages:
+            await client._process_response(  # pylint: disable=protected-access
+                message)
+        # Wait for the callbacks to run
+        await client.dispatcher.join()
+
+    def cleanup() -> None:
+        loop.run_until_complete(client.close())
+        loop.close()
+
+    CLEANUPS.append(cleanup)
+    return lambda: loop.run_until_complete(process())
+
+
+@benchmark('ess.Client._process_response')
+def bench_process_response() -> Callable[[], Any]:
+    return _client_bench(100)
+
+
+@benchmark('ess.Client._process_response.10k')
+def bench_process_response_10k() -> Callable[[], Any]:
+    return _client_bench(10000)
+
+
+def _calibrate() -> None:
+    """A fixed pure Python workload used to gauge machine speed."""
+    data = {str(i): [i, str(i), {'value': i}] for i in range(200)}
+    for key, (number, text, nested) in data.items():
+        if int(key) == number and text.isdigit():
+            nested['value'] = number * 2
+
+
+def measure(funcs: Dict[str, Callable[[], Any]],
+            rounds: int = 7) -> Dict[str, float]:
+    """Return the best time per call of each function in seconds.
+
+    The functions are timed in interleaved rounds, so that a temporary
+    slowdown of the machine does not affect only some of them.
+    """
+    timers = {name: timeit.Timer(func) for name, func in funcs.items()}
+    numbers = {name: timer.autorange()[0] for name, timer in timers.items()}
+    best = {name: float('inf') for name in timers}
+    for _ in range(rounds):
+        for name, timer in timers.items():
+            seconds = timer.timeit(numbers[name]) / numbers[name]
+            best[name] = min(best[name], seconds)
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Run the auraxium benchmark suite.')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks containing this string')
+    parser.add_argument('--save', metavar='PATH',
+                        help='write the results to a baseline file')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='compare the results to a baseline file')
+    parser.add_argument('--rounds', type=int, default=7,
+                        help='the number of timing rounds (default: 7)')
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help='the slowdown factor reported as a regression '
+                        '(default: 1.5)')
+    parser.add_argument('--fail-threshold', type=float, default=3.0,
+                        help='the slowdown factor failing the run '
+                        '(default: 3.0)')
+    args = parser.parse_args(argv)
+    baseline: Dict[str, float] = {}
+    if args.compare:
+        with open(args.compare) as file_:
+            baseline = json.load(file_)
+    funcs = {name: setup() for name, setup in BENCHMARKS.items()
+             if args.filter in name}
+    funcs['calibration'] = _calibrate
+    try:
+        results = measure(funcs, args.rounds)
+    finally:
+        for cleanup in CLEANUPS:
+            cleanup()
+    # Scale the baseline by the current speed of the machine to reduce
+    # the effect of unrelated load on the comparison
+    scale = results['calibration'] / baseline.get('calibration',
+                                                  results['calibration'])
+    regressions: List[str] = []
+    failures: List[str] = []
+    for name, seconds in results.items():
+        if name == 'calibration':
+            continue
+        line = f'{name:32} {seconds * 1e6:12.2f} us'
+        if name in baseline:
+            ratio = seconds / (baseline[name] * scale)
+            line += f' {ratio:8.2f}x'
+            if ratio > args.fail_threshold:
+                line += '  FAILURE'
+                failures.append(name)
+            elif ratio > args.threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+    if args.save:
+        with open(args.save, 'w') as file_:
+            json.dump(results, file_, indent=2, sort_keys=True)
+            file_.write('\n')
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) slower than '
+              f'{args.threshold}x the baseline: {", ".join(regressions)}',
+              file=sys.stderr)
+    if failures:
+        print(f'{len(failures)} benchmark(s) slower than '
+              f'{args.fail_threshold}x the baseline: {", ".join(failures)}',
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -20,6 +20,10 @@ setuptools.setup(name='auraxium',
                      'requests >= 2.21.0',
                      'websockets >= 3.1'
                  ],
+                 extras_require={
+                     'fast-json': ['orjson >= 3.0'],
+                     'numpy': ['numpy >= 1.17']
+                 },
                  license='MIT',
                  include_package_data=True,
                  zip_safe=False)
@@ -0,0 +1,52 @@
+"""Test cases for batched ID lookups."""
+
+import asyncio
+import unittest
+import auraxium
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+def _character_transport():
+    """Return a transport serving characters with positive IDs."""
+    fixtures = Fixtures()
+    fixtures.add_collection('character', [
+        {'character_id': str(i), 'name': {'first': f'Char{i}'}}
+        for i in range(1, 10)])
+    return FixtureTransport(fixtures)
+
+
+class TestBatchLoader(unittest.TestCase):
+    """Test cases for the BatchLoader class."""
+
+    def test_load_many(self):
+        """Test whether blocking lookups are batched and ordered."""
+        stub = _character_transport()
+        loader = auraxium.BatchLoader('character', max_batch=2,
+                                      transport=stub)
+        rows = loader.load_many([3, 1, 3, -2])
+        self.assertEqual([r and r['character_id'] for r in rows],
+                         [3, 1, 3, None])
+        # Three distinct IDs with a batch size of two
+        self.assertEqual(len(stub.request_log), 2)
+        self.assertIn('c:limit=2&character_id=3,1', stub.request_log[0])
+
+    def test_aload(self):
+        """Test whether concurrent lookups share a single request."""
+        stub = _character_transport()
+        loader = auraxium.BatchLoader('character', transport=stub)
+
+        async def run():
+            return await asyncio.gather(*(loader.aload(i)
+                                          for i in (1, 2, 3, 2)))
+
+        rows = asyncio.run(run())
+        self.assertEqual([r['character_id'] for r in rows], [1, 2, 3, 2])
+        self.assertEqual(len(stub.request_log), 1)
+
+    def test_names_from_ids(self):
+        """Test the batched name lookup helper."""
+        stub = _character_transport()
+        names = auraxium.utils.names_from_ids('character', [5, 6],
+                                              transport=stub)
+        self.assertEqual(names, ['Char5', 'Char6'])
+        self.assertEqual(len(stub.request_log), 1)
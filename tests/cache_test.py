@@ -0,0 +1,59 @@
+"""Test cases for the response cache."""
+
+import time
+import unittest
+import auraxium
+from auraxium.cache import ResponseCache
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test cases for the ResponseCache class."""
+
+    def test_query_hit(self):
+        """Test whether repeated queries are served from the cache."""
+        cache = ResponseCache()
+        query = auraxium.Query('item', cache=cache)
+        stub = FixtureTransport(Fixtures({query.url(): {
+            'item_list': [{'item_id': '1'}], 'returned': 1}}))
+        query.transport = stub
+        first = query.get()
+        first[0]['item_id'] = 'modified'
+        self.assertEqual(query.get(), [{'item_id': 1}])
+        self.assertEqual(len(stub.request_log), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        """Test whether the entry and byte limits are enforced."""
+        cache = ResponseCache(max_entries=2, max_bytes=100)
+        cache.put('a', 1, 10)
+        cache.put('b', 2, 10)
+        cache.get('a')
+        cache.put('c', 3, 10)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        cache.put('d', 4, 95)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 95)
+
+    def test_ttl(self):
+        """Test per-collection expiry."""
+        cache = ResponseCache(default_ttl=0.01, ttls={'item': None,
+                                                      'character': 0})
+        cache.put('a', 1, 1, collection='item')
+        cache.put('b', 2, 1, collection='world')
+        cache.put('c', 3, 1, collection='character')
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+
+    def test_invalidate(self):
+        """Test invalidation by collection and URL."""
+        cache = ResponseCache()
+        cache.put('a', 1, 1, collection='item')
+        cache.put('b', 2, 1, collection='item')
+        cache.put('c', 3, 1, collection='weapon')
+        self.assertEqual(cache.invalidate(collection='item'), 2)
+        self.assertEqual(cache.invalidate(url='c'), 1)
+        self.assertEqual(len(cache), 0)
@@ -0,0 +1,93 @@
+"""Test cases for column-oriented results."""
+
+import array
+import datetime
+import unittest
+import auraxium
+from auraxium import columnar
+from auraxium.census import _convert_dict
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+ENTRIES = [
+    {'character_id': '5428010618015189713', 'name': {'first': 'Auroram'},
+     'battle_rank': '100', 'kdr': '1.5', 'login': '1577836800',
+     'login_date': '2020-01-01 00:00:00.0', 'title_id': 'NULL'},
+    {'character_id': '5428010618015189714', 'name': {'first': 'Bob'},
+     'battle_rank': '7', 'kdr': '2', 'login': '1577923200',
+     'login_date': '2020-01-02 00:00:00.0', 'title_id': '12'},
+    {'character_id': '5428010618015189715', 'name': {'first': 'NULL'},
+     'kdr': '0.25', 'title_id': 'Hero'},
+]
+
+
+class TestColumns(unittest.TestCase):
+    """Test cases for the to_columns() function."""
+
+    def test_kinds(self):
+        """Test whether the column kinds are inferred correctly."""
+        columns = columnar.to_columns(ENTRIES, use_numpy=False)
+        self.assertEqual(list(columns), ['character_id', 'name.first',
+                                         'battle_rank', 'kdr', 'login',
+                                         'title_id'])
+        kinds = {n: c.kind for n, c in columns.items()}
+        self.assertEqual(kinds, {'character_id': columnar.INTEGER,
+                                 'name.first': columnar.STRING,
+                                 'battle_rank': columnar.INTEGER,
+                                 'kdr': columnar.FLOAT,
+                                 'login': columnar.TIMESTAMP,
+                                 'title_id': columnar.OBJECT})
+        self.assertIsInstance(columns['battle_rank'].values, array.array)
+        self.assertEqual(list(columns['battle_rank'].mask), [0, 0, 1])
+
+    def test_value_kinds(self):
+        """Test whether value kinds match the regular conversion."""
+        kinds = {'12': columnar.INTEGER, '-3': columnar.INTEGER,
+                 '0.25': columnar.FLOAT, '-.5': columnar.FLOAT,
+                 '1e-3': columnar.FLOAT, '1.0': columnar.STRING,
+                 '1e3': columnar.STRING, '1.2.3': columnar.STRING,
+                 '': columnar.STRING, str(2 ** 63): columnar.OBJECT}
+        for value, kind in kinds.items():
+            self.assertEqual(columnar._kind(value), kind, value)
+        self.assertEqual(columnar._infer(['a', 'NULL', 'b']), columnar.STRING)
+        self.assertEqual(columnar._infer(['a', '1']), columnar.OBJECT)
+        self.assertEqual(columnar._infer(['1', '0.5']), columnar.FLOAT)
+
+    def test_conversion(self):
+        """Test whether the values match the regular conversion."""
+        columns = columnar.to_columns(ENTRIES, use_numpy=False)
+        for index, entry in enumerate(ENTRIES):
+            expected = _convert_dict(entry)
+            self.assertEqual(columns['name.first'].to_list()[index],
+                             expected['name']['first'])
+            for name in ('character_id', 'battle_rank', 'kdr', 'login',
+                         'title_id'):
+                self.assertEqual(columns[name].to_list()[index],
+                                 expected.get(name), name)
+        self.assertEqual(columns['login'].to_list()[0],
+                         datetime.datetime(2020, 1, 1))
+
+    @unittest.skipUnless(columnar.numpy_available(), 'NumPy not installed')
+    def test_numpy(self):
+        """Test whether NumPy arrays are created if available."""
+        columns = columnar.to_columns(ENTRIES, use_numpy=True)
+        self.assertEqual(str(columns['kdr'].values.dtype), 'float64')
+        self.assertEqual(str(columns['login'].values.dtype), 'datetime64[s]')
+        self.assertEqual(columns['kdr'].values.sum(), 3.75)
+        self.assertEqual(columns['login'].to_list(),
+                         columnar.to_columns(ENTRIES,
+                                             use_numpy=False)['login']
+                         .to_list())
+
+    def test_get_columns(self):
+        """Test the Query.get_columns() method."""
+        query = auraxium.Query('character')
+        fixtures = Fixtures({query.url(): {'character_list': ENTRIES,
+                                           'returned': 3}})
+        query.transport = FixtureTransport(fixtures)
+        columns = query.get_columns(use_numpy=False)
+        self.assertEqual(columns['battle_rank'].to_list(), [100, 7, None])
+
+
+if __name__ == '__main__':
+    unittest.main()
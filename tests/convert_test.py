@@ -0,0 +1,71 @@
+"""Test cases for the conversion of response data."""
+
+import datetime
+import unittest
+import auraxium
+from auraxium import Row
+from auraxium.census import _convert_dict, convert_response
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+class TestConversion(unittest.TestCase):
+    """Test cases comparing the compiled and reference converters."""
+
+    DATA = {'item_list': [
+        {'item_id': '1', 'name': {'en': 'Orion'}, 'max_stack_size': 'NULL',
+         'rate': '0.25', 'ratio': '1.0', 'created': '1500000000',
+         'created_date': '2017-07-14 02:40:00.0'},
+        {'item_id': '-2', 'name': {'en': '12'}, 'max_stack_size': '3',
+         'rate': 'NULL', 'ratio': '2.5', 'created': 'NULL',
+         'created_date': 'NULL'}]}
+
+    def test_values(self):
+        """Test the converted values of a single entry."""
+        item = convert_response(self.DATA)['item_list'][0]
+        self.assertEqual(item['item_id'], 1)
+        self.assertIsNone(item['max_stack_size'])
+        self.assertEqual(item['rate'], 0.25)
+        self.assertEqual(item['created'],
+                         datetime.datetime.utcfromtimestamp(1500000000))
+        self.assertNotIn('created_date', item)
+
+    def test_reference(self):
+        """Test whether both converters agree across repeated rows."""
+        for _ in range(3):
+            self.assertEqual(convert_response(self.DATA),
+                             _convert_dict(self.DATA))
+        self.assertEqual(convert_response(self.DATA, human_date=True),
+                         _convert_dict(self.DATA, human_date=True))
+
+
+class TestRow(unittest.TestCase):
+    """Test cases for lazily converted rows."""
+
+    def test_lazy_access(self):
+        """Test whether fields are converted on access and memoized."""
+        raw = TestConversion.DATA['item_list'][0]
+        row = Row(raw)
+        self.assertEqual(row['item_id'], 1)
+        self.assertEqual(row.name.en, 'Orion')
+        self.assertIs(row.name, row['name'])
+        self.assertIsNone(row.max_stack_size)
+        self.assertNotIn('created_date', row)
+        with self.assertRaises(AttributeError):
+            _ = row.missing
+
+    def test_equivalence(self):
+        """Test whether a row matches the eagerly converted entry."""
+        raw = TestConversion.DATA['item_list'][1]
+        self.assertEqual(Row(raw).to_dict(), _convert_dict(raw))
+        self.assertEqual(dict(Row(raw)).keys(), _convert_dict(raw).keys())
+
+    def test_get_rows(self):
+        """Test whether rows are only returned when requested."""
+        query = auraxium.Query('item', limit=10)
+        query.transport = FixtureTransport(
+            Fixtures({query.url(): TestConversion.DATA}))
+        self.assertIsInstance(query.get()[0], dict)
+        rows = query.get_rows()
+        self.assertIsInstance(rows[0], Row)
+        self.assertEqual([r.to_dict() for r in rows], query.get())
+        self.assertEqual([r.item_id for r in query.iter_rows()], [1, -2])
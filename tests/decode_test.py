@@ -0,0 +1,78 @@
+"""Test cases for JSON decoding and streamed responses."""
+
+import json
+import unittest
+import auraxium
+from auraxium import decode
+from auraxium.exceptions import UnknownCollectionError
+
+
+class _StreamedResponse():
+    """Stand-in for a streamed requests response."""
+
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for offset in range(0, len(self.body), 7):
+            yield self.body[offset:offset + 7]
+
+    def raise_for_status(self):
+        pass
+
+
+class _StreamTransport(auraxium.Transport):
+    """Transport returning a fixed body in small chunks."""
+
+    def __init__(self, data):
+        super().__init__(pool_size=1)
+        self.body = json.dumps(data).encode()
+
+    def get(self, url, stream=False):
+        return _StreamedResponse(self.body)
+
+
+class TestDecode(unittest.TestCase):
+    """Test cases for the decoding helpers."""
+
+    DATA = {'item_list': [{'item_id': str(i), 'name': {'en': f'Item {i}'}}
+                          for i in range(20)],
+            'returned': 20}
+
+    def test_backends(self):
+        """Test selecting the JSON backend."""
+        previous = decode.get_backend()
+        self.assertIn('json', decode.available_backends())
+        try:
+            decode.set_backend('json')
+            self.assertEqual(decode.loads(b'{"a": [1]}'), {'a': [1]})
+        finally:
+            decode.set_backend(previous)
+        with self.assertRaises(ValueError):
+            decode.set_backend('missing')
+
+    def test_list_stream(self):
+        """Test whether split bodies are decoded entry by entry."""
+        body = json.dumps(self.DATA).encode()
+        stream = decode.ListStream(body[i:i + 3]
+                                   for i in range(0, len(body), 3))
+        self.assertEqual(list(stream), self.DATA['item_list'])
+        self.assertEqual(stream.key, 'item_list')
+        self.assertEqual(stream.remainder, {'returned': 20})
+
+    def test_iter_results(self):
+        """Test streamed query results."""
+        query = auraxium.Query('item', transport=_StreamTransport(self.DATA))
+        results = list(query.iter_results())
+        self.assertEqual([r['item_id'] for r in results], list(range(20)))
+
+    def test_iter_results_error(self):
+        """Test whether server errors are raised for streamed results."""
+        stub = _StreamTransport({'error': 'No data found.'})
+        with self.assertRaises(UnknownCollectionError):
+            list(auraxium.Query('dummy', transport=stub).iter_results())
@@ -0,0 +1,554 @@
+"""Test cases for the ESS trigger dispatch."""
+
+import asyncio
+import datetime
+import json
+import pickle
+import random
+import unittest
+import websockets
+from auraxium.ess import Client, Supervisor
+from auraxium.ess.constants import COALESCE, DROP_OLDEST, SHARD_BY_WORLD
+from auraxium.ess.event import Death, Event
+from auraxium.ess.pipeline import Dispatcher
+from auraxium.ess.supervisor import _LocalLink, _Shard
+from auraxium.ess.dispatch import TriggerIndex
+from auraxium.ess.trigger import Trigger
+
+EVENTS = ['Death', 'PlayerLogin', 'FacilityControl']
+
+
+def _payload(rng: random.Random):
+    """Return a random event payload."""
+    name = rng.choice(EVENTS)
+    payload = {'event_name': name, 'timestamp': '1600000000',
+               'world_id': str(rng.choice([1, 10, 17]))}
+    if name != 'FacilityControl':
+        payload['character_id'] = str(rng.randrange(20))
+    if name == 'Death':
+        payload['attacker_character_id'] = str(rng.randrange(20))
+    if rng.random() < 0.2:
+        del payload['world_id']
+    return payload
+
+
+def _trigger(rng: random.Random):
+    """Return a random trigger."""
+    return Trigger(*rng.sample(EVENTS, rng.randint(1, 2)),
+                   character_ids=rng.sample(range(20), rng.randrange(3)),
+                   world_ids=rng.choice([[], [1], [10, 17], ['all']]))
+
+
+class TestTriggerIndex(unittest.TestCase):
+    """Test cases for the TriggerIndex class."""
+
+    def test_match(self):
+        """Test whether the index agrees with evaluating triggers."""
+        rng = random.Random(0)
+        triggers = [_trigger(rng) for _ in range(200)]
+        index = TriggerIndex()
+        for trigger in triggers:
+            index.add(trigger)
+        for trigger in triggers[::3]:
+            index.remove(trigger)
+        remaining = [t for t in triggers if t in index]
+        self.assertEqual(len(index), len(remaining))
+        for _ in range(500):
+            payload = _payload(rng)
+            self.assertEqual(index.match(payload),
+                             [t for t in remaining if t.evaluate(payload)])
+
+    def test_remove(self):
+        """Test whether removing unknown triggers fails."""
+        index = TriggerIndex()
+        trigger = Trigger('PlayerLogin', character_ids=[1])
+        index.add(trigger)
+        index.remove(trigger)
+        with self.assertRaises(ValueError):
+            index.remove(trigger)
+        self.assertEqual(index.match({'event_name': 'PlayerLogin',
+                                      'character_id': '1'}), [])
+
+
+class TestEvent(unittest.TestCase):
+    """Test cases for the Event class."""
+
+    def test_typed(self):
+        """Test whether known events use their typed layout."""
+        payload = {'event_name': 'Death', 'timestamp': '1600000000',
+                   'world_id': '1', 'character_id': '5428010618015189713',
+                   'is_headshot': '1', 'is_critical': '0',
+                   'attacker_weapon_id': '7214'}
+        event = Event(payload)
+        self.assertIsInstance(event, Death)
+        self.assertIs(event.raw, payload)
+        self.assertEqual(event.character_id, 5428010618015189713)
+        self.assertIs(event.is_headshot, True)
+        self.assertIs(event.is_critical, False)
+        self.assertIsNone(event.vehicle_id)
+        self.assertEqual(event.timestamp,
+                         datetime.datetime(2020, 9, 13, 12, 26, 40))
+        with self.assertRaises(AttributeError):
+            event.extra = 1
+        self.assertEqual(pickle.loads(pickle.dumps(event)).raw, payload)
+
+    def test_unset(self):
+        """Test whether empty and NULL values of typed fields are None."""
+        event = Event({'event_name': 'Death', 'timestamp': '',
+                       'attacker_vehicle_id': '', 'vehicle_id': 'NULL',
+                       'attacker_weapon_id': '0'})
+        self.assertIsNone(event.timestamp)
+        self.assertIsNone(event.attacker_vehicle_id)
+        self.assertIsNone(event.vehicle_id)
+        self.assertEqual(event.attacker_weapon_id, 0)
+        self.assertIsNone(event.payload['vehicle_id'])
+
+    def test_untyped(self):
+        """Test whether other events convert their fields on access."""
+        event = Event({'event_name': 'ContinentLock', 'world_id': '10',
+                       'timestamp': '1600000000', 'nc_population': '33.5',
+                       'metagame_event_state_name': 'started'})
+        self.assertIs(type(event), Event)
+        self.assertEqual(event.nc_population, 33.5)
+        self.assertEqual(event.payload['world_id'], 10)
+        self.assertEqual(event.payload['metagame_event_state_name'],
+                         'started')
+        with self.assertRaises(AttributeError):
+            _ = event.zone_id
+
+
+class TestClient(unittest.TestCase):
+    """Test cases for dispatching events in the client."""
+
+    def test_dispatch(self):
+        """Test whether matching callbacks run and single shots expire."""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        client = Client(loop=loop)
+        received = []
+        repeating = Trigger('Death', character_ids=[2])
+        repeating.set_callback(lambda e: received.append('repeating'))
+        single = Trigger('Death', world_ids=[1], single_shot=True)
+        single.set_callback(lambda e: received.append('single'))
+        client._add_trigger(repeating)
+        client._add_trigger(single)
+        message = {'service': 'event', 'type': 'serviceMessage',
+                   'payload': {'event_name': 'Death', 'world_id': '1',
+                               'timestamp': '1600000000',
+                               'character_id': '1',
+                               'attacker_character_id': '2'}}
+
+        async def process():
+            for _ in range(2):
+                await client._process_response(json.dumps(message))
+            await client.dispatcher.join()
+
+        loop.run_until_complete(process())
+        self.assertEqual(sorted(received), ['repeating', 'repeating',
+                                            'single'])
+        self.assertEqual(client.dispatcher.stats().delivered, 3)
+        # Closing the client stops the workers
+        loop.run_until_complete(client.close())
+        self.assertTrue(client.dispatcher.closed)
+        self.assertEqual(client.dispatcher._tasks, [])
+
+    def test_concurrent_single_shot(self):
+        """Test whether single shots fire once for concurrent events."""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        client = Client(loop=loop)
+        received = []
+        gate = asyncio.Event()
+        blocking = Trigger('Death', queue_size=1)
+        single = Trigger('Death', single_shot=True)
+        single.set_callback(lambda e: received.append('single'))
+
+        @blocking.set_callback
+        async def callback(event):
+            await gate.wait()
+            received.append('blocking')
+
+        client._add_trigger(blocking)
+        client._add_trigger(single)
+        payload = {'event_name': 'Death', 'world_id': '1',
+                   'timestamp': '1600000000', 'character_id': '1'}
+
+        async def process():
+            # Fill the queue of the first trigger, so that both events
+            # wait for it before reaching the single shot
+            await client.dispatcher.put(blocking, Event(payload))
+            await asyncio.sleep(0)
+            await client.dispatcher.put(blocking, Event(payload))
+            tasks = asyncio.gather(client._process_event(payload),
+                                   client._process_event(payload))
+            await asyncio.sleep(0.01)
+            gate.set()
+            await tasks
+            await client.dispatcher.join()
+            await client.close()
+
+        loop.run_until_complete(process())
+        self.assertEqual(received.count('blocking'), 4)
+        self.assertEqual(received.count('single'), 1)
+        self.assertNotIn(single, client._triggers)
+
+
+def _event(index, character_id=1):
+    """Return a login event."""
+    return Event({'event_name': 'PlayerLogin', 'world_id': '1',
+                  'timestamp': str(1600000000 + index),
+                  'character_id': str(character_id)})
+
+
+class TestDispatcher(unittest.TestCase):
+    """Test cases for the bounded dispatch pipeline."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def _run(self, dispatcher, trigger, events, gate=None):
+        """Queue events while the callback waits for a gate."""
+        received = []
+
+        @trigger.set_callback
+        async def callback(event):
+            if gate is not None:
+                await gate.wait()
+            received.append(int(event.raw['timestamp']) - 1600000000)
+
+        async def run():
+            for event in events:
+                await dispatcher.put(trigger, event)
+            if gate is not None:
+                gate.set()
+            await dispatcher.join()
+            await dispatcher.close()
+
+        self.loop.run_until_complete(run())
+        return received
+
+    def test_order(self):
+        """Test whether events of a trigger are delivered in order."""
+        dispatcher = Dispatcher(self.loop, workers=4)
+        received = self._run(dispatcher, Trigger('PlayerLogin'),
+                             [_event(i) for i in range(20)])
+        self.assertEqual(received, list(range(20)))
+        self.assertEqual(dispatcher.stats().delivered, 20)
+        self.assertEqual(dispatcher.stats().depth, 0)
+
+    def test_block(self):
+        """Test whether a full queue blocks the producer."""
+        dispatcher = Dispatcher(self.loop, queue_size=2)
+        trigger = Trigger('PlayerLogin')
+        gate = asyncio.Event()
+
+        @trigger.set_callback
+        async def callback(event):
+            await gate.wait()
+
+        async def run():
+            for index in range(3):
+                await dispatcher.put(trigger, _event(index))
+            blocked = self.loop.create_task(dispatcher.put(trigger,
+                                                           _event(3)))
+            await asyncio.sleep(0.01)
+            self.assertFalse(blocked.done())
+            self.assertEqual(dispatcher.stats(trigger).depth, 2)
+            gate.set()
+            await blocked
+            await dispatcher.join()
+            await dispatcher.close()
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(dispatcher.stats(trigger).delivered, 4)
+        self.assertEqual(dispatcher.stats(trigger).dropped, 0)
+
+    def test_close_blocked(self):
+        """Test whether producers blocked on close do not restart workers."""
+        dispatcher = Dispatcher(self.loop, queue_size=1)
+        trigger = Trigger('PlayerLogin')
+        gate = asyncio.Event()
+
+        @trigger.set_callback
+        async def callback(event):
+            await gate.wait()
+
+        async def run():
+            for index in range(2):
+                await dispatcher.put(trigger, _event(index))
+            blocked = self.loop.create_task(dispatcher.put(trigger,
+                                                           _event(2)))
+            await asyncio.sleep(0.01)
+            await dispatcher.close()
+            await blocked
+            await dispatcher.put(trigger, _event(3))
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(dispatcher._tasks, [])
+        self.assertEqual(dispatcher._unfinished, 0)
+        self.assertEqual(dispatcher.stats(trigger).depth, 0)
+
+    def test_drop_oldest(self):
+        """Test whether full queues drop their oldest events."""
+        dispatcher = Dispatcher(self.loop, queue_size=3,
+                                overflow=DROP_OLDEST)
+        received = self._run(dispatcher, Trigger('PlayerLogin'),
+                             [_event(i) for i in range(10)], asyncio.Event())
+        # The workers only start once the producer yields
+        self.assertEqual(received, [7, 8, 9])
+        self.assertEqual(dispatcher.stats().dropped, 7)
+
+    def test_coalesce(self):
+        """Test whether full queues replace events with the same key."""
+        dispatcher = Dispatcher(self.loop, queue_size=2)
+        trigger = Trigger('PlayerLogin', overflow=COALESCE)
+        events = [_event(i, character_id=i % 2) for i in range(7)]
+        received = self._run(dispatcher, trigger, events, asyncio.Event())
+        self.assertEqual(received, [6, 5])
+        stats = dispatcher.stats()
+        self.assertEqual((stats.coalesced, stats.dropped), (5, 0))
+        self.assertIn('auraxium_ess_events_coalesced_total 5',
+                      dispatcher.export_prometheus())
+
+    def test_failure(self):
+        """Test whether failing callbacks are counted."""
+        dispatcher = Dispatcher(self.loop)
+        trigger = Trigger('PlayerLogin')
+        trigger.set_callback(lambda e: 1 / 0)
+
+        async def run():
+            await dispatcher.put(trigger, _event(0))
+            await dispatcher.join()
+            await dispatcher.close()
+
+        with self.assertLogs('auraxium', 'ERROR'):
+            self.loop.run_until_complete(run())
+        self.assertEqual(dispatcher.stats().failed, 1)
+
+
+
+class TestConnection(unittest.TestCase):
+    """Test cases for the client's connection handling."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.received = []
+        self.subscriptions = []
+        self.connections = 0
+
+    async def _handler(self, websocket, *args):
+        """Serve a connection of the stand-in ESS."""
+        self.connections += 1
+        message = json.loads(await websocket.recv())
+        self.subscriptions.append(message['eventNames'])
+        if self.connections == 3:
+            # Go silent to trigger the heartbeat timeout
+            await websocket.wait_closed()
+            return
+        payload = {'event_name': 'PlayerLogin', 'world_id': '1',
+                   'character_id': '1', 'timestamp': str(self.connections)}
+        await websocket.send(json.dumps({'payload': payload,
+                                         'service': 'event',
+                                         'type': 'serviceMessage'}))
+        if self.connections > 3:
+            await websocket.wait_closed()
+        # Drop the connection after a single event
+
+    def test_close_during_backoff(self):
+        """Test whether closing the client interrupts the backoff delay."""
+        client = Client(loop=self.loop, backoff=30.0)
+
+        async def run():
+            # Nothing is listening on this port
+            server = await asyncio.start_server(lambda r, w: None,
+                                                '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            server.close()
+            await server.wait_closed()
+            task = self.loop.create_task(client.connect(
+                endpoint=f'ws://127.0.0.1:{port}'))
+            await asyncio.sleep(0.1)
+            await client.close()
+            await asyncio.wait_for(task, 1.0)
+
+        with self.assertLogs('auraxium', 'WARNING'):
+            self.loop.run_until_complete(run())
+
+    def test_reconnect(self):
+        """Test whether connections are re-established and resubscribed."""
+        client = Client(loop=self.loop, heartbeat_timeout=0.2, backoff=0.01)
+        trigger = Trigger('PlayerLogin')
+        trigger.set_callback(lambda e: self.received.append(e.raw))
+        client._add_trigger(trigger)
+
+        async def run():
+            server = await websockets.serve(self._handler, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            task = self.loop.create_task(client.connect(
+                endpoint=f'ws://127.0.0.1:{port}'))
+            for _ in range(200):
+                if len(self.received) >= 3:
+                    break
+                await asyncio.sleep(0.01)
+            await client.close()
+            await asyncio.wait_for(task, 1.0)
+            server.close()
+            await server.wait_closed()
+
+        with self.assertLogs('auraxium', 'WARNING'):
+            self.loop.run_until_complete(run())
+        self.assertEqual([e['timestamp'] for e in self.received],
+                         ['1', '2', '4'])
+        self.assertEqual(self.subscriptions, [['PlayerLogin']] * 4)
+
+
+
+class TestSupervisor(unittest.TestCase):
+    """Test cases for the sharded ESS supervisor."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.connections = 0
+
+    def test_split_event(self):
+        """Test whether event names are distributed across shards."""
+        supervisor = Supervisor(shards=2, loop=self.loop)
+        first = supervisor.split(Trigger('Death', 'GainExperience',
+                                         world_ids=[1]))
+        self.assertEqual(
+            {k: json.loads(v)['eventNames'] for k, v in first.items()},
+            {0: ['Death'], 1: ['GainExperience']})
+        self.assertEqual(json.loads(first[0])['worlds'], ['1'])
+        second = supervisor.split(Trigger('Death', character_ids=[5]))
+        self.assertEqual(list(second), [0])
+
+    def test_split_event_filters(self):
+        """Test whether world filters do not restrict other triggers."""
+        supervisor = Supervisor(shards=2, loop=self.loop)
+        supervisor._add_trigger(Trigger('Death', character_ids=[5],
+                                        world_ids=[1]))
+        supervisor._add_trigger(Trigger('Death', character_ids=[9]))
+        messages = [json.loads(m) for m in supervisor._shard_messages(0)]
+        self.assertEqual([m['characters'] for m in messages], [['5'], ['9']])
+        # The flag would also restrict character 9 to world 1
+        self.assertFalse(any('logicalAndCharactersWithWorlds' in m
+                             for m in messages))
+        self.assertEqual(supervisor._shard_messages(1), [])
+
+    def test_split_world(self):
+        """Test whether worlds are distributed across shards."""
+        supervisor = Supervisor(shards=2, by=SHARD_BY_WORLD, loop=self.loop,
+                                worlds=[1, 10, 13, 17])
+        messages = supervisor.split(Trigger('Death', character_ids=[5]))
+        self.assertEqual(
+            {k: json.loads(v)['worlds'] for k, v in messages.items()},
+            {0: ['1', '13'], 1: ['10', '17']})
+        self.assertTrue(json.loads(messages[0])[
+            'logicalAndCharactersWithWorlds'])
+        messages = supervisor.split(Trigger('Death', world_ids=[17]))
+        self.assertEqual(list(messages), [1])
+
+    def test_single_shot(self):
+        """Test whether expired triggers are not subscribed again."""
+        supervisor = Supervisor(shards=2, loop=self.loop)
+        repeating = Trigger('Death', character_ids=[5])
+        single = Trigger('Death', character_ids=[9], single_shot=True)
+        for trigger in (repeating, single):
+            trigger.set_callback(lambda e: None)
+            supervisor._add_trigger(trigger)
+        self.assertEqual(len(supervisor._shard_messages(0)), 2)
+        payload = {'event_name': 'Death', 'world_id': '1',
+                   'timestamp': '1600000000', 'character_id': '9'}
+
+        async def run():
+            await supervisor._process_event(payload)
+            await supervisor.close()
+
+        self.loop.run_until_complete(run())
+        messages = supervisor._shard_messages(0)
+        self.assertEqual([json.loads(m)['characters'] for m in messages],
+                         [['5']])
+        link = _LocalLink(supervisor, 0)
+        self.assertEqual(link.shard._subscriptions(), messages)
+
+    async def _handler(self, websocket, *args):
+        """Send an event for each subscribed event name."""
+        self.connections += 1
+        message = json.loads(await websocket.recv())
+        for name in message['eventNames']:
+            payload = {'event_name': name, 'world_id': '1',
+                       'timestamp': '1600000000', 'character_id': '1'}
+            await websocket.send(json.dumps({'payload': payload,
+                                             'service': 'event',
+                                             'type': 'serviceMessage'}))
+        await websocket.wait_closed()
+
+    def _run(self, supervisor):
+        """Return the event names received by the supervisor."""
+        received = []
+        for name in ('Death', 'GainExperience'):
+            trigger = Trigger(name)
+            trigger.set_callback(lambda e: received.append(e.event_name))
+            supervisor._add_trigger(trigger)
+
+        async def run():
+            server = await websockets.serve(self._handler, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            task = self.loop.create_task(supervisor.connect(
+                endpoint=f'ws://127.0.0.1:{port}'))
+            for _ in range(1000):
+                if len(received) >= 2:
+                    break
+                await asyncio.sleep(0.01)
+            await supervisor.close()
+            await asyncio.wait_for(task, 10.0)
+            server.close()
+            await server.wait_closed()
+
+        self.loop.run_until_complete(run())
+        # Every shard has its own connection
+        self.assertEqual(self.connections, 2)
+        return sorted(received)
+
+    def test_clear_subscriptions(self):
+        """Test whether discarded subscriptions are cleared if unused."""
+        shard = _Shard(None, self.loop)
+        deaths = Trigger('Death', character_ids=[5]).generate_subscription()
+        logins = Trigger('PlayerLogin', character_ids=[5, 6],
+                         world_ids=['all']).generate_subscription()
+        for message in (deaths, logins, deaths):
+            shard.subscribe(message)
+        # Clear messages are only sent on an open connection
+        shard._websocket = object()
+        shard._send_queue = asyncio.Queue()
+        shard.discard(deaths)
+        self.assertTrue(shard._send_queue.empty())
+        shard.discard(logins)
+        self.assertEqual(
+            [json.loads(shard._send_queue.get_nowait()) for _ in range(2)],
+            [{'action': 'clearSubscribe', 'all': 'true', 'service': 'event'},
+             json.loads(deaths)])
+        shard.subscribe(logins)
+        shard._send_queue.get_nowait()
+        shard.discard(deaths)
+        self.assertEqual(json.loads(shard._send_queue.get_nowait()),
+                         {'action': 'clearSubscribe',
+                          'eventNames': ['Death'], 'service': 'event'})
+        self.assertEqual(shard._subscriptions(), [logins])
+
+    def test_local(self):
+        """Test whether shards on the event loop deliver events."""
+        supervisor = Supervisor(shards=2, loop=self.loop)
+        self.assertEqual(self._run(supervisor), ['Death', 'GainExperience'])
+
+    def test_processes(self):
+        """Test whether shards in worker processes deliver events."""
+        supervisor = Supervisor(shards=2, processes=True, loop=self.loop)
+        self.assertEqual(self._run(supervisor), ['Death', 'GainExperience'])
+
+
+if __name__ == '__main__':
+    unittest.main()
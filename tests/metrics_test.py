@@ -0,0 +1,64 @@
+"""Test cases for request instrumentation."""
+
+import unittest
+import auraxium
+from auraxium import metrics
+from auraxium.cache import ResponseCache
+from auraxium.testing import Fixtures, FixtureTransport, Simulation
+
+
+def _transport():
+    """Return a transport serving worlds including server timing."""
+    fixtures = Fixtures({auraxium.Query('world').url(): {
+        'world_list': [{'world_id': '1'}], 'returned': 1,
+        'timing': {'world-ms': 3}}})
+    return FixtureTransport(fixtures, Simulation(latency=0.005))
+
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for the metrics listeners and collector."""
+
+    def setUp(self):
+        self.received = []
+        metrics.add_listener(self.received.append)
+
+    def tearDown(self):
+        metrics.remove_listener(self.received.append)
+
+    def test_listener(self):
+        """Test whether listeners receive the request metrics."""
+        cache = ResponseCache()
+        query = auraxium.Query('world', transport=_transport(),
+                               cache=cache)
+        query.get()
+        query.get()
+        first, second = self.received
+        self.assertEqual(first.collection, 'world')
+        self.assertEqual(first.status, 200)
+        self.assertEqual(first.ttfb, 0.005)
+        self.assertEqual(first.server_timing, {'world-ms': 3})
+        self.assertFalse(first.cache_hit)
+        self.assertGreater(first.size, 0)
+        self.assertTrue(second.cache_hit)
+        self.assertIsNone(second.ttfb)
+
+    def test_prometheus_export(self):
+        """Test the aggregated Prometheus output."""
+        collector = metrics.MetricsCollector(buckets=(0.1, 1.0))
+        metrics.add_listener(collector)
+        try:
+            auraxium.Query('world', transport=_transport()).get()
+        finally:
+            metrics.remove_listener(collector)
+        text = collector.export_prometheus()
+        self.assertIn('auraxium_requests_total{collection="world",'
+                      'status="200"} 1', text)
+        self.assertIn('auraxium_request_duration_seconds_bucket{'
+                      'collection="world",le="+Inf"} 1', text)
+        self.assertIn('auraxium_request_phase_seconds_count{'
+                      'collection="world",phase="ttfb"} 1', text)
+
+    def test_label_escaping(self):
+        """Test whether label values are escaped for the text format."""
+        self.assertEqual(metrics._labels(collection='a"b\\c\nd'),
+                         '{collection="a\\"b\\\\c\\nd"}')
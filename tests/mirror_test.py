@@ -0,0 +1,178 @@
+"""Test cases for client-side joins."""
+
+import unittest
+import auraxium
+from auraxium.mirror import Mirror
+from auraxium.snapshot import SnapshotStore
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+def _item_transport():
+    """Return a transport serving a fixed list of items."""
+    fixtures = Fixtures()
+    fixtures.add_collection('item', [
+        {'item_id': '1', 'name': {'en': 'Orion'}},
+        {'item_id': '2', 'name': {'en': 'Gauss'}},
+        {'item_id': '3', 'name': {'en': 'Helmet'}}])
+    return FixtureTransport(fixtures)
+
+
+def _mirror():
+    """Return a mirror of the weapon collections."""
+    mirror = Mirror()
+    mirror.add('item_to_weapon', [{'item_id': '1', 'weapon_id': '10'},
+                                  {'item_id': '2', 'weapon_id': '20'}])
+    mirror.add('weapon', [{'weapon_id': '10', 'turn_modifier': '1'},
+                          {'weapon_id': '20', 'turn_modifier': '0.5'}])
+    mirror.add('item_attachment', [
+        {'item_id': '1', 'attachment_item_id': '4', 'slot': '1'},
+        {'item_id': '1', 'attachment_item_id': '5', 'slot': '2'}])
+    return mirror
+
+
+class TestMirror(unittest.TestCase):
+    """Test cases for the Mirror class."""
+
+    def test_nested_join(self):
+        """Test whether nested joins are resolved locally."""
+        stub = _item_transport()
+        query = auraxium.Query('item', limit=10, transport=stub)
+        query.join('item_to_weapon', on='item_id').join(
+            'weapon', on='weapon_id', inject_at='weapon')
+        results = _mirror().get(query)
+        self.assertNotIn('c:join', stub.request_log[0])
+        self.assertEqual(results[0]['item_id_join_item_to_weapon'],
+                         {'item_id': 1, 'weapon_id': 10,
+                          'weapon': {'weapon_id': 10, 'turn_modifier': 1}})
+        self.assertEqual(results[1]['item_id_join_item_to_weapon']['weapon'],
+                         {'weapon_id': 20, 'turn_modifier': 0.5})
+        self.assertNotIn('item_id_join_item_to_weapon', results[2])
+
+    def test_nested_join_show(self):
+        """Test whether nested joins use fields their parent omits."""
+        query = auraxium.Query('item', limit=10, transport=_item_transport())
+        join = query.join('item_to_weapon', on='item_id', inject_at='link')
+        join.set_show('item_id')
+        join.join('weapon', on='weapon_id', inject_at='weapon')
+        results = _mirror().get(query)
+        self.assertEqual(results[0]['link'],
+                         {'item_id': 1,
+                          'weapon': {'weapon_id': 10, 'turn_modifier': 1}})
+        join.set_hide('weapon_id')
+        join.set_show()
+        self.assertEqual(_mirror().get(query)[1]['link'],
+                         {'item_id': 2,
+                          'weapon': {'weapon_id': 20, 'turn_modifier': 0.5}})
+
+    def test_join_options(self):
+        """Test lists, inner joins, terms and field lists."""
+        query = auraxium.Query('item', limit=10, transport=_item_transport())
+        join = query.join('item_attachment', on='item_id', is_list=True,
+                          is_outer=False, inject_at='attachments')
+        join.set_show('attachment_item_id')
+        results = _mirror().get(query, convert=False)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['attachments'],
+                         [{'attachment_item_id': '4'},
+                          {'attachment_item_id': '5'}])
+        join.add_term('slot', 1, auraxium.SearchModifier.GREATER_THAN)
+        results = _mirror().get(query, convert=False)
+        self.assertEqual(results[0]['attachments'],
+                         [{'attachment_item_id': '5'}])
+
+    def test_show_fields(self):
+        """Test whether join fields omitted by c:show are retrieved."""
+        stub = _item_transport()
+        query = auraxium.Query('item', limit=10, show_fields=['name'],
+                               transport=stub)
+        query.join('item_attachment', on='item_id', is_list=True,
+                   is_outer=False, inject_at='attachments')
+        results = _mirror().get(query)
+        self.assertIn('c:show=item_id,name', stub.request_log[0])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(set(results[0]), {'name', 'attachments'})
+        self.assertEqual(len(results[0]['attachments']), 2)
+        # The original query is not modified
+        self.assertEqual(query.show_fields, ['name'])
+
+    def test_remote_fallback(self):
+        """Test whether joins of other collections stay server-side."""
+        stub = _item_transport()
+        query = auraxium.Query('item', transport=stub)
+        query.join('item_to_weapon', on='item_id').join('fire_group')
+        query.join('weapon_datasheet', on='item_id')
+        _mirror().get(query)
+        self.assertIn('c:join=item_to_weapon^on:item_id(fire_group),'
+                      'weapon_datasheet^on:item_id', stub.request_log[0])
+        # The original query is not modified
+        self.assertEqual(len(query.joins), 2)
+
+    def test_snapshot(self):
+        """Test whether collections are loaded from a snapshot store."""
+        with SnapshotStore() as store:
+            mirror = Mirror(store)
+            self.assertNotIn('item', mirror)
+            store.snapshot('item', transport=_item_transport())
+            self.assertIn('item', mirror)
+            self.assertEqual(len(mirror.index('item', 'name.en')), 3)
+
+
+class TestLocalExecution(unittest.TestCase):
+    """Test cases for queries evaluated against a mirror."""
+
+    def setUp(self):
+        self.mirror = Mirror()
+        self.mirror.add('character', [
+            {'character_id': str(i), 'battle_rank': str(i * 10 % 120),
+             'name': {'first': name, 'first_lower': name.lower()},
+             **({'outfit_id': '7'} if i % 2 else {})}
+            for i, name in enumerate(['Auroram', 'Bob', 'bobby', 'Alice',
+                                      'Carol', 'Dave'])])
+
+    def test_terms(self):
+        """Test the index lookups for the different search modifiers."""
+        def ids(**kwargs):
+            query = auraxium.Query('character', limit=100, **kwargs)
+            return [r['character_id'] for r in self.mirror.execute(query)]
+
+        self.assertEqual(ids(character_id='2'), [2])
+        self.assertEqual(ids(character_id='1,3,9'), [1, 3])
+        self.assertEqual(ids(character_id='1,1'), [1])
+        self.assertEqual(ids(battle_rank='<30'), [0, 1, 2])
+        self.assertEqual(ids(battle_rank=']30'), [3, 4, 5])
+        self.assertEqual(ids(battle_rank='!30'), [0, 1, 2, 4, 5])
+        self.assertEqual(ids(name__first='^Bob'), [1])
+        self.assertEqual(ids(name__first='*o'), [0, 1, 2, 4])
+        self.assertEqual(ids(name__first='^b', battle_rank='>10'), [2])
+        # Ordered comparisons never match non-numeric values
+        self.assertEqual(ids(name__first='>A'), [])
+
+    def test_commands(self):
+        """Test the supported query commands."""
+        query = auraxium.Query('character', limit=2, start=1, case=False,
+                               name__first='^b', show_fields=['name.first'])
+        query.sort('battle_rank', descending=True)
+        self.assertEqual(self.mirror.execute(query),
+                         [{'name': {'first': 'Bob'}}])
+        query = auraxium.Query('character', limit=10)
+        query.has('outfit_id')
+        self.assertEqual(self.mirror.count(query), 3)
+        query.set_hide_fields('name.first_lower', 'outfit_id')
+        self.assertEqual(self.mirror.execute(query, convert=False)[0],
+                         {'character_id': '1', 'battle_rank': '10',
+                          'name': {'first': 'Bob'}})
+        # The mirrored data is not modified
+        self.assertIn('first_lower', self.mirror.rows('character')[1]['name'])
+
+    def test_unsupported(self):
+        """Test whether queries requiring the server are rejected."""
+        query = auraxium.Query('character')
+        query.join('outfit')
+        with self.assertRaises(ValueError):
+            self.mirror.execute(query)
+        with self.assertRaises(KeyError):
+            self.mirror.execute(auraxium.Query('item'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""Test cases for paginated query results."""
+
+import asyncio
+import unittest
+import auraxium
+from auraxium import scheduler
+from auraxium.testing import (Fixtures, FixtureTransport, MAINTENANCE,
+                              Simulation)
+
+
+def _range_transport(size, count=None, failing=()):
+    """Return a transport serving a collection of numbered items.
+
+    `count` overrides the number of items reported, the shards starting
+    at the `failing` offsets fail once for each occurrence.
+    """
+    fixtures = Fixtures()
+    fixtures.add_collection('item', [{'item_id': str(i)}
+                                     for i in range(size)])
+    if count is not None:
+        fixtures.add(auraxium.Query('item').url(count=True), {'count': count})
+    simulation = Simulation()
+    for start in failing:
+        simulation.fail_next(MAINTENANCE, match=f'c:start={start}')
+    return FixtureTransport(fixtures, simulation)
+
+
+class TestPagination(unittest.TestCase):
+    """Test cases for the paginated query methods."""
+
+    def test_iter_pages(self):
+        """Test whether all pages are returned in order."""
+        query = auraxium.Query('item', transport=_range_transport(25))
+        pages = list(query.iter_pages(page_size=10))
+        self.assertEqual([len(p) for p in pages], [10, 10, 5])
+        self.assertEqual([r['item_id'] for p in pages for r in p],
+                         list(range(25)))
+
+    def test_use_count(self):
+        """Test whether the count prevents requests past the end."""
+        stub = _range_transport(20)
+        query = auraxium.Query('item', transport=stub)
+        rows = list(query.stream(page_size=10, max_in_flight=4,
+                                 use_count=True))
+        self.assertEqual(len(rows), 20)
+        # One count request and two pages
+        self.assertEqual(len(stub.request_log), 3)
+
+    def test_astream(self):
+        """Test the asynchronous paginator."""
+        query = auraxium.Query('item', transport=_range_transport(7))
+
+        async def run():
+            return [r['item_id'] async for r in query.astream(page_size=3)]
+
+        self.assertEqual(asyncio.run(run()), list(range(7)))
+
+
+class TestGetAll(unittest.TestCase):
+    """Test cases for the sharded Query.get_all() method."""
+
+    def setUp(self):
+        scheduler.set_default_scheduler(scheduler.Scheduler(max_retries=0))
+
+    def tearDown(self):
+        scheduler.set_default_scheduler(None)
+
+    def test_get_all(self):
+        """Test whether the shards are merged in order."""
+        stub = _range_transport(95)
+        query = auraxium.Query('item', transport=stub)
+        rows = query.get_all(workers=3, shard_size=10)
+        self.assertEqual([r['item_id'] for r in rows], list(range(95)))
+        # One count request and ten shards
+        self.assertEqual(len(stub.request_log), 11)
+
+    def test_outdated_count(self):
+        """Test whether results past an outdated count are retrieved."""
+        query = auraxium.Query('item', transport=_range_transport(35, 20))
+        rows = query.get_all(shard_size=10)
+        self.assertEqual([r['item_id'] for r in rows], list(range(35)))
+
+    def test_exact_count(self):
+        """Test whether no request is made past an accurate count."""
+        stub = _range_transport(30)
+        query = auraxium.Query('item', transport=stub)
+        rows = query.get_all(shard_size=10)
+        self.assertEqual([r['item_id'] for r in rows], list(range(30)))
+        # One count request and three shards
+        self.assertEqual(len(stub.request_log), 4)
+
+    def test_shard_retry(self):
+        """Test whether failed shards are retried on their own."""
+        stub = _range_transport(30, failing=[10, 10])
+        query = auraxium.Query('item', transport=stub)
+        rows = query.get_all(shard_size=10)
+        self.assertEqual(len(rows), 30)
+        # One count request, three shards and two retries
+        self.assertEqual(len(stub.request_log), 6)
+        stub = _range_transport(30, failing=[10] * 3)
+        query = auraxium.Query('item', transport=stub)
+        with self.assertRaises(auraxium.exceptions.MaintenanceError):
+            query.get_all(shard_size=10, shard_retries=2)
+
+    def test_aget_all(self):
+        """Test the asynchronous version of get_all()."""
+        stub = _range_transport(25, failing=[20])
+        query = auraxium.Query('item', transport=stub)
+        rows = asyncio.run(query.aget_all(workers=2, shard_size=10))
+        self.assertEqual([r['item_id'] for r in rows], list(range(25)))
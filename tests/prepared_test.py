@@ -0,0 +1,64 @@
+"""Test cases for prepared queries."""
+
+import asyncio
+import unittest
+import auraxium
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+class TestPreparedQuery(unittest.TestCase):
+    """Test cases for the PreparedQuery class."""
+
+    def test_url(self):
+        """Test whether the template matches the regular query's URL."""
+        query = auraxium.Query('character', show_fields=['name'],
+                               character_id=auraxium.Parameter('id'))
+        query.join('outfit_member').add_term(
+            'rank_ordinal', auraxium.Parameter('rank'),
+            auraxium.SearchModifier.LESS_THAN)
+        prepared = query.prepare()
+        self.assertEqual(prepared.parameters, {'id', 'rank'})
+        expected = auraxium.Query('character', show_fields=['name'],
+                                  character_id=5428010618015189713)
+        expected.join('outfit_member').add_term(
+            'rank_ordinal', 3, auraxium.SearchModifier.LESS_THAN)
+        self.assertEqual(prepared.url(id=5428010618015189713, rank=3),
+                         expected.url())
+
+    def test_modifier_prefix(self):
+        """Test parameters combined with search modifier prefixes."""
+        query = auraxium.Query(
+            'character', battle_rank=f'>{auraxium.Parameter("rank")}')
+        self.assertTrue(query.prepare().url(rank=50).endswith(
+            '?battle_rank=>50'))
+
+    def test_invalid_parameters(self):
+        """Test whether missing and unknown parameters are rejected."""
+        prepared = auraxium.Query(
+            'character', character_id=auraxium.Parameter('id')).prepare()
+        with self.assertRaises(ValueError):
+            prepared.url()
+        with self.assertRaises(ValueError):
+            prepared.url(id=1, name='Bob')
+        with self.assertRaises(ValueError):
+            auraxium.Parameter('not a name')
+
+    def test_get_many(self):
+        """Test whether results are returned in order."""
+        fixtures = Fixtures()
+        fixtures.add_collection('character', [{'character_id': str(i)}
+                                              for i in range(1, 8)])
+        stub = FixtureTransport(fixtures)
+        prepared = auraxium.Query(
+            'character', transport=stub,
+            character_id=auraxium.Parameter('id')).prepare()
+        self.assertEqual(prepared.get(id=1), [{'character_id': 1}])
+        results = prepared.get_many([3, {'id': 4}, 5], convert=False)
+        self.assertEqual([r[0]['character_id'] for r in results],
+                         ['3', '4', '5'])
+        results = asyncio.run(prepared.aget_many([6, 7]))
+        self.assertEqual([r[0]['character_id'] for r in results], [6, 7])
+
+
+if __name__ == '__main__':
+    unittest.main()
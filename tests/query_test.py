@@ -2,6 +2,8 @@
 
 import unittest
 import auraxium
+from auraxium.census import Term
+from auraxium.join import Join
 
 
 class TestURLs(unittest.TestCase):
@@ -193,3 +195,69 @@ class TestURLs(unittest.TestCase):
 
     # TODO: c:case, c:limit, c:limitPerDb, c:start, c:offset, c:includeNull,
     # c:lang, c:join, c:tree, c:timing, c:exactMatchFirst, c:distinct, c:retry
+
+
+class TestCompiledQuery(unittest.TestCase):
+    """Test cases for the canonical, cached form of queries."""
+
+    def test_canonical(self):
+        """Test whether equivalent queries compile to equal objects."""
+        first = auraxium.Query('character', name__first='Bob', faction_id=2)
+        first.set_show_fields('name', 'faction_id')
+        second = auraxium.Query('character', faction_id=2, name__first='Bob')
+        second.set_show_fields('faction_id', 'name')
+        self.assertEqual(first.compile(), second.compile())
+        self.assertEqual(hash(first.compile()), hash(second.compile()))
+        self.assertNotEqual(first.compile(), first.compile(count=True))
+
+    def test_invalidation(self):
+        """Test whether the cached URL is updated on modification."""
+        query = auraxium.Query('character')
+        self.assertIs(query.compile(), query.compile())
+        query.limit = 10
+        self.assertTrue(query.url().endswith('?c:limit=10'))
+        query.add_term('battle_rank', 100)
+        self.assertIn('battle_rank=100', query.url())
+        join = query.join('outfit_member')
+        inner = join.join('outfit')
+        url = query.url()
+        inner.set_show('name')
+        self.assertNotEqual(query.url(), url)
+        self.assertTrue(query.url().endswith(
+            'c:join=outfit_member(outfit^show:name)'))
+
+    def test_in_place(self):
+        """Test whether lists modified in place update the cached URL."""
+        query = auraxium.Query('character')
+        join = query.join('outfit_member')
+        url = query.url()
+        for modify in (lambda: query.terms.append(Term('name.first', 'Bob')),
+                       lambda: query.hide_fields.append('times'),
+                       lambda: query.hide_fields.clear(),
+                       lambda: query.show_fields.append('name'),
+                       lambda: query.sort_by.append('battle_rank'),
+                       lambda: query.has_field.append('title_id'),
+                       lambda: query.resolves.append('world'),
+                       lambda: query.joins.append(Join('world')),
+                       lambda: join.terms.append(Term('rank', 1)),
+                       lambda: join.hide.append('rank'),
+                       lambda: join.hide.clear(),
+                       lambda: join.show.append('outfit_id'),
+                       lambda: join.join('outfit').show.append('alias')):
+            modify()
+            self.assertNotEqual(query.url(), url)
+            url = query.url()
+        self.assertTrue(query.url().endswith(
+            'c:join=outfit_member^show:outfit_id^terms:rank=1'
+            '(outfit^show:alias),world'))
+
+    def test_global_settings(self):
+        """Test whether the global service ID is taken into account."""
+        query = auraxium.Query('world')
+        self.assertIn('/s:example/', query.url())
+        auraxium.service_id = 'arx_test'
+        try:
+            self.assertIn('/s:arx_test/', query.url())
+        finally:
+            auraxium.service_id = 'example'
+
@@ -0,0 +1,68 @@
+"""Test cases for rate limiting and retries."""
+
+import time
+import unittest
+import auraxium
+from auraxium import scheduler
+from auraxium.exceptions import MaintenanceError, ServiceIDMissingError
+from auraxium.testing import (Fixtures, FixtureTransport, MAINTENANCE,
+                              THROTTLE, Simulation)
+
+
+def _flaky_transport(*failures):
+    """Return a transport failing as given before serving worlds."""
+    simulation = Simulation()
+    simulation.fail_next(*failures)
+    fixtures = Fixtures({auraxium.Query('world').url(): {
+        'world_list': [{'world_id': '1'}]}})
+    return FixtureTransport(fixtures, simulation)
+
+
+class TestScheduler(unittest.TestCase):
+    """Test cases for the Scheduler class."""
+
+    def setUp(self):
+        scheduler.set_default_scheduler(
+            scheduler.Scheduler(backoff=0.001, max_retries=2))
+
+    def tearDown(self):
+        scheduler.set_default_scheduler(None)
+
+    def test_retry(self):
+        """Test whether transient errors are retried."""
+        stub = _flaky_transport(MAINTENANCE, THROTTLE)
+        query = auraxium.Query('world', transport=stub)
+        self.assertEqual(query.get(), [{'world_id': 1}])
+        self.assertEqual(len(stub.request_log), 3)
+
+    def test_retry_exhausted(self):
+        """Test whether the last error is raised after all retries."""
+        stub = _flaky_transport(*[MAINTENANCE] * 3)
+        with self.assertRaises(MaintenanceError):
+            auraxium.Query('world', transport=stub).get()
+        self.assertEqual(len(stub.request_log), 3)
+
+    def test_retry_disabled(self):
+        """Test whether the query's retry flag is honored."""
+        stub = _flaky_transport(THROTTLE)
+        with self.assertRaises(ServiceIDMissingError):
+            auraxium.Query('world', retry=False, transport=stub).get()
+        self.assertEqual(len(stub.request_log), 1)
+
+    def test_token_bucket(self):
+        """Test whether the token bucket enforces the rate."""
+        bucket = scheduler.TokenBucket(rate=100.0, burst=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.01, places=3)
+
+    def test_rate_per_service_id(self):
+        """Test whether rates are applied per service ID."""
+        test = scheduler.Scheduler(rate=20.0, burst=1, rates={'fast': 1e6})
+        start = time.monotonic()
+        for _ in range(3):
+            test.wait('https://census.daybreakgames.com/s:fast/get/ps2')
+        self.assertLess(time.monotonic() - start, 0.05)
+        for _ in range(3):
+            test.wait('https://census.daybreakgames.com/s:slow/get/ps2')
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
@@ -0,0 +1,103 @@
+"""Test cases for the coalescing of identical requests."""
+
+import asyncio
+import threading
+import time
+import unittest
+import auraxium
+from auraxium.singleflight import SingleFlight
+from auraxium.testing import Fixtures, FixtureTransport, Simulation
+
+
+def _slow_transport():
+    """Return a transport serving worlds, each request taking a while."""
+    fixtures = Fixtures({auraxium.Query('world').url(): {
+        'world_list': [{'world_id': '1'}], 'returned': 1}})
+    return FixtureTransport(fixtures, Simulation(latency=0.05))
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for the SingleFlight class."""
+
+    def test_threads(self):
+        """Test whether concurrent calls share a single call."""
+        flight = SingleFlight()
+        calls = []
+        results = []
+        gate = threading.Event()
+
+        def func():
+            calls.append(None)
+            gate.wait()
+            return 42
+
+        def worker():
+            results.append(flight.do('key', func))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(42, True)] * 5)
+        # Calls made after completion are not coalesced
+        self.assertEqual(flight.do('key', lambda: 43), (43, False))
+
+    def test_errors(self):
+        """Test whether errors are raised for every caller."""
+        flight = SingleFlight()
+
+        async def func():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        async def run():
+            return await asyncio.gather(*(flight.ado('key', func)
+                                          for _ in range(3)),
+                                        return_exceptions=True)
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+
+class TestCoalescedRequests(unittest.TestCase):
+    """Test cases for coalesced queries."""
+
+    def test_threads(self):
+        """Test whether concurrent threads share a single request."""
+        stub = _slow_transport()
+        results = []
+
+        def worker():
+            results.append(auraxium.Query('world', transport=stub).get())
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(stub.request_log), 1)
+        self.assertEqual(results, [[{'world_id': 1}]] * 4)
+        # Each caller receives its own copy
+        self.assertEqual(len({id(r[0]) for r in results}), 4)
+
+    def test_async(self):
+        """Test whether concurrent tasks share a single request."""
+        stub = _slow_transport()
+
+        async def run():
+            query = auraxium.Query('world', transport=stub)
+            return await asyncio.gather(*(query.aget(convert=False)
+                                          for _ in range(4)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(stub.request_log), 1)
+        self.assertEqual(results, [[{'world_id': '1'}]] * 4)
+        self.assertEqual(len({id(r[0]) for r in results}), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
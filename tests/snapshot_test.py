@@ -0,0 +1,54 @@
+"""Test cases for the persistent snapshot store."""
+
+import os
+import tempfile
+import unittest
+import auraxium
+from auraxium.cache import ResponseCache
+from auraxium.snapshot import SnapshotStore
+from auraxium.testing import Fixtures, FixtureTransport
+
+
+def _range_transport(size):
+    """Return a transport serving a collection of numbered items."""
+    fixtures = Fixtures()
+    fixtures.add_collection('item', [{'item_id': str(i)}
+                                     for i in range(size)])
+    return FixtureTransport(fixtures)
+
+
+class TestSnapshotStore(unittest.TestCase):
+    """Test cases for the SnapshotStore class."""
+
+    def test_persistence(self):
+        """Test whether responses survive reopening the database."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test.db')
+            with SnapshotStore(path) as store:
+                store.put('url', {'item_list': []}, 10, collection='item')
+                store.put('other', {'character_list': []}, 10,
+                          collection='character')
+            with SnapshotStore(path) as store:
+                self.assertEqual(store.get('url'), {'item_list': []})
+                # Dynamic collections are not persisted by default
+                self.assertIsNone(store.get('other'))
+
+    def test_fallback(self):
+        """Test whether the memory cache falls back to the store."""
+        store = SnapshotStore()
+        store.put('url', {'item_list': []}, 10, collection='item')
+        cache = ResponseCache(fallback=store)
+        self.assertEqual(cache.get('url'), {'item_list': []})
+        self.assertIn('url', cache)
+
+    def test_snapshot(self):
+        """Test snapshotting an entire collection."""
+        store = SnapshotStore()
+        self.assertTrue(store.is_stale('item'))
+        count = store.snapshot('item', page_size=10,
+                               transport=_range_transport(25))
+        self.assertEqual(count, 25)
+        self.assertEqual([r['item_id'] for r in store.rows('item')],
+                         [str(i) for i in range(25)])
+        self.assertFalse(store.is_stale('item', max_age=60))
+        self.assertEqual(store.refresh(['item'], max_age=60), [])
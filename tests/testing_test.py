@@ -0,0 +1,154 @@
+"""Test cases for the offline Census API stand-ins."""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+import requests
+import auraxium
+from auraxium import scheduler
+from auraxium.cache import ResponseCache
+from auraxium.exceptions import MaintenanceError, ServerError
+from auraxium.testing import (CensusServer, Fixtures, FixtureTransport,
+                              MAINTENANCE, SERVER_ERROR, THROTTLE,
+                              Simulation, fixture_key)
+
+WORLDS = {'world_list': [{'world_id': '1', 'state': 'online'},
+                         {'world_id': '17', 'state': 'online'}],
+          'returned': 2}
+
+
+def _fixtures():
+    """Return fixtures holding the world list."""
+    query = auraxium.Query('world', limit=10)
+    return Fixtures({query.url(): WORLDS})
+
+
+class TestFixtures(unittest.TestCase):
+    """Test cases for the Fixtures class."""
+
+    def test_key(self):
+        """Test whether keys ignore the endpoint and service ID."""
+        self.assertEqual(
+            fixture_key('https://census.daybreakgames.com/s:example/get/'
+                        'ps2:v2/world?c:limit=10&state=online'),
+            fixture_key('http://127.0.0.1:8000/s:other/get/ps2:v2/world'
+                        '?state=online&c:limit=10'))
+
+    def test_save_load(self):
+        """Test whether fixtures survive a round trip to disk."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fixtures.json')
+            _fixtures().save(path)
+            fixtures = Fixtures.load(path)
+        self.assertIn(auraxium.Query('world', limit=10).url(), fixtures)
+
+
+class TestFixtureTransport(unittest.TestCase):
+    """Test cases for the in-process stand-in transport."""
+
+    def setUp(self):
+        scheduler.set_default_scheduler(
+            scheduler.Scheduler(backoff=0.001, max_retries=3))
+
+    def tearDown(self):
+        scheduler.set_default_scheduler(None)
+
+    def test_get(self):
+        """Test whether recorded responses are served."""
+        stub = FixtureTransport(_fixtures())
+        query = auraxium.Query('world', limit=10, transport=stub)
+        self.assertEqual(query.get()[1], {'world_id': 17, 'state': 'online'})
+        self.assertEqual([r['world_id'] for r in query.iter_results()],
+                         [1, 17])
+        with self.assertRaises(requests.HTTPError):
+            auraxium.Query('world', transport=stub).get()
+
+    def test_collection(self):
+        """Test whether unrecorded queries are evaluated on a collection."""
+        fixtures = _fixtures()
+        fixtures.add_collection('world', [
+            {'world_id': str(i), 'state': 'online'} for i in range(1, 20)])
+        stub = FixtureTransport(fixtures)
+        query = auraxium.Query('world', world_id='3,5,40', limit=5,
+                               show_fields=['world_id'], transport=stub)
+        self.assertEqual(query.get(), [{'world_id': 3}, {'world_id': 5}])
+        self.assertEqual(query.count(), 2)
+        self.assertEqual(len(auraxium.Query('world', limit=10, start=15,
+                                            transport=stub).get()), 4)
+        # Recorded responses take precedence
+        self.assertEqual(len(auraxium.Query('world', limit=10,
+                                            transport=stub).get()), 2)
+
+    def test_cache(self):
+        """Test whether cached responses do not reach the stand-in."""
+        stub = FixtureTransport(_fixtures())
+        query = auraxium.Query('world', limit=10, transport=stub,
+                               cache=ResponseCache())
+        query.get()
+        query.get()
+        self.assertEqual(len(stub.request_log), 1)
+
+    def test_failures(self):
+        """Test whether simulated failures are retried or raised."""
+        simulation = Simulation()
+        stub = FixtureTransport(_fixtures(), simulation)
+        query = auraxium.Query('world', limit=10, transport=stub)
+        simulation.fail_next(MAINTENANCE, THROTTLE, SERVER_ERROR)
+        self.assertEqual(len(query.get()), 2)
+        self.assertEqual(len(stub.request_log), 4)
+        simulation.maintenance = True
+        with self.assertRaises(MaintenanceError):
+            query.get()
+        simulation.maintenance = False
+        simulation.error_rate = 1.0
+        with self.assertRaises(ServerError):
+            query.get()
+
+    def test_failure_match(self):
+        """Test whether queued failures only apply to matching requests."""
+        simulation = Simulation()
+        simulation.fail_next(MAINTENANCE, match='c:start=5')
+        self.assertIsNone(simulation.failure(
+            's:example', 'get/ps2:v2/world?c:limit=10'))
+        self.assertEqual(simulation.failure(
+            's:example', 'get/ps2:v2/world?c:limit=10&c:start=5'),
+            MAINTENANCE)
+
+    def test_rate_limit(self):
+        """Test whether requests past the rate limit are throttled."""
+        simulation = Simulation(rate_limit=2)
+        self.assertIsNone(simulation.failure('s:example'))
+        self.assertIsNone(simulation.failure('s:example'))
+        self.assertEqual(simulation.failure('s:example'), THROTTLE)
+        self.assertIsNone(simulation.failure('s:other'))
+
+    def test_latency(self):
+        """Test whether responses are delayed."""
+        stub = FixtureTransport(_fixtures(), Simulation(latency=0.05))
+        start = time.perf_counter()
+        auraxium.Query('world', limit=10, transport=stub).get()
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+
+class TestCensusServer(unittest.TestCase):
+    """Test cases for the stand-in HTTP server."""
+
+    def test_server(self):
+        """Test whether a regular transport can use the server."""
+        with CensusServer(_fixtures()) as server:
+            with auraxium.Transport(base_url=server.url) as transport:
+                query = auraxium.Query('world', limit=10,
+                                       transport=transport)
+                self.assertEqual(len(query.get()), 2)
+                self.assertEqual(len(list(query.iter_results())), 2)
+                response = transport.get(auraxium.Query('world').url())
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('No fixture', json.loads(response.content)[
+                    'error'])
+            self.assertEqual(len(server.request_log), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Test cases for the HTTP transport layer."""
+
+import asyncio
+import time
+import unittest
+import auraxium
+from auraxium import transport
+from auraxium.testing import Fixtures, FixtureTransport, fixture_key
+
+WORLDS = {'world_list': [{'world_id': '1'}], 'returned': 1}
+
+
+class TestTransport(unittest.TestCase):
+    """Test cases for transport configuration and selection."""
+
+    def test_pool_size(self):
+        """Test whether the pool size is applied to the adapters."""
+        with auraxium.Transport(pool_size=4) as test:
+            adapter = test.session.get_adapter('https://example.com')
+            self.assertEqual(adapter._pool_maxsize, 4)
+
+    def test_default_transport(self):
+        """Test whether the default transport is reused."""
+        first = transport.get_default_transport()
+        self.assertIs(first, transport.get_default_transport())
+        custom = auraxium.Transport()
+        transport.set_default_transport(custom)
+        try:
+            self.assertIs(transport.get_default_transport(), custom)
+        finally:
+            transport.set_default_transport(None)
+
+    def test_query_transport(self):
+        """Test whether a query uses the transport it was given."""
+        query = auraxium.Query('world')
+        stub = FixtureTransport(Fixtures({query.url(): WORLDS}))
+        query.transport = stub
+        self.assertEqual(query.get(), [{'world_id': 1}])
+        self.assertEqual(stub.request_log, [fixture_key(query.url())])
+
+
+class TestAsync(unittest.TestCase):
+    """Test cases for the asynchronous query API."""
+
+    def test_aget(self):
+        """Test whether asynchronous queries return the same data."""
+        query = auraxium.Query('world')
+        query.transport = FixtureTransport(Fixtures({query.url(): WORLDS}))
+        self.assertEqual(asyncio.run(query.aget()), [{'world_id': 1}])
+
+    def test_concurrency_limit(self):
+        """Test whether the in-flight requests are capped."""
+        stub = FixtureTransport(Fixtures(), max_concurrency=2)
+        active = []
+        peak = []
+
+        def blocking_call():
+            active.append(None)
+            peak.append(len(active))
+            time.sleep(0.01)
+            active.pop()
+
+        async def run():
+            await asyncio.gather(*(stub.submit(blocking_call)
+                                   for _ in range(8)))
+
+        asyncio.run(run())
+        self.assertLessEqual(max(peak), 2)
+
+    def test_aname_from_id(self):
+        """Test the asynchronous name lookup helper."""
+        url = auraxium.utils._name_query('character', 5, '', None).url()
+        stub = FixtureTransport(Fixtures({url: {'character_list': [
+            {'character_id': '5', 'name': {'first': 'Auroram'}}]}}))
+        name = asyncio.run(auraxium.utils.aname_from_id(
+            'character', 5, transport=stub))
+        self.assertEqual(name, 'Auroram')